@@ -0,0 +1,88 @@
+"""Benchmark of the ingestion of releases in the DB.
+
+It compares the per-row path (`crud.create_release`, one commit per release)
+with the bulk path (`crud.create_releases` and `crud.update_package`, a single
+transaction for all releases), on a file-backed SQLite DB.
+
+Usage :
+
+```bash
+python benchmarks/bench_ingest.py
+```
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+# Use a file-backed DB, so we measure real commits
+tmp_dir = tempfile.mkdtemp()
+os.environ["OBLIQUE_DB"] = "local"
+os.environ["OBLIQUE_DB_PATH"] = os.path.join(tmp_dir, "bench.sql")
+sys.argv = sys.argv[:1]
+
+
+from oblique.database import SessionLocal, crud  # noqa: E402
+
+
+SIZES = [10, 1_000, 10_000]
+
+
+def make_releases(n):
+    """Generate `n` fake releases."""
+    start = datetime(2010, 1, 1)
+    return [(f"v{i}", start + timedelta(hours=i), i % 10 == 0) for i in range(n)]
+
+
+def per_row(db, releases, pkg_name):
+    """Ingest releases one by one (previous behavior)."""
+    db_pkg = crud.create_package(db, pkg_name)
+    for version, date, is_yanked in releases:
+        crud.create_release(db, version, date, is_yanked, db_pkg.id)
+
+
+def bulk_create(db, releases, pkg_name):
+    """Ingest releases in bulk, for a new package."""
+    db_pkg = crud.create_package(db, pkg_name)
+    crud.create_releases(db, releases, db_pkg.id)
+
+
+def bulk_update(db, releases, pkg_name):
+    """Ingest releases in bulk, for an existing package."""
+    db_pkg = crud.create_package(db, pkg_name)
+    crud.create_releases(db, releases, db_pkg.id)
+
+    t = time.perf_counter()
+    crud.update_package(db, db_pkg, releases)
+    return time.perf_counter() - t
+
+
+def main():
+    """Run the benchmark and print the results."""
+    crud.create_tables()
+    db = SessionLocal()
+
+    print(f"{'releases':>10} {'per-row (s)':>12} {'bulk create (s)':>16} {'bulk update (s)':>16}")
+    for n in SIZES:
+        releases = make_releases(n)
+
+        t = time.perf_counter()
+        per_row(db, releases, f"per_row_{n}")
+        t_per_row = time.perf_counter() - t
+
+        t = time.perf_counter()
+        bulk_create(db, releases, f"bulk_create_{n}")
+        t_bulk = time.perf_counter() - t
+
+        t_update = bulk_update(db, releases, f"bulk_update_{n}")
+
+        print(f"{n:>10} {t_per_row:>12.3f} {t_bulk:>16.3f} {t_update:>16.3f}")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Benchmark of the parsing of the PyPi API responses.
+
+It compares the previous approach (loading the whole JSON document, then
+extracting the releases) with the incremental parser (feeding the document
+chunk by chunk, only keeping the releases data), on large documents written
+to disk with the same structure as the PyPi API responses.
+
+For each approach, the time and the peak memory allocated are reported.
+
+Usage :
+
+```bash
+python benchmarks/bench_parsing.py
+```
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from dateutil.parser import isoparse
+
+
+sys.argv = sys.argv[:1]
+
+
+from oblique.core import CHUNK_SIZE  # noqa: E402
+from oblique.parsing import ReleasesParser  # noqa: E402
+
+
+SIZES = [100, 1_000, 10_000]
+FILES_PER_RELEASE = 5
+
+
+def make_document(n_releases):
+    """Generate a fake PyPi API response with `n_releases` releases."""
+    start = datetime(2010, 1, 1)
+    releases = {}
+    for i in range(n_releases):
+        date = (start + timedelta(hours=i)).isoformat()
+        releases[f"1.{i}.0"] = [
+            {
+                "comment_text": "",
+                "digests": {"blake2b_256": "a" * 64, "md5": "b" * 32, "sha256": "c" * 64},
+                "downloads": -1,
+                "filename": f"package-1.{i}.0-py3-none-any-{j}.whl",
+                "has_sig": False,
+                "md5_digest": "b" * 32,
+                "packagetype": "bdist_wheel",
+                "python_version": "py3",
+                "requires_python": ">=3.8",
+                "size": 123456,
+                "upload_time": date,
+                "upload_time_iso_8601": date + ".000000Z",
+                "url": f"https://files.pythonhosted.org/packages/{'d' * 60}/package-1.{i}.0-{j}.whl",
+                "yanked": i % 10 == 0,
+                "yanked_reason": None,
+            }
+            for j in range(FILES_PER_RELEASE)
+        ]
+    return {"info": {"description": "Lorem ipsum " * 5000, "name": "package"}, "releases": releases, "urls": []}
+
+
+def load_whole(path):
+    """Previous approach : load the whole document, then extract releases."""
+    with open(path, "rb") as f:
+        data = json.loads(f.read())
+    return [
+        (version, isoparse(info["upload_time"]), info["yanked"]) for version, (info, *_) in data["releases"].items()
+    ]
+
+
+def parse_incrementally(path):
+    """Current approach : feed the document chunk by chunk."""
+    parser = ReleasesParser()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            parser.feed(chunk)
+    return parser.close()
+
+
+def measure(fn, path):
+    """Return the time (in s) and peak memory allocated (in MB) by `fn`."""
+    tracemalloc.start()
+    t = time.perf_counter()
+    fn(path)
+    duration = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak / 1024 / 1024
+
+
+def main():
+    """Run the benchmark and print the results."""
+    tmp_dir = tempfile.mkdtemp()
+
+    header = ["releases", "size (MB)", "whole (s)", "whole (MB)", "stream (s)", "stream (MB)"]
+    print(" ".join(f"{h:>11}" for h in header))
+    for n in SIZES:
+        path = os.path.join(tmp_dir, f"{n}.json")
+        with open(path, "w") as f:
+            json.dump(make_document(n), f)
+        size = os.path.getsize(path) / 1024 / 1024
+
+        assert load_whole(path) == parse_incrementally(path)
+        t_whole, m_whole = measure(load_whole, path)
+        t_stream, m_stream = measure(parse_incrementally, path)
+
+        print(f"{n:>11} {size:>11.1f} {t_whole:>11.3f} {m_whole:>11.1f} {t_stream:>11.3f} {m_stream:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Micro-benchmark of the cost of rendering the HTML of each request.
+
+It compares rendering the JinjaX components on every request with reusing the
+HTML already rendered (fragment cache for the search results, pre-rendered
+static pages), for the components served by the web-app.
+
+Usage :
+
+```bash
+python benchmarks/bench_render.py [n_requests]
+```
+"""
+
+import sys
+import time
+
+
+N_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+N_PACKAGES = 100
+
+sys.argv = sys.argv[:1]
+
+
+from oblique.app import NOT_FOUND_MSG, catalog, prerender_static_pages, render  # noqa: E402
+
+
+COMPONENTS = {
+    "HomePage": lambda i: {},
+    "Error": lambda i: {"status_code": 404, "error_msg": NOT_FOUND_MSG},
+    "UnknownPackage": lambda i: {"pkg_name": f"pkg_{i % N_PACKAGES}"},
+    "SearchResult": lambda i: {
+        "pkg_name": f"pkg_{i % N_PACKAGES}",
+        "last_release": "3 days ago",
+        "n_versions": 42,
+        "n_versions_yanked": 1,
+    },
+}
+
+
+def measure(fn, name, make_kwargs):
+    """Return the average time (in µs) needed by `fn` to render a component."""
+    t = time.perf_counter()
+    for i in range(N_REQUESTS):
+        fn(name, **make_kwargs(i))
+    return (time.perf_counter() - t) / N_REQUESTS * 1e6
+
+
+def main():
+    """Run the benchmark and print the results."""
+    prerender_static_pages()
+
+    header = ["component", "render (µs)", "cached (µs)", "speedup"]
+    print(" ".join(f"{h:>15}" for h in header))
+    for name, make_kwargs in COMPONENTS.items():
+        t_render = measure(catalog.render, name, make_kwargs)
+        t_cached = measure(render, name, make_kwargs)
+        print(f"{name:>15} {t_render:>15.1f} {t_cached:>15.1f} {t_render / t_cached:>14.0f}x")
+
+
+if __name__ == "__main__":
+    main()
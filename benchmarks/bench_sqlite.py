@@ -0,0 +1,119 @@
+"""Benchmark of concurrent reads and writes on the file-backed SQLite DB, with
+and without the SQLite tuning (`sqlite_tuning`).
+
+Reader threads look up random packages (like requests served from the DB
+cache), while writer threads refresh random packages (like requests refreshing
+stale packages). Each configuration runs in its own process, on a new DB.
+
+Usage :
+
+```bash
+python benchmarks/bench_sqlite.py [readers] [writers] [duration]
+```
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+
+N_PACKAGES = 1_000
+N_RELEASES = 50
+
+
+def make_releases(n, offset=0):
+    """Generate `n` fake releases."""
+    start = datetime(2010, 1, 1) + timedelta(days=offset)
+    return [(f"v{i}", start + timedelta(days=i), i % 10 == 0) for i in range(n)]
+
+
+def run(n_readers, n_writers, duration):
+    """Run the benchmark with the current configuration, and print the counts
+    of operations (as JSON).
+    """
+    from sqlalchemy.exc import OperationalError
+
+    from oblique.database import SessionLocal, crud
+
+    crud.create_tables()
+    db = SessionLocal()
+    crud.create_packages(db, {f"pkg_{i}": make_releases(N_RELEASES) for i in range(N_PACKAGES)})
+    db.close()
+
+    counts = Counter()
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            db = SessionLocal()
+            try:
+                crud.get_package_by_name(db, f"pkg_{random.randrange(N_PACKAGES)}").n_versions
+                counts["reads"] += 1
+            except OperationalError:
+                counts["read_errors"] += 1
+            finally:
+                db.close()
+
+    def writer():
+        while not stop.is_set():
+            db = SessionLocal()
+            try:
+                db_pkg = crud.get_package_by_name(db, f"pkg_{random.randrange(N_PACKAGES)}")
+                crud.update_package(db, db_pkg, make_releases(N_RELEASES, offset=random.randrange(100)))
+                counts["writes"] += 1
+            except OperationalError:
+                db.rollback()
+                counts["write_errors"] += 1
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(n_readers)]
+    threads += [threading.Thread(target=writer) for _ in range(n_writers)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    print(json.dumps({k: v / duration if k in ("reads", "writes") else v for k, v in counts.items()}))
+
+
+def main():
+    """Run the benchmark for each configuration, and print the results."""
+    n_readers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    n_writers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    duration = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    header = ["sqlite_tuning", "reads/s", "writes/s", "read errors", "write errors"]
+    print(" ".join(f"{h:>15}" for h in header))
+    for tuning in ("false", "true"):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            env = {**os.environ, "OBLIQUE_DB": "local", "OBLIQUE_DB_PATH": os.path.join(tmp_dir, "bench.sql")}
+            out = subprocess.check_output(
+                [sys.executable, __file__, "--child", str(n_readers), str(n_writers), str(duration), tuning],
+                env=env,
+                text=True,
+            )
+        r = json.loads(out.strip().splitlines()[-1])
+        print(
+            f"{tuning:>15} {r.get('reads', 0):>15.0f} {r.get('writes', 0):>15.0f} "
+            f"{r.get('read_errors', 0):>15} {r.get('write_errors', 0):>15}"
+        )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        n_readers, n_writers, duration, tuning = sys.argv[2:]
+        # The configuration is read from the command line when importing oblique
+        sys.argv = [sys.argv[0], f"sqlite_tuning={tuning}"]
+        run(int(n_readers), int(n_writers), float(duration))
+    else:
+        main()
@@ -0,0 +1,110 @@
+"""Benchmark of the latency of a cache hit, i.e. the time needed to retrieve
+the statistics of a package already stored in the DB.
+
+It compares the previous path (looking up the package, then querying the
+releases table three times) with the current path (reading the statistics
+stored in the package itself), on a file-backed SQLite DB.
+
+Usage :
+
+```bash
+python benchmarks/bench_stats.py [n_packages] [n_releases]
+```
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+N_PACKAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+N_RELEASES = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000_000
+N_LOOKUPS = 10_000
+
+# Use a file-backed DB
+tmp_dir = tempfile.mkdtemp()
+os.environ["OBLIQUE_DB"] = "local"
+os.environ["OBLIQUE_DB_PATH"] = os.path.join(tmp_dir, "bench.sql")
+sys.argv = sys.argv[:1]
+
+
+from oblique import core  # noqa: E402
+from oblique.database import SessionLocal, crud, engine  # noqa: E402
+
+
+def populate():
+    """Fill the DB with fake packages and releases, as fast as possible."""
+    per_pkg = N_RELEASES // N_PACKAGES
+    start = datetime(2010, 1, 1)
+
+    con = engine.raw_connection()
+    cur = con.cursor()
+    cur.executemany(
+        "INSERT INTO packages (id, name, last_updated, latest_release_date, n_versions, n_versions_yanked) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (i, f"pkg_{i}", datetime.utcnow(), start + timedelta(days=per_pkg - 1), per_pkg, per_pkg // 10)
+            for i in range(1, N_PACKAGES + 1)
+        ),
+    )
+    cur.executemany(
+        "INSERT INTO releases (version, date, is_yanked, package_id) VALUES (?, ?, ?, ?)",
+        (
+            (f"v{j}", start + timedelta(days=j), j < per_pkg // 10, i)
+            for i in range(1, N_PACKAGES + 1)
+            for j in range(per_pkg)
+        ),
+    )
+    con.commit()
+    con.close()
+
+
+def previous_path(db, pkg_name):
+    """Retrieve the statistics by querying the releases table."""
+    db_package = crud.get_package_by_name(db, pkg_name)
+    return (
+        crud.get_latest_release_of(db, db_package).date,
+        crud.get_n_versions_of(db, db_package),
+        crud.get_n_versions_yanked_of(db, db_package),
+    )
+
+
+def current_path(db, pkg_name):
+    """Retrieve the statistics stored in the package."""
+    return core.get_stats_for(db, crud.get_package_by_name(db, pkg_name), human_readable=False)
+
+
+def bench(fn, names):
+    """Return the p50 and p99 latencies (in ms) of `fn` over `names`."""
+    db = SessionLocal()
+    latencies = []
+    for name in names:
+        t = time.perf_counter()
+        fn(db, name)
+        latencies.append((time.perf_counter() - t) * 1000)
+        db.expunge_all()
+    db.close()
+
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    """Run the benchmark and print the results."""
+    crud.create_tables()
+
+    t = time.perf_counter()
+    populate()
+    print(f"Populated {N_PACKAGES} packages and {N_RELEASES} releases in {time.perf_counter() - t:.1f}s")
+
+    names = [f"pkg_{random.randint(1, N_PACKAGES)}" for _ in range(N_LOOKUPS)]
+    for label, fn in [("releases scans", previous_path), ("stored stats", current_path)]:
+        p50, p99 = bench(fn, names)
+        print(f"{label:>15} : p50 = {p50:.3f}ms, p99 = {p99:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark of the scaling of the server with the number of workers.
+
+For each number of workers, a fresh server is started against a local
+stand-in of the PyPi API, and a workload of the load test (`hot` by default)
+is sent by several client processes (so the clients don't become the
+bottleneck). The throughput and the latency percentiles are reported, along
+with the speedup compared to a single worker.
+
+Usage :
+
+```bash
+python benchmarks/bench_workers.py
+python benchmarks/bench_workers.py --workers 1 2 4 8 --requests 20000 --clients 4
+```
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from load_test import WORKLOADS, ObliqueServer, Request, send_requests, summarize
+from stub_pypi import StubPyPiServer, add_arguments, settings_from_args, start_stub
+
+
+def default_workers() -> List[int]:
+    """Powers of 2 up to the number of cores."""
+    n_cores = os.cpu_count() or 1
+    workers = [1]
+    while workers[-1] * 2 <= n_cores:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != n_cores:
+        workers.append(n_cores)
+    return workers
+
+
+def client(base_url: str, requests: List[Request], concurrency: int, timeout: float):
+    """Send a share of the requests, from a client process."""
+    return asyncio.run(send_requests(base_url, requests, concurrency, timeout))[0]
+
+
+def run(n_workers: int, stub: StubPyPiServer, args: argparse.Namespace) -> Dict:
+    """Run the workload against a fresh server with the given number of
+    workers, and summarize the results.
+    """
+    make_requests, server_args = WORKLOADS[args.workload]
+    with ObliqueServer(stub.url, [f"workers={n_workers}", *server_args, *args.server_args]) as server:
+        requests = make_requests(server.url, args)
+
+        concurrency = max(args.concurrency // args.clients, 1)
+        with ProcessPoolExecutor(args.clients) as pool:
+            start = time.perf_counter()
+            shares = [
+                pool.submit(client, server.url, requests[i :: args.clients], concurrency, args.timeout)
+                for i in range(args.clients)
+            ]
+            results = [r for share in shares for r in share.result()]
+            elapsed = time.perf_counter() - start
+
+    return summarize(results, elapsed)
+
+
+def main():
+    """Run the benchmark for each number of workers, and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers(), help="Numbers of workers")
+    parser.add_argument("--workload", choices=list(WORKLOADS), default="hot")
+    parser.add_argument("--requests", type=int, default=5000, help="Number of requests per run")
+    parser.add_argument("--concurrency", type=int, default=64, help="Number of concurrent clients (in total)")
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1, help="Number of client processes")
+    parser.add_argument("--packages", type=int, default=100, help="Number of hot packages")
+    parser.add_argument("--timeout", type=float, default=30, help="Timeout of each request (s)")
+    parser.add_argument("--server-args", nargs="*", default=[], help="Extra configuration of the server")
+    parser.add_argument("--seed", type=int, default=0)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    print(f"{os.cpu_count()} cores, workload `{args.workload}`", file=sys.stderr)
+    header = ["workers", "req/s", "speedup", "p50 (ms)", "p99 (ms)", "errors"]
+    print(" ".join(f"{h:>12}" for h in header))
+
+    stub = start_stub(settings_from_args(args))
+    try:
+        baseline = None
+        for n_workers in args.workers:
+            r = run(n_workers, stub, args)
+            baseline = baseline or r["throughput"]
+            print(
+                f"{n_workers:>12} {r['throughput']:>12.1f} {r['throughput'] / baseline:>11.2f}x "
+                f"{r['latency']['p50'] * 1000:>12.1f} {r['latency']['p99'] * 1000:>12.1f} {r['errors']:>12}"
+            )
+    finally:
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""Load test of the server, against a local stand-in of the PyPi API.
+
+For each workload, a fresh server is started (with a new DB, so each workload
+starts with an empty cache), and requests to `/api/pkg_infos` and `/search`
+are sent by concurrent clients. The workloads are :
+
+* `hot` : a small set of packages, all already cached.
+* `cold` : every request is for a package never seen before.
+* `expiry` : a set of cached packages all expire at the same time, and are
+  then requested concurrently (expiry storm).
+* `mixed` : mostly hot packages, with some cold and unknown packages.
+
+For each workload, the throughput and the latency percentiles (p50, p95, p99)
+are reported, overall and by route, along with the number of calls to the
+PyPi API. The results are stored as JSON (by default in
+`benchmarks/results/<commit>.json`), and can be compared with the results of
+another commit.
+
+Usage :
+
+```bash
+python benchmarks/load_test.py
+python benchmarks/load_test.py --workloads hot cold --requests 5000 --concurrency 64
+python benchmarks/load_test.py --compare benchmarks/results/<other commit>.json
+```
+
+Extra configuration can be given to the server with `--server-args`, for
+example `--server-args stale_while_revalidate=true`.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from stub_pypi import StubPyPiServer, add_arguments, settings_from_args, start_stub
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+HTMX_HEADERS = {"HX-Request": "true"}
+
+# Time-to-live of the cache during the expiry storm (seconds)
+EXPIRY_TTL = 2
+
+# Create the tables of the fresh DB, and serve
+SERVER_SCRIPT = "import oblique; from oblique.database import crud; crud.create_tables(); oblique.run()"
+
+# Requests to send : route label, and path
+Request = Tuple[str, str]
+
+
+def free_port() -> int:
+    """Find a free local port."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ObliqueServer:
+    """Server running in a subprocess, with a fresh file-backed DB (the
+    in-memory DB uses a single connection, which isn't meant for concurrent
+    requests).
+
+    Args:
+        pypi_url (str): URL of the PyPi API to use.
+        extra_args (List[str]): Additional configuration (`key=value`).
+    """
+
+    def __init__(self, pypi_url: str, extra_args: List[str]):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        args = ["host=127.0.0.1", f"port={self.port}", f"pypi_url={pypi_url}", *extra_args]
+        env = {**os.environ, "OBLIQUE_DB": "local", "OBLIQUE_DB_PATH": os.path.join(self.tmp_dir.name, "db.sql")}
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", SERVER_SCRIPT, *args],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def wait_ready(self, timeout: float = 30):
+        """Wait until the server answers."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("The server exited during startup")
+            try:
+                httpx.get(f"{self.url}/", timeout=1)
+                return
+            except httpx.TransportError:
+                time.sleep(0.1)
+        raise TimeoutError("The server didn't start in time")
+
+    def stop(self):
+        """Stop the server."""
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            # Requests still in flight (stuck server) : don't wait for them
+            self.process.kill()
+            self.process.wait()
+        self.tmp_dir.cleanup()
+
+    def __enter__(self):
+        """Wait for the server to be ready."""
+        self.wait_ready()
+        return self
+
+    def __exit__(self, *exc):
+        """Stop the server."""
+        self.stop()
+
+
+def pkg_request(pkg_name: str, i: int) -> Request:
+    """Request for a package, alternating between the API and the web-app."""
+    if i % 2 == 0:
+        return "/api/pkg_infos", f"/api/pkg_infos?pkg_name={pkg_name}"
+    return "/search", f"/search?pkg={pkg_name}"
+
+
+async def send_requests(
+    base_url: str, requests: List[Request], concurrency: int, timeout: float = 30
+) -> Tuple[List[Tuple[str, float, int]], float]:
+    """Send the requests with concurrent clients. Requests failing (or timing
+    out) are reported with a status code of `0`.
+
+    Returns:
+        Tuple[List[Tuple[str, float, int]], float]: Route, latency (s) and
+            status code of each request, and the total time taken.
+    """
+    results = []
+    queue = iter(requests)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=HTMX_HEADERS, limits=limits, timeout=timeout) as client:
+
+        async def worker():
+            for route, path in queue:
+                t = time.perf_counter()
+                try:
+                    status = (await client.get(path)).status_code
+                except httpx.HTTPError:
+                    status = 0
+                results.append((route, time.perf_counter() - t, status))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return results, time.perf_counter() - start
+
+
+def summarize(results: List[Tuple[str, float, int]], elapsed: float) -> Dict:
+    """Compute the throughput and the latency percentiles of the requests."""
+    latencies = sorted(latency for _, latency, _ in results)
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(results),
+        "errors": sum(1 for _, _, status in results if status == 0 or status >= 500),
+        "throughput": len(results) / elapsed if elapsed > 0 else 0,
+        "latency": {
+            "mean": statistics.fmean(latencies) if latencies else 0,
+            "p50": percentiles[49] if percentiles else 0,
+            "p95": percentiles[94] if percentiles else 0,
+            "p99": percentiles[98] if percentiles else 0,
+        },
+    }
+
+
+def warm(base_url: str, pkg_names: List[str], concurrency: int):
+    """Request each package once, so it's cached."""
+    requests = [("warm", f"/api/pkg_infos?pkg_name={name}") for name in pkg_names]
+    asyncio.run(send_requests(base_url, requests, concurrency))
+
+
+def hot_workload(base_url: str, args: argparse.Namespace) -> List[Request]:
+    """A small set of packages, all already cached."""
+    pkg_names = [f"hot-{i}" for i in range(args.packages)]
+    warm(base_url, pkg_names, args.concurrency)
+    return [pkg_request(random.choice(pkg_names), i) for i in range(args.requests)]
+
+
+def cold_workload(base_url: str, args: argparse.Namespace) -> List[Request]:
+    """Every request is for a package never seen before."""
+    return [pkg_request(f"cold-{i}", i) for i in range(args.requests)]
+
+
+def expiry_workload(base_url: str, args: argparse.Namespace) -> List[Request]:
+    """Cached packages all expire at the same time, and are then requested
+    concurrently.
+    """
+    pkg_names = [f"expiry-{i}" for i in range(args.packages)]
+    warm(base_url, pkg_names, args.concurrency)
+    time.sleep(EXPIRY_TTL + 0.5)
+    return [pkg_request(pkg_names[i % len(pkg_names)], i) for i in range(args.requests)]
+
+
+def mixed_workload(base_url: str, args: argparse.Namespace) -> List[Request]:
+    """Mostly hot packages, with some cold and unknown packages."""
+    pkg_names = [f"hot-{i}" for i in range(args.packages)]
+    warm(base_url, pkg_names, args.concurrency)
+
+    requests = []
+    for i in range(args.requests):
+        r = random.random()
+        if r < 0.8:
+            requests.append(pkg_request(random.choice(pkg_names), i))
+        elif r < 0.95:
+            requests.append(pkg_request(f"cold-{i}", i))
+        else:
+            requests.append(pkg_request(f"unknown-{i}", i))
+    return requests
+
+
+# Workloads : function preparing the server and generating the requests, and configuration of the server
+WORKLOADS: Dict[str, Tuple[Callable[[str, argparse.Namespace], List[Request]], List[str]]] = {
+    "hot": (hot_workload, []),
+    "cold": (cold_workload, []),
+    "expiry": (
+        expiry_workload,
+        ["adaptive_ttl=true", f"min_ttl={EXPIRY_TTL}", f"max_ttl={EXPIRY_TTL}", "ttl_jitter=0.0"],
+    ),
+    "mixed": (mixed_workload, []),
+}
+
+
+def run_workload(name: str, stub: StubPyPiServer, args: argparse.Namespace) -> Dict:
+    """Run a workload against a fresh server, and summarize the results."""
+    make_requests, server_args = WORKLOADS[name]
+    with ObliqueServer(stub.url, server_args + args.server_args) as server:
+        requests = make_requests(server.url, args)
+
+        upstream_before = sum(stub.stats.values())
+        results, elapsed = asyncio.run(send_requests(server.url, requests, args.concurrency, args.timeout))
+        upstream_requests = sum(stub.stats.values()) - upstream_before
+
+    by_route = defaultdict(list)
+    for result in results:
+        by_route[result[0]].append(result)
+
+    summary = summarize(results, elapsed)
+    summary["upstream_requests"] = upstream_requests
+    summary["routes"] = {route: summarize(r, elapsed) for route, r in sorted(by_route.items())}
+    return summary
+
+
+def git_commit() -> Tuple[str, bool]:
+    """Current commit, and whether the working tree has uncommitted changes."""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], text=True))
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def print_results(results: Dict, baseline: Optional[Dict] = None):
+    """Print the results of each workload, with the change compared to the
+    baseline (if given).
+    """
+    header = ["workload", "req/s", "p50 (ms)", "p95 (ms)", "p99 (ms)", "errors", "upstream"]
+    print(" ".join(f"{h:>12}" for h in header))
+    for name, r in results["workloads"].items():
+        values = [r["throughput"], *(r["latency"][p] * 1000 for p in ("p50", "p95", "p99"))]
+        print(
+            f"{name:>12} "
+            + " ".join(f"{v:>12.1f}" for v in values)
+            + f" {r['errors']:>12} {r['upstream_requests']:>12}"
+        )
+
+        base = (baseline or {}).get("workloads", {}).get(name)
+        if base is not None:
+            base_values = [base["throughput"], *(base["latency"][p] * 1000 for p in ("p50", "p95", "p99"))]
+            deltas = [f"{(v - b) / b * 100:>+11.1f}%" if b else f"{'-':>12}" for v, b in zip(values, base_values)]
+            print(f"{'vs ' + baseline['commit']:>12} " + " ".join(deltas))
+
+
+def main():
+    """Run the load test and store the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--requests", type=int, default=2000, help="Number of requests per workload")
+    parser.add_argument("--concurrency", type=int, default=32, help="Number of concurrent clients")
+    parser.add_argument("--packages", type=int, default=100, help="Number of hot packages")
+    parser.add_argument("--timeout", type=float, default=30, help="Timeout of each request (s)")
+    parser.add_argument("--server-args", nargs="*", default=[], help="Extra configuration of the server")
+    parser.add_argument("--output", help="Where to store the results (JSON)")
+    parser.add_argument("--compare", help="Results of a previous run, to compare with (JSON)")
+    parser.add_argument("--seed", type=int, default=0)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    commit, dirty = git_commit()
+    stub = start_stub(settings_from_args(args))
+    try:
+        workloads = {}
+        for name in args.workloads:
+            print(f"Running workload `{name}`...", file=sys.stderr)
+            workloads[name] = run_workload(name, stub, args)
+    finally:
+        stub.shutdown()
+
+    results = {
+        "commit": commit,
+        "dirty": dirty,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "settings": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "packages": args.packages,
+            "timeout": args.timeout,
+            "server_args": args.server_args,
+            "stub": vars(stub.settings),
+        },
+        "workloads": workloads,
+    }
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results stored in {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
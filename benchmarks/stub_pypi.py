@@ -0,0 +1,207 @@
+"""Local stand-in for the PyPi API, used by the load tests.
+
+Unlike the mocked API of the tests, the responses look like real ones, and
+the behavior is configurable : latency of each response, number of releases
+of each package (chosen deterministically from its name, between
+`min_releases` and `max_releases`), number of files per release (which drives
+the size of the payload) and rate of errors. Each response has an `ETag`, so
+conditional requests are answered with a `304 Not Modified`.
+
+Packages whose name starts with `unknown` don't exist (`404`).
+
+It can be started on its own :
+
+```bash
+python benchmarks/stub_pypi.py --port 8001 --latency 0.05
+```
+
+And then used by a local server with `oblique pypi_url=http://127.0.0.1:8001`.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote
+
+
+@dataclass
+class StubSettings:
+    """Behavior of the stub PyPi API."""
+
+    latency: float = 0.05
+    error_rate: float = 0.0
+    min_releases: int = 10
+    max_releases: int = 200
+    files_per_release: int = 3
+
+
+class StubPyPiServer(ThreadingHTTPServer):
+    """HTTP server answering like the PyPi JSON API.
+
+    The number of requests received (by status code) is kept in `stats`.
+
+    Args:
+        address (Tuple[str, int]): Address to listen to.
+        settings (StubSettings): Behavior of the stub.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], settings: StubSettings):
+        super().__init__(address, StubPyPiHandler)
+        self.settings = settings
+        self.stats = Counter()
+        self._documents: Dict[str, Tuple[bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """URL of the stub, to use as `pypi_url`."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def document(self, pkg_name: str) -> Tuple[bytes, str]:
+        """Build (once) the response for a package, and its ETag."""
+        with self._lock:
+            if pkg_name not in self._documents:
+                self._documents[pkg_name] = make_document(pkg_name, self.settings)
+            return self._documents[pkg_name]
+
+
+def make_document(pkg_name: str, settings: StubSettings) -> Tuple[bytes, str]:
+    """Generate a response with the same structure as the PyPi API, and its
+    ETag. The number of releases depends only on the name of the package.
+    """
+    digest = hashlib.sha256(pkg_name.encode()).digest()
+    n_releases = settings.min_releases + int.from_bytes(digest[:4], "big") % (
+        settings.max_releases - settings.min_releases + 1
+    )
+
+    start = datetime(2015, 1, 1)
+    releases = {}
+    for i in range(n_releases):
+        date = (start + timedelta(days=7 * i)).isoformat()
+        releases[f"1.{i}.0"] = [
+            {
+                "digests": {"md5": "b" * 32, "sha256": "c" * 64},
+                "filename": f"{pkg_name}-1.{i}.0-{j}.whl",
+                "packagetype": "bdist_wheel",
+                "python_version": "py3",
+                "size": 123456,
+                "upload_time": date,
+                "url": f"https://files.pythonhosted.org/packages/{'d' * 60}/{pkg_name}-1.{i}.0-{j}.whl",
+                "yanked": i % 20 == 0,
+            }
+            for j in range(settings.files_per_release)
+        ]
+
+    document = {"info": {"name": pkg_name, "version": f"1.{n_releases - 1}.0"}, "releases": releases}
+    return json.dumps(document).encode(), f'"{digest.hex()[:16]}"'
+
+
+class StubPyPiHandler(BaseHTTPRequestHandler):
+    """Handler of the stub PyPi API."""
+
+    protocol_version = "HTTP/1.1"
+    server: StubPyPiServer
+
+    def do_GET(self):
+        """Answer a request of the PyPi JSON API."""
+        settings = self.server.settings
+        if settings.latency > 0:
+            time.sleep(settings.latency)
+
+        z = re.match(r"/pypi/([^/]+)/json", self.path)
+        pkg_name = unquote(z.group(1)) if z else None
+
+        if pkg_name is None or pkg_name.startswith("unknown"):
+            self.send(404, b'{"message": "Not Found"}')
+        elif random.random() < settings.error_rate:
+            self.send(503, b'{"message": "Service Unavailable"}')
+        else:
+            body, etag = self.server.document(pkg_name)
+            if self.headers.get("If-None-Match") == etag:
+                self.send(304, b"", etag)
+            else:
+                self.send(200, body, etag)
+
+    def send(self, status_code: int, body: bytes, etag: Optional[str] = None):
+        """Send a response, and count it."""
+        self.server.stats[status_code] += 1
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Don't log the requests, to keep the output of the load tests clean."""
+
+
+def start_stub(settings: StubSettings, host: str = "127.0.0.1", port: int = 0) -> StubPyPiServer:
+    """Start the stub PyPi API in a background thread.
+
+    Args:
+        settings (StubSettings): Behavior of the stub.
+        host (str, optional): Host to listen to. Defaults to `127.0.0.1`.
+        port (int, optional): Port to listen to (`0` for any free port).
+            Defaults to `0`.
+
+    Returns:
+        StubPyPiServer: The running server (call `shutdown()` to stop it).
+    """
+    server = StubPyPiServer((host, port), settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Add the settings of the stub to a parser of command line arguments."""
+    defaults = asdict(StubSettings())
+    parser.add_argument("--latency", type=float, default=defaults["latency"], help="Latency of responses (s)")
+    parser.add_argument("--error-rate", type=float, default=defaults["error_rate"], help="Rate of 503 responses")
+    parser.add_argument("--min-releases", type=int, default=defaults["min_releases"])
+    parser.add_argument("--max-releases", type=int, default=defaults["max_releases"])
+    parser.add_argument("--files-per-release", type=int, default=defaults["files_per_release"])
+
+
+def settings_from_args(args: argparse.Namespace) -> StubSettings:
+    """Build the settings of the stub from the parsed command line arguments."""
+    return StubSettings(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        min_releases=args.min_releases,
+        max_releases=args.max_releases,
+        files_per_release=args.files_per_release,
+    )
+
+
+def main():
+    """Run the stub PyPi API until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubPyPiServer((args.host, args.port), settings_from_args(args))
+    print(f"Stub PyPi API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
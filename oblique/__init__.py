@@ -12,3 +12,6 @@ __version__ = "1.0.0.dev0"
 
 from .configuration import config  # noqa: E402
 from .server import run  # noqa: E402
+from .mirror import ingest_mirror  # noqa: E402
+from .snapshot import snapshot_cache  # noqa: E402
+from .warmup import warm  # noqa: E402
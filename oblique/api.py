@@ -1,12 +1,22 @@
 """File containing the routes of the API."""
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from typing import List
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
 from fastapi.exception_handlers import http_exception_handler
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
-from oblique.core import UnknownPackageException, get_package_info
+from oblique import config
+from oblique.core import (
+    UnknownPackageException,
+    format_stats,
+    get_package_info_async,
+    get_package_stats_async,
+    get_packages_info_async,
+)
 from oblique.dependencies import get_db
+from oblique.http_cache import cache_headers, is_not_modified, make_etag, not_modified
 
 
 router = APIRouter()
@@ -44,8 +54,24 @@ class PackageParameters(BaseModel):
     force_refresh: bool = False
 
 
+class BatchParameters(BaseModel):
+    """Parameters to pass to identify several packages.
+
+    * pkg_names (List[str]): Names of the packages to get (at most
+        `batch_max_size`).
+    * force_refresh (bool, optional): If set to `True`, the local cache is
+        ignored and the PyPi API is called. Note that it might be slower.
+        Defaults to `False`.
+    """
+
+    pkg_names: List[str] = Field(max_length=config.batch_max_size)
+    force_refresh: bool = False
+
+
 @router.post("/pkg_infos")
-def get_pkg_infos(parameters: PackageParameters, db: Session = Depends(get_db)):
+async def get_pkg_infos(
+    parameters: PackageParameters, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+):
     """Route to get the informations of the package requested.
 
     These informations are :
@@ -54,8 +80,12 @@ def get_pkg_infos(parameters: PackageParameters, db: Session = Depends(get_db)):
      * Number of versions yanked
     """
     try:
-        last_release, n_versions, n_versions_yanked = get_package_info(
-            db, parameters.pkg_name, human_readable=False, force_refresh=parameters.force_refresh
+        last_release, n_versions, n_versions_yanked = await get_package_info_async(
+            db,
+            parameters.pkg_name,
+            human_readable=False,
+            force_refresh=parameters.force_refresh,
+            schedule=background_tasks.add_task,
         )
         return {
             "last_release": last_release,
@@ -64,3 +94,66 @@ def get_pkg_infos(parameters: PackageParameters, db: Session = Depends(get_db)):
         }
     except UnknownPackageException:
         raise APIException(status_code=404, detail="This package was not published to PyPi index.")
+
+
+@router.get("/pkg_infos")
+async def get_pkg_infos_cacheable(
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    parameters: PackageParameters = Depends(),
+    db: Session = Depends(get_db),
+):
+    """Cacheable variant of `get_pkg_infos`, with the parameters given in the
+    query string.
+
+    The response has an `ETag` and a `Cache-Control` header (valid until the
+    informations become stale). If the client already has these informations
+    (`If-None-Match`), a `304 Not Modified` is returned instead.
+    """
+    try:
+        stats = await get_package_stats_async(
+            db, parameters.pkg_name, force_refresh=parameters.force_refresh, schedule=background_tasks.add_task
+        )
+        last_release, n_versions, n_versions_yanked = format_stats(stats, human_readable=False)
+    except UnknownPackageException:
+        raise APIException(status_code=404, detail="This package was not published to PyPi index.")
+
+    headers = cache_headers(make_etag("pkg_infos", parameters.pkg_name, *stats[:3]), stats.expires_at)
+    if is_not_modified(request, headers["ETag"]):
+        return not_modified(headers)
+
+    response.headers.update(headers)
+    return {
+        "last_release": last_release,
+        "n_versions": n_versions,
+        "n_versions_yanked": n_versions_yanked,
+    }
+
+
+@router.post("/pkg_infos/batch")
+async def get_batch_pkg_infos(parameters: BatchParameters, db: Session = Depends(get_db)):
+    """Route to get the informations of several packages at once.
+
+    The informations of each package are returned in `packages` (see
+    `get_pkg_infos`). If the informations of a package can't be retrieved,
+    the error is returned in `errors` instead, without failing the whole
+    batch.
+    """
+    results, errors = await get_packages_info_async(
+        db, parameters.pkg_names, human_readable=False, force_refresh=parameters.force_refresh
+    )
+    return {
+        "packages": {
+            pkg_name: {"last_release": last_release, "n_versions": n_versions, "n_versions_yanked": n_versions_yanked}
+            for pkg_name, (last_release, n_versions, n_versions_yanked) in results.items()
+        },
+        "errors": {
+            pkg_name: (
+                {"status_code": 404, "detail": "This package was not published to PyPi index."}
+                if isinstance(e, UnknownPackageException)
+                else {"status_code": 502, "detail": "PyPi API unreachable."}
+            )
+            for pkg_name, e in errors.items()
+        },
+    }
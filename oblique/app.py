@@ -1,19 +1,79 @@
 """Main file, containing the FastAPI web-app definition and its routes."""
 
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import FileResponse, HTMLResponse
+from typing import Any, Dict, Hashable, List, Tuple
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, HTMLResponse, Response
 from jinjax import Catalog
 from sqlalchemy.orm import Session
 
-from oblique import ASSETS_DIR, COMPONENTS_DIR
-from oblique.core import UnknownPackageException, get_package_info
+from oblique import ASSETS_DIR, COMPONENTS_DIR, config, metrics
+from oblique.assets import IMMUTABLE_CACHE_CONTROL, Asset, asset_url, assets, find_asset, negotiate_encoding
+from oblique.cache import LRUCache
+from oblique.core import UnknownPackageException, format_stats, get_package_stats_async
 from oblique.dependencies import get_db
+from oblique.http_cache import cache_headers, is_not_modified, make_etag, not_modified
 
 
 router = APIRouter()
 
 catalog = Catalog()
 catalog.add_folder(COMPONENTS_DIR)
+catalog.jinja_env.globals["asset_url"] = asset_url
+
+NOT_FOUND_MSG = "Sorry, we couldn't find this page."
+
+# Pages which never change, rendered once at startup
+STATIC_PAGES: List[Tuple[str, Dict[str, Any]]] = [
+    ("HomePage", {}),
+    ("Error", {"status_code": 404, "error_msg": NOT_FOUND_MSG}),
+]
+static_pages: Dict[Hashable, str] = {}
+
+# Fragments rendered recently, by component and arguments
+fragment_cache = LRUCache(config.fragment_cache_size)
+metrics.CallbackMetric(
+    "oblique_fragment_cache_events_total",
+    "Lookups of the cache of rendered fragments, by event (hits, misses, evictions).",
+    lambda: {k: fragment_cache.stats[k] for k in ("hits", "misses", "evictions")},
+    kind="counter",
+    label="event",
+)
+
+
+def _fragment_key(name: str, kwargs: Dict[str, Any]) -> Hashable:
+    """Key identifying a rendered component."""
+    return (name, *sorted(kwargs.items()))
+
+
+def render(name: str, **kwargs: Any) -> str:
+    """Render a component, reusing the HTML already rendered for the same
+    component and arguments (static pages, or recently rendered fragments).
+
+    Since the arguments are part of the key, a fragment is never reused after
+    the data it displays changed.
+
+    Args:
+        name (str): Name of the component to render.
+        kwargs (Any): Arguments of the component.
+
+    Returns:
+        str: Rendered HTML.
+    """
+    key = _fragment_key(name, kwargs)
+    html = static_pages.get(key)
+    if html is None:
+        html = fragment_cache.get(key)
+    if html is None:
+        html = catalog.render(name, **kwargs)
+        fragment_cache.set(key, html)
+    return html
+
+
+def prerender_static_pages():
+    """Render the static pages once, so they're served without rendering."""
+    for name, kwargs in STATIC_PAGES:
+        static_pages[_fragment_key(name, kwargs)] = catalog.render(name, **kwargs)
 
 
 class HTMLException(HTTPException):
@@ -30,7 +90,7 @@ class HTMLException(HTTPException):
 async def html_exception_handler(request: Request, exc: HTTPException):
     """Define the exception handler for HTMLException."""
     return HTMLResponse(
-        status_code=exc.status_code, content=catalog.render("Error", status_code=exc.status_code, error_msg=exc.detail)
+        status_code=exc.status_code, content=render("Error", status_code=exc.status_code, error_msg=exc.detail)
     )
 
 
@@ -45,41 +105,99 @@ async def htmx(request: Request):
         request (Request): Request to check.
     """
     if "hx-request" not in request.headers or request.headers["hx-request"] != "true":
-        raise HTMLException(status_code=404, detail="Sorry, we couldn't find this page.")
+        raise HTMLException(status_code=404, detail=NOT_FOUND_MSG)
 
 
 @router.get("/", response_class=HTMLResponse)
 async def home():
     """Main route, sending the home page."""
-    return catalog.render("HomePage")
+    return render("HomePage")
+
+
+def asset_response(request: Request, asset: Asset, cache_control: str) -> Response:
+    """Build the response sending a static asset, in the best encoding
+    accepted by the client.
+
+    Args:
+        request (Request): Request received.
+        asset (Asset): Asset to send.
+        cache_control (str): `Cache-Control` header of the response.
+
+    Returns:
+        Response: Response sending the asset (or `304 Not Modified`).
+    """
+    headers = {"ETag": asset.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if is_not_modified(request, asset.etag):
+        return not_modified(headers)
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), asset.variants)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(asset.variants[encoding], media_type=asset.media_type, headers=headers)
 
 
 @router.get("/favicon.ico", include_in_schema=False)
-async def favicon():
+async def favicon(request: Request):
     """Favicon."""
+    if "logo.svg" in assets:
+        return asset_response(request, assets["logo.svg"], "no-cache")
     return FileResponse(ASSETS_DIR / "logo.svg")
 
 
 @router.get("/tailwind.css", include_in_schema=False)
-async def tailwind():
+async def tailwind(request: Request):
     """TailwindCSS."""
+    if "tailwind.css" in assets:
+        return asset_response(request, assets["tailwind.css"], "no-cache")
     return FileResponse(ASSETS_DIR / "tailwind.css")
 
 
+@router.get("/static/{filename}", include_in_schema=False)
+async def static_asset(filename: str, request: Request):
+    """Static assets, under content-hashed URLs : their content never changes,
+    so they can be cached forever.
+    """
+    asset = find_asset(f"/static/{filename}")
+    if asset is None:
+        raise HTMLException(status_code=404, detail=NOT_FOUND_MSG)
+    return asset_response(request, asset, IMMUTABLE_CACHE_CONTROL)
+
+
 @router.get("/search", response_class=HTMLResponse)
-async def search(pkg: str, db: Session = Depends(get_db), h: None = Depends(htmx)):
-    """Search route, to display the search results."""
+async def search(
+    pkg: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    h: None = Depends(htmx),
+):
+    """Search route, to display the search results.
+
+    The results have an `ETag` and a `Cache-Control` header (valid until the
+    statistics become stale, and varying with the `HX-Request` header), and a
+    `304 Not Modified` is returned if the client already has them
+    (`If-None-Match`).
+    """
     try:
-        last_release, n_versions, n_versions_yanked = get_package_info(db, pkg)
-        return catalog.render(
-            "SearchResult",
-            pkg_name=pkg,
-            last_release=last_release,
-            n_versions=n_versions,
-            n_versions_yanked=n_versions_yanked,
-        )
+        stats = await get_package_stats_async(db, pkg, schedule=background_tasks.add_task)
+        last_release, n_versions, n_versions_yanked = format_stats(stats)
     except UnknownPackageException:
-        return catalog.render("UnknownPackage", pkg_name=pkg)
+        return HTMLResponse(render("UnknownPackage", pkg_name=pkg))
+
+    # Only HTMX requests get this fragment (see `htmx`), the response shouldn't be served to other requests
+    etag = make_etag("SearchResult", pkg, last_release, n_versions, n_versions_yanked)
+    headers = cache_headers(etag, stats.expires_at, vary="HX-Request")
+    if is_not_modified(request, headers["ETag"]):
+        return not_modified(headers)
+
+    content = render(
+        "SearchResult",
+        pkg_name=pkg,
+        last_release=last_release,
+        n_versions=n_versions,
+        n_versions_yanked=n_versions_yanked,
+    )
+    return HTMLResponse(content, headers=headers)
 
 
 @router.route("/{full_path:path}")
@@ -87,4 +205,4 @@ async def unknown_path(request: Request):
     """Catch-all route, if the user tries to access an unknown page, we display
     a 404.
     """
-    raise HTMLException(status_code=404, detail="Sorry, we couldn't find this page.")
+    raise HTMLException(status_code=404, detail=NOT_FOUND_MSG)
@@ -0,0 +1,127 @@
+"""Static assets, compressed once at startup and served under content-hashed
+URLs, so clients can cache them forever.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+from typing import Dict, NamedTuple, Optional
+
+from oblique import ASSETS_DIR
+
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class Asset(NamedTuple):
+    """A static asset, with its content in each available encoding."""
+
+    url: str
+    etag: str
+    media_type: str
+    # Content of the asset, by encoding (`identity`, `gzip`, `br`)
+    variants: Dict[str, bytes]
+
+
+# Assets loaded, by name (like `tailwind.css`) and by URL
+assets: Dict[str, Asset] = {}
+_assets_by_url: Dict[str, Asset] = {}
+
+
+def _hashed_name(name: str, digest: str) -> str:
+    """Insert the hash of the content in the name of an asset (like
+    `tailwind.<hash>.css`).
+    """
+    stem, dot, ext = name.rpartition(".")
+    return f"{stem}.{digest}.{ext}" if dot else f"{name}.{digest}"
+
+
+def load_assets():
+    """Load the assets of `ASSETS_DIR` in memory, and compress them with each
+    available encoding (compressed variants are only kept if smaller).
+    """
+    assets.clear()
+    _assets_by_url.clear()
+    for path in sorted(ASSETS_DIR.iterdir()):
+        if not path.is_file():
+            continue
+
+        content = path.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()[:16]
+
+        variants = {"identity": content}
+        compressed = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(content, quality=11)
+        variants.update({encoding: c for encoding, c in compressed.items() if len(c) < len(content)})
+
+        asset = Asset(
+            url=f"/static/{_hashed_name(path.name, digest)}",
+            etag=f'"{digest}"',
+            media_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+            variants=variants,
+        )
+        assets[path.name] = asset
+        _assets_by_url[asset.url] = asset
+
+
+def asset_url(name: str) -> str:
+    """Get the URL of an asset, to use in the components. If the asset wasn't
+    loaded, the unversioned URL is returned.
+
+    Args:
+        name (str): Name of the asset (like `tailwind.css`).
+
+    Returns:
+        str: URL of the asset.
+    """
+    asset = assets.get(name)
+    return asset.url if asset is not None else f"/{name}"
+
+
+def find_asset(url: str) -> Optional[Asset]:
+    """Find the asset served at the given URL.
+
+    Args:
+        url (str): Content-hashed URL of the asset.
+
+    Returns:
+        Optional[Asset]: The asset, or `None` if there is no such asset (or
+            if its content changed).
+    """
+    return _assets_by_url.get(url)
+
+
+def negotiate_encoding(accept_encoding: str, available: Dict[str, bytes]) -> str:
+    """Choose the best encoding accepted by the client, from its
+    `Accept-Encoding` header.
+
+    Args:
+        accept_encoding (str): `Accept-Encoding` header of the request.
+        available (Dict[str, bytes]): Variants available, by encoding.
+
+    Returns:
+        str: Encoding to use (`identity` if the client doesn't accept any
+            other available encoding).
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        encoding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[encoding.strip().lower()] = q
+
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
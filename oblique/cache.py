@@ -0,0 +1,89 @@
+"""In-memory caches, used in front of the DB or of expensive computations."""
+
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """Thread-safe, size-bounded, in-memory cache. When the cache is full, the
+    least recently used entry is evicted. Entries can also have an expiration
+    date, after which they are ignored.
+
+    The number of hits, misses, and evictions is kept in `stats`.
+
+    Args:
+        capacity (int): Maximum number of entries in the cache. If set to `0`,
+            the cache is disabled (nothing is stored).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.stats = Counter()
+
+    def __len__(self) -> int:
+        """Number of entries in the cache."""
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retrieve an entry from the cache.
+
+        Args:
+            key (Hashable): Key of the entry to retrieve.
+
+        Returns:
+            Optional[Any]: The cached value, or `None` if the key is not in
+                the cache or if the entry expired.
+        """
+        with self._lock:
+            value, expires_at = self._entries.get(key, (None, None))
+            if value is not None and expires_at is not None and expires_at <= datetime.utcnow():
+                del self._entries[key]
+                value = None
+
+            if value is None:
+                self.stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[datetime] = None):
+        """Store an entry in the cache, evicting the least recently used entry
+        if the cache is full.
+
+        Args:
+            key (Hashable): Key of the entry.
+            value (Any): Value to store. Can't be `None`.
+            expires_at (Optional[datetime], optional): Date (UTC) after which
+                the entry is considered expired. If `None`, the entry never
+                expires. Defaults to `None`.
+        """
+        if self.capacity <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def pop(self, key: Hashable):
+        """Remove an entry from the cache, if it exists.
+
+        Args:
+            key (Hashable): Key of the entry to remove.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        with self._lock:
+            self._entries.clear()
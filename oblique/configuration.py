@@ -1,13 +1,17 @@
 """Configuration declaration & parsing."""
 
 import os
+import tempfile
 from dataclasses import dataclass
+from typing import Optional
 
 from omegaconf import OmegaConf as omg
 from omegaconf.errors import ConfigKeyError
 
 
 DB_PATH_PATTERN = "<DB_FILE>"
+# Environment variable used to share the temporary DB file with the workers (see `shared_db_path`)
+SHARED_DB_ENV = "OBLIQUE_SHARED_DB_PATH"
 DATABASE_PROFILES = {
     "memory": "sqlite://",
     "local": f"sqlite:///{DB_PATH_PATTERN}",
@@ -24,11 +28,87 @@ class DefaultConfig:
     # Server
     host: str = "0.0.0.0"
     port: int = 9810
+    compression_min_size: int = 1024
+    compression_level: int = 6
+    metrics: bool = True
+
+    # Serving (passed to uvicorn)
+    workers: int = 1
+    loop: str = "auto"
+    http: str = "auto"
+    keep_alive_timeout: int = 5
+    backlog: int = 2048
+    limit_concurrency: Optional[int] = None
 
     # Database
     db: str = "${oc.env:OBLIQUE_DB,memory}"
     db_url: str = "${db_url:${db}}"
     db_path: str = "${oc.env:OBLIQUE_DB_PATH,db.sql}"
+    snapshot_file: Optional[str] = None
+    db_pool_size: int = 20
+    db_pool_max_overflow: int = 80
+    db_pool_timeout: float = 30.0
+    async_db: bool = False
+
+    # SQLite tuning (set `sqlite_tuning=false` to keep the defaults of SQLite)
+    sqlite_tuning: bool = True
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_cache_size: int = -64000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_busy_timeout: int = 5000
+    sqlite_temp_store: str = "MEMORY"
+
+    # Cache
+    memory_cache_size: int = 4096
+    memory_cache_max_age: float = 10.0
+    stale_while_revalidate: bool = False
+    stale_grace: int = 3600
+    fragment_cache_size: int = 4096
+    adaptive_ttl: bool = False
+    min_ttl: int = 3600
+    max_ttl: int = 7 * 24 * 3600
+    ttl_factor: float = 0.1
+    ttl_jitter: float = 0.1
+
+    # PyPi API
+    pypi_url: str = "${oc.env:OBLIQUE_PYPI_URL,https://pypi.org}"
+    pypi_timeout: float = 10.0
+    pypi_max_connections: int = 100
+    pypi_http2: bool = False
+
+    # API
+    batch_max_size: int = 5000
+    batch_concurrency: int = 32
+
+    # Write-behind of the cache updates
+    write_behind: bool = False
+    write_behind_delay: float = 0.05
+    write_behind_batch_size: int = 500
+
+    # Warm-up
+    warm_file: str = "-"
+    warm_chunk_size: int = 500
+
+    # Offline mirror ingest
+    mirror_path: Optional[str] = None
+    mirror_workers: int = 0
+    mirror_batch_size: int = 1000
+
+    # Background refresh of hot packages
+    scheduler: bool = False
+    scheduler_interval: float = 30.0
+    scheduler_hot_packages: int = 1000
+    scheduler_decay: float = 0.9
+    scheduler_lead: int = 900
+    scheduler_jitter: int = 600
+    scheduler_max_rate: float = 2.0
+
+    # Profiling of single requests
+    profiling: bool = False
+    profiling_header: str = "X-Oblique-Profile"
+    profiling_interval: float = 0.001
+    profiling_dir: Optional[str] = None
 
 
 config = omg.structured(DefaultConfig)
@@ -43,3 +123,23 @@ except ConfigKeyError:
 
 # Properly replace location of the SQLite DB in the database URL from the given arguments
 config.db_url = config.db_url.replace(DB_PATH_PATTERN, os.path.expanduser(config.db_path))
+
+
+def shared_db_path() -> str:
+    """Path of the temporary DB file used instead of the in-memory DB by the
+    `memory` profile, when it's used with several workers (they are separate
+    processes, which can't share an in-memory DB) or with `async_db` (each
+    asynchronous DB Session has its own connection, which can't share an
+    in-memory DB either).
+
+    The path is chosen by the main process, and passed to the workers through
+    the environment.
+
+    Returns:
+        str: Path of the DB file.
+    """
+    return os.environ.setdefault(SHARED_DB_ENV, os.path.join(tempfile.gettempdir(), f"oblique-{os.getpid()}.sql"))
+
+
+if config.db == "memory" and (config.workers > 1 or config.async_db):
+    config.db_url = DATABASE_PROFILES["local"].replace(DB_PATH_PATTERN, shared_db_path())
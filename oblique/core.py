@@ -1,16 +1,34 @@
 """File containing all the business logic, to be used by the API and the web-app."""
 
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import Counter
 from datetime import datetime, timedelta
-from typing import List, Tuple
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import quote
 
+import httpx
 import requests
-from dateutil.parser import isoparse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from oblique.database import crud, models
+from oblique import config, metrics
+from oblique.cache import LRUCache
+from oblique.database import AsyncSessionLocal, SessionLocal, crud, models
+from oblique.parsing import ReleasesParser
+from oblique.writer import writer
 
 
 CACHE_TTL = timedelta(hours=24)
+CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
 
 
 class PyPiAPIException(Exception):
@@ -29,6 +47,499 @@ class UnknownPackageException(Exception):
     pass
 
 
+class _Call:
+    """A call in flight, tracked by `SingleFlight`."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # If the leader was interrupted (like a cancelled task), there is no result : followers make the call again
+        self.interrupted = False
+        # Futures of the asynchronous followers (with their event loop), set when the call is done
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def outcome(self) -> Tuple[Any, bool]:
+        """Share the result of the call (or raise its exception) with a
+        follower.
+        """
+        if self.error is not None:
+            raise self.error
+        return self.result, True
+
+
+def _wake(waiter: asyncio.Future):
+    """Wake up an asynchronous follower (unless it was cancelled)."""
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls sharing the same key : only the first caller
+    (the leader) actually executes the function, the other callers wait for it
+    to finish and share its result (or its exception).
+
+    Synchronous (`do`) and asynchronous (`do_async`) calls are coalesced
+    together : a call with a given key is in flight only once, whatever the
+    kind of its leader.
+
+    The number of executed and coalesced calls is kept in `stats`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.stats = Counter()
+
+    def _join(
+        self, key: str, loop: Optional[asyncio.AbstractEventLoop] = None
+    ) -> Tuple[_Call, bool, Optional[asyncio.Future]]:
+        """Get the call in flight with the given key, or start a new one.
+
+        Args:
+            key (str): Key identifying the call.
+            loop (Optional[asyncio.AbstractEventLoop], optional): Event loop
+                of an asynchronous caller. Defaults to `None`.
+
+        Returns:
+            Tuple[_Call, bool, Optional[asyncio.Future]]: The call, a boolean
+                indicating if it was already in flight (the caller is a
+                follower), and for asynchronous followers the future set when
+                the call is done.
+        """
+        waiter = None
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._calls[key] = _Call()
+            elif loop is not None:
+                waiter = loop.create_future()
+                call.waiters.append((loop, waiter))
+            self.stats["coalesced" if shared else "executed"] += 1
+        return call, shared, waiter
+
+    def _leave(self, key: str, call: _Call):
+        """Remove a finished call, and wake up its followers."""
+        with self._lock:
+            del self._calls[key]
+            waiters, call.waiters = call.waiters, []
+        call.done.set()
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                # The event loop of this follower is closed, nobody is waiting anymore
+                pass
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """Execute the given function, unless a call with the same key is
+        already in flight, in which case we wait for it and share its result.
+
+        Args:
+            key (str): Key identifying the call.
+            fn (Callable): Function to execute.
+            *args: Positional arguments for `fn`.
+            **kwargs: Keyword arguments for `fn`.
+
+        Returns:
+            Tuple[Any, bool]: The result of the function, and a boolean
+                indicating if this result was shared from another caller
+                (`True`) or computed by this caller (`False`).
+        """
+        call, shared, _ = self._join(key)
+        while shared:
+            call.done.wait()
+            if not call.interrupted:
+                return call.outcome()
+            # The leader was interrupted : make the call again
+            call, shared, _ = self._join(key)
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.interrupted = True
+            raise
+        finally:
+            self._leave(key, call)
+        return call.result, False
+
+    async def do_async(self, key: str, fn: Callable[..., Awaitable], *args, **kwargs) -> Tuple[Any, bool]:
+        """Same as `do`, but for coroutine functions : callers wait for the
+        call in flight without blocking the event loop.
+
+        If the leader is cancelled, its followers aren't : one of them makes
+        the call instead.
+
+        Args:
+            key (str): Key identifying the call.
+            fn (Callable[..., Awaitable]): Coroutine function to execute.
+            *args: Positional arguments for `fn`.
+            **kwargs: Keyword arguments for `fn`.
+
+        Returns:
+            Tuple[Any, bool]: The result of the function, and a boolean
+                indicating if this result was shared from another caller
+                (`True`) or computed by this caller (`False`).
+        """
+        loop = asyncio.get_running_loop()
+        call, shared, waiter = self._join(key, loop)
+        while shared:
+            await waiter
+            if not call.interrupted:
+                return call.outcome()
+            call, shared, waiter = self._join(key, loop)
+
+        try:
+            call.result = await fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            # Like a cancellation : the followers shouldn't be cancelled as well
+            call.interrupted = True
+            raise
+        finally:
+            self._leave(key, call)
+        return call.result, False
+
+
+class PackageStats(NamedTuple):
+    """Statistics of a package, as stored in the DB."""
+
+    latest_release_date: Optional[datetime]
+    n_versions: int
+    n_versions_yanked: int
+
+    # When these statistics become stale
+    expires_at: Optional[datetime] = None
+
+    @classmethod
+    def from_package(cls, db_package: models.Package) -> "PackageStats":
+        """Extract the statistics stored in a DB object."""
+        return cls(
+            db_package.latest_release_date,
+            db_package.n_versions,
+            db_package.n_versions_yanked,
+            db_package.last_updated + package_ttl(db_package),
+        )
+
+    @classmethod
+    def from_releases(cls, releases: List[Tuple[str, datetime, bool]], expires_at: datetime) -> "PackageStats":
+        """Compute the statistics directly from the releases data."""
+        return cls(
+            max((date for _, date, _ in releases if date is not None), default=None),
+            len(releases),
+            sum(is_yanked for _, _, is_yanked in releases),
+            expires_at,
+        )
+
+
+class PyPiResponse(NamedTuple):
+    """Data retrieved from the PyPi API for a package."""
+
+    # Releases data, or `None` if the package wasn't modified since the last call
+    releases: Optional[List[Tuple[str, datetime, bool]]]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    serial: Optional[int] = None
+    payload_size: Optional[int] = None
+
+    def upstream_infos(self) -> Dict[str, Any]:
+        """Informations about the PyPi API response to store in the DB, to be
+        able to send a conditional request next time.
+        """
+        infos = {
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "serial": self.serial,
+            "payload_size": self.payload_size,
+        }
+        return {k: v for k, v in infos.items() if v is not None}
+
+
+# Only one refresh per package name should be in flight at a time
+refresh_flight = SingleFlight()
+
+# Statistics about the calls to the PyPi API (requests, conditional requests,
+# responses not modified, bytes received, bytes saved thanks to revalidation)
+upstream_stats = Counter()
+_upstream_stats_lock = threading.Lock()
+
+# In-memory cache of the statistics of the most recently requested packages
+stats_cache = LRUCache(config.memory_cache_size)
+
+# Number of accesses to each package, since the refresh scheduler last checked
+package_accesses = Counter()
+_package_accesses_lock = threading.Lock()
+
+
+# Expose these statistics in the metrics
+for _key in ("requests", "conditional_requests", "not_modified", "bytes_received", "bytes_saved"):
+    metrics.CallbackMetric(
+        f"oblique_pypi_{_key}_total",
+        f"PyPi API statistics : {_key.replace('_', ' ')}.",
+        partial(upstream_stats.get, _key, 0),
+        kind="counter",
+    )
+metrics.CallbackMetric(
+    "oblique_memory_cache_events_total",
+    "Lookups of the memory cache, by event (hits, misses, evictions).",
+    lambda: {k: stats_cache.stats[k] for k in ("hits", "misses", "evictions")},
+    kind="counter",
+    label="event",
+)
+metrics.CallbackMetric(
+    "oblique_memory_cache_entries", "Number of packages in the memory cache.", lambda: len(stats_cache)
+)
+metrics.CallbackMetric(
+    "oblique_refresh_calls_total",
+    "Refreshes of packages, executed or coalesced with a refresh already in flight.",
+    lambda: {k: refresh_flight.stats[k] for k in ("executed", "coalesced")},
+    kind="counter",
+    label="result",
+)
+
+
+# Connections to the PyPi API are pooled and kept alive
+_session = requests.Session()
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Writes made with asynchronous DB Sessions are serialized
+_write_lock: Optional[asyncio.Lock] = None
+_write_lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Get the asynchronous HTTP client used to call the PyPi API.
+
+    The client (and its pool of connections) is shared by all callers running
+    in the same event loop.
+
+    Returns:
+        httpx.AsyncClient: HTTP client.
+    """
+    global _async_client, _async_client_loop
+
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            base_url=config.pypi_url,
+            http2=config.pypi_http2,
+            timeout=config.pypi_timeout,
+            # Like `requests`, follow the redirections of the PyPi API (to the canonical name of the package)
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=config.pypi_max_connections, max_keepalive_connections=config.pypi_max_connections
+            ),
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+async def close_async_client():
+    """Close the asynchronous HTTP client used to call the PyPi API, if it was
+    created in the current event loop.
+    """
+    global _async_client
+
+    if _async_client is not None and _async_client_loop is asyncio.get_running_loop():
+        await _async_client.aclose()
+        _async_client = None
+
+
+def _count_upstream(**increments: int):
+    """Increment the statistics about the calls to the PyPi API."""
+    with _upstream_stats_lock:
+        upstream_stats.update(increments)
+
+
+def record_access(*pkg_names: str):
+    """Record an access to the given packages, for the refresh scheduler.
+    Nothing is recorded if the scheduler is disabled.
+    """
+    if config.scheduler:
+        with _package_accesses_lock:
+            package_accesses.update(pkg_names)
+
+
+def drain_accesses() -> Counter:
+    """Retrieve the accesses recorded since the last call, and reset them.
+
+    Returns:
+        Counter: Number of accesses to each package.
+    """
+    with _package_accesses_lock:
+        accesses = package_accesses.copy()
+        package_accesses.clear()
+    return accesses
+
+
+def _conditional_headers(db_package: Optional[models.Package]) -> Dict[str, str]:
+    """Build the headers to send a conditional request to the PyPi API, from
+    the informations stored during the last call.
+    """
+    headers = {}
+    if db_package is not None and db_package.etag is not None:
+        headers["If-None-Match"] = db_package.etag
+    if db_package is not None and db_package.last_modified is not None:
+        headers["If-Modified-Since"] = db_package.last_modified
+    return headers
+
+
+def _extract_releases(status_code: int, parser: ReleasesParser) -> List[Tuple[str, datetime, bool]]:
+    """Extract the releases data from a response of the PyPi API.
+
+    Args:
+        status_code (int): HTTP code of the response.
+        parser (ReleasesParser): Parser which was fed the content of the
+            response.
+
+    Raises:
+        PyPiAPIException: Exception raised if the PyPi API behaves unexpectedly.
+
+    Returns:
+        List[Tuple[str, datetime, bool]]: Releases data for this package.
+    """
+    if status_code == 200:
+        # The data we need was extracted from the response while it was received
+        try:
+            return parser.close()
+        except ValueError as e:
+            raise PyPiAPIException("Invalid response from PyPi API") from e
+    elif status_code == 404:
+        # Non-existing package : just return an empty list of releases
+        return []
+    else:
+        raise PyPiAPIException("PyPi API unreachable")
+
+
+def _parse_response(
+    status_code: int,
+    headers: Dict[str, str],
+    parser: ReleasesParser,
+    payload_size: int,
+    conditional: bool,
+    duration: float,
+) -> PyPiResponse:
+    """Parse a response of the PyPi API.
+
+    Args:
+        status_code (int): HTTP code of the response.
+        headers (Dict[str, str]): Headers of the response.
+        parser (ReleasesParser): Parser which was fed the content of the
+            response.
+        payload_size (int): Size of the response's content, in bytes.
+        conditional (bool): If the request was a conditional request.
+        duration (float): Time taken by the request, in seconds.
+
+    Raises:
+        PyPiAPIException: Exception raised if the PyPi API behaves unexpectedly.
+
+    Returns:
+        PyPiResponse: Data retrieved from the PyPi API.
+    """
+    not_modified = conditional and status_code == 304
+    _count_upstream(
+        requests=1, conditional_requests=int(conditional), not_modified=int(not_modified), bytes_received=payload_size
+    )
+    metrics.pypi_request_duration.observe(duration, status=status_code)
+    metrics.pypi_payload_size.observe(payload_size)
+
+    serial = headers.get("X-PyPI-Last-Serial")
+    return PyPiResponse(
+        releases=None if not_modified else _extract_releases(status_code, parser),
+        etag=headers.get("ETag"),
+        last_modified=headers.get("Last-Modified"),
+        serial=int(serial) if serial is not None else None,
+        payload_size=None if not_modified else payload_size,
+    )
+
+
+def fetch_from_pypi(pkg_name: str, db_package: Optional[models.Package] = None) -> PyPiResponse:
+    """Function that call the PyPi API and retrieve the data for a specific
+    package name.
+
+    If the package is already cached locally, a conditional request is sent :
+    if the package didn't change since the last call, the PyPi API doesn't
+    send the data again.
+
+    The response is streamed, and only the data we need is extracted from it,
+    so the memory used doesn't depend on the size of the response.
+
+    Args:
+        pkg_name (str): The package name for which we want to retrieve the data.
+        db_package (Optional[models.Package], optional): The DB object
+            corresponding to this package, if it's cached locally. Defaults to
+            `None`.
+
+    Raises:
+        PyPiAPIException: Exception raised if the PyPi API behaves unexpectedly.
+
+    Returns:
+        PyPiResponse: Data retrieved from the PyPi API.
+    """
+    headers = _conditional_headers(db_package)
+    parser, payload_size = ReleasesParser(), 0
+    start = time.perf_counter()
+    try:
+        with _session.get(
+            f"{config.pypi_url}/pypi/{quote(pkg_name, safe='')}/json",
+            headers=headers,
+            timeout=config.pypi_timeout,
+            stream=True,
+        ) as r:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                payload_size += len(chunk)
+                if r.status_code == 200:
+                    parser.feed(chunk)
+    except requests.RequestException as e:
+        raise PyPiAPIException("PyPi API unreachable") from e
+    except ValueError as e:
+        raise PyPiAPIException("Invalid response from PyPi API") from e
+
+    duration = time.perf_counter() - start
+    return _parse_response(r.status_code, r.headers, parser, payload_size, bool(headers), duration)
+
+
+async def fetch_from_pypi_async(pkg_name: str, db_package: Optional[models.Package] = None) -> PyPiResponse:
+    """Asynchronous version of `fetch_from_pypi`. The connections to the PyPi
+    API are shared, so many calls can be in flight at the same time.
+
+    Args:
+        pkg_name (str): The package name for which we want to retrieve the data.
+        db_package (Optional[models.Package], optional): The DB object
+            corresponding to this package, if it's cached locally. Defaults to
+            `None`.
+
+    Raises:
+        PyPiAPIException: Exception raised if the PyPi API behaves unexpectedly.
+
+    Returns:
+        PyPiResponse: Data retrieved from the PyPi API.
+    """
+    headers = _conditional_headers(db_package)
+    parser, payload_size = ReleasesParser(), 0
+    start = time.perf_counter()
+    try:
+        async with get_async_client().stream("GET", f"/pypi/{quote(pkg_name, safe='')}/json", headers=headers) as r:
+            async for chunk in r.aiter_bytes(CHUNK_SIZE):
+                payload_size += len(chunk)
+                if r.status_code == 200:
+                    parser.feed(chunk)
+    except httpx.HTTPError as e:
+        raise PyPiAPIException("PyPi API unreachable") from e
+    except ValueError as e:
+        raise PyPiAPIException("Invalid response from PyPi API") from e
+
+    duration = time.perf_counter() - start
+    return _parse_response(r.status_code, r.headers, parser, payload_size, bool(headers), duration)
+
+
 def get_package_info_from_pypi(pkg_name: str) -> List[Tuple[str, datetime, bool]]:
     """Function that call the PyPi API and retrieve the releases data for a
     specific package name.
@@ -49,30 +560,30 @@ def get_package_info_from_pypi(pkg_name: str) -> List[Tuple[str, datetime, bool]
             Note that if this list is empty, it means the package does not
             exists in PyPi.
     """
-    r = requests.get(f"https://pypi.org/pypi/{pkg_name}/json")
+    return fetch_from_pypi(pkg_name).releases
 
-    if r.status_code == 200:
-        data = r.json()
 
-        # Extract the data we need from the response
-        return [
-            (version, isoparse(info["upload_time"]), info["yanked"])
-            for version, (info, *_) in data["releases"].items()
-        ]
-    elif r.status_code == 404:
-        # Non-existing package : just return an empty list of releases
-        return []
-    else:
-        raise PyPiAPIException("PyPi API unreachable")
+async def get_package_info_from_pypi_async(pkg_name: str) -> List[Tuple[str, datetime, bool]]:
+    """Asynchronous version of `get_package_info_from_pypi`.
+
+    Args:
+        pkg_name (str): The package name for which we want to retrieve the data.
 
+    Raises:
+        PyPiAPIException: Exception raised if the PyPi API behaves unexpectedly.
 
-def get_stats_for(db: Session, db_package: models.Package, human_readable: bool = True) -> Tuple[str, int, int]:
-    """Function that retrieve the statistics of a package stored in the DB.
+    Returns:
+        List[Tuple[str, datetime, bool]]: Releases data for this package (see
+            `get_package_info_from_pypi`).
+    """
+    return (await fetch_from_pypi_async(pkg_name)).releases
+
+
+def format_stats(stats: PackageStats, human_readable: bool = True) -> Tuple[str, int, int]:
+    """Function that format the statistics of a package.
 
     Args:
-        db (Session): DB Session.
-        db_package (models.Package): The DB object corresponding to the package
-            we want to extract statistics from.
+        stats (PackageStats): Statistics to format.
         human_readable (bool, optional): If set to `True`, dates are returned
             in human-readable format (like `3 days ago` for example). If set to
             `False`, dates are returned in ISO 8601. Defaults to `True`.
@@ -82,16 +593,12 @@ def get_stats_for(db: Session, db_package: models.Package, human_readable: bool
             package registered in PyPi index (has no releases).
 
     Returns:
-        Tuple[str, int, int]: The statistics for this package. This is a tuple
-            with :
+        Tuple[str, int, int]: The formatted statistics. This is a tuple with :
             * The release date in a human-readable format
             * The number of versions released
             * The number of versions yanked
     """
-    # From the DB, get our statistics
-    last_release = crud.get_latest_release_of(db, db_package)
-    n_versions = crud.get_n_versions_of(db, db_package)
-    n_versions_yanked = crud.get_n_versions_yanked_of(db, db_package)
+    last_release = stats.latest_release_date
 
     # Handle the case where this package name wasn't released)
     if last_release is None:
@@ -99,18 +606,375 @@ def get_stats_for(db: Session, db_package: models.Package, human_readable: bool
 
     # Format the last_release to be human-friendly
     if human_readable:
-        td = datetime.utcnow() - last_release.date
+        td = datetime.utcnow() - last_release
         if td < timedelta(hours=24):
             h = max(td.seconds // 3600, 1)
             last_release = f"{h}h ago"
         elif td < timedelta(days=30):
             last_release = f"{td.days} day{'s' if td.days > 1 else ''} ago"
         else:
-            last_release = f"{last_release.date:%d %b %Y}"
+            last_release = f"{last_release:%d %b %Y}"
+
+    return last_release, stats.n_versions, stats.n_versions_yanked
+
+
+def get_stats_for(db: Session, db_package: models.Package, human_readable: bool = True) -> Tuple[str, int, int]:
+    """Function that retrieve the statistics of a package stored in the DB.
+
+    Args:
+        db (Session): DB Session.
+        db_package (models.Package): The DB object corresponding to the package
+            we want to extract statistics from.
+        human_readable (bool, optional): If set to `True`, dates are returned
+            in human-readable format (like `3 days ago` for example). If set to
+            `False`, dates are returned in ISO 8601. Defaults to `True`.
+
+    Raises:
+        UnknownPackageException: Exception raised if the package is not a
+            package registered in PyPi index (has no releases).
+
+    Returns:
+        Tuple[str, int, int]: The statistics for this package. This is a tuple
+            with :
+            * The release date in a human-readable format
+            * The number of versions released
+            * The number of versions yanked
+    """
+    # The statistics are precomputed and stored in the package itself
+    return format_stats(PackageStats.from_package(db_package), human_readable=human_readable)
+
+
+def compute_ttl(release_dates: List[datetime]) -> int:
+    """Compute how long the cached data of a package stays fresh, from its
+    release cadence.
+
+    The TTL is a fraction (`ttl_factor`) of the time the package usually
+    takes between two releases (the median gap between releases), or of the
+    time since its last release if it's longer (dormant packages). It's
+    bounded by `min_ttl` and `max_ttl`, then randomly jittered by up to
+    `ttl_jitter` (relative) so packages don't all expire at the same time.
+    Packages without any release (maybe not published yet) keep the default
+    TTL of one day.
+
+    Args:
+        release_dates (List[datetime]): Dates of the releases of the package.
+
+    Returns:
+        int: TTL of the package, in seconds.
+    """
+    if release_dates:
+        dates = sorted(release_dates)
+        since_last = (datetime.utcnow() - dates[-1]).total_seconds()
+        gaps = sorted((b - a).total_seconds() for a, b in zip(dates, dates[1:]))
+        median_gap = gaps[len(gaps) // 2] if gaps else since_last
+        ttl = config.ttl_factor * max(median_gap, since_last)
+    else:
+        # No release yet, nothing to expect : it might be published soon, so don't keep it for too long
+        ttl = CACHE_TTL.total_seconds()
+
+    ttl = min(max(ttl, config.min_ttl), config.max_ttl)
+    return int(ttl * random.uniform(1 - config.ttl_jitter, 1 + config.ttl_jitter))
+
+
+def package_ttl(db_package: models.Package) -> timedelta:
+    """Get how long the cached data of a package stays fresh : its own TTL
+    if `adaptive_ttl` is enabled, `CACHE_TTL` otherwise.
+    """
+    if config.adaptive_ttl and db_package.ttl is not None:
+        return timedelta(seconds=db_package.ttl)
+    return CACHE_TTL
+
+
+def store_package(
+    db: Session, pkg_name: str, db_package: Optional[models.Package], response: PyPiResponse
+) -> models.Package:
+    """Function updating the local cache with fresh informations about a
+    package.
+
+    Args:
+        db (Session): DB Session.
+        pkg_name (str): Name of the package to update.
+        db_package (Optional[models.Package]): The DB object corresponding to
+            this package, or `None` if it's not cached locally yet.
+        response (PyPiResponse): Fresh data for this package, retrieved from
+            the PyPi API.
+
+    Returns:
+        models.Package: The DB object corresponding to the updated package.
+    """
+    # The package is about to be rewritten, its statistics cached in memory are outdated
+    stats_cache.pop(pkg_name)
+
+    if response.releases is None:
+        # The package didn't change since the last refresh, no need to rewrite it
+        _count_upstream(bytes_saved=db_package.payload_size or 0)
+        return crud.touch_package(db, db_package, response.upstream_infos())
+
+    infos = {**response.upstream_infos(), "ttl": compute_ttl([date for _, date, _ in response.releases])}
+    if db_package is not None:
+        return crud.update_package(db, db_package, response.releases, infos)
+
+    try:
+        db_package = crud.create_package(db, pkg_name, infos)
+    except IntegrityError:
+        # Another worker created this package meanwhile : update it instead
+        db.rollback()
+        return crud.update_package(db, crud.get_package_by_name(db, pkg_name), response.releases, infos)
+    crud.create_releases(db, response.releases, db_package.id)
+    return db_package
+
+
+def _get_write_lock() -> asyncio.Lock:
+    """Get the lock serializing the writes made with asynchronous DB Sessions,
+    shared by all callers running in the same event loop.
+
+    SQLite only allows a single writer at a time : without this lock,
+    concurrent writers would poll the DB until it's unlocked, which makes some
+    of them wait much longer than others.
+    """
+    global _write_lock, _write_lock_loop
+
+    loop = asyncio.get_running_loop()
+    if _write_lock is None or _write_lock_loop is not loop:
+        _write_lock = asyncio.Lock()
+        _write_lock_loop = loop
+    return _write_lock
+
+
+async def store_package_async(
+    db: AsyncSession, pkg_name: str, db_package: Optional[models.Package], response: PyPiResponse
+) -> models.Package:
+    """Asynchronous version of `store_package`, with an asynchronous DB
+    Session. Writes are made one at a time (see `_get_write_lock`).
+
+    Args:
+        db (AsyncSession): Asynchronous DB Session.
+        pkg_name (str): Name of the package to update.
+        db_package (Optional[models.Package]): The DB object corresponding to
+            this package, or `None` if it's not cached locally yet.
+        response (PyPiResponse): Fresh data for this package, retrieved from
+            the PyPi API.
+
+    Returns:
+        models.Package: The DB object corresponding to the updated package.
+    """
+    stats_cache.pop(pkg_name)
+
+    if response.releases is None:
+        _count_upstream(bytes_saved=db_package.payload_size or 0)
+        async with _get_write_lock():
+            return await crud.touch_package_async(db, db_package, response.upstream_infos())
+
+    infos = {**response.upstream_infos(), "ttl": compute_ttl([date for _, date, _ in response.releases])}
+    async with _get_write_lock():
+        if db_package is not None:
+            return await crud.update_package_async(db, db_package, response.releases, infos)
+
+        try:
+            db_package = await crud.create_package_async(db, pkg_name, infos)
+        except IntegrityError:
+            await db.rollback()
+            db_package = await crud.get_package_by_name_async(db, pkg_name)
+            return await crud.update_package_async(db, db_package, response.releases, infos)
+        await crud.create_releases_async(db, response.releases, db_package.id)
+        await db.refresh(db_package)
+        return db_package
+
+
+def _queue_package(pkg_name: str, db_package: Optional[models.Package], response: PyPiResponse) -> PackageStats:
+    """Queue fresh informations about a package to the writer, and compute its
+    statistics directly from them.
+    """
+    if response.releases is None:
+        # The package didn't change since the last refresh, only its expiration date changes
+        _count_upstream(bytes_saved=db_package.payload_size or 0)
+        writer.submit(pkg_name, None, response.upstream_infos())
+        return PackageStats.from_package(db_package)._replace(expires_at=datetime.utcnow() + package_ttl(db_package))
+
+    ttl = compute_ttl([date for _, date, _ in response.releases])
+    writer.submit(pkg_name, response.releases, {**response.upstream_infos(), "ttl": ttl})
+    expires_at = datetime.utcnow() + (timedelta(seconds=ttl) if config.adaptive_ttl else CACHE_TTL)
+    return PackageStats.from_releases(response.releases, expires_at)
+
+
+def save_package(
+    db: Session, pkg_name: str, db_package: Optional[models.Package], response: PyPiResponse
+) -> PackageStats:
+    """Save fresh informations about a package, and keep its statistics in
+    memory.
+
+    If the writer is running (`write_behind`), the informations are queued to
+    the writer and the statistics are computed directly from them. Otherwise,
+    they are stored right away (see `store_package`).
+
+    Args:
+        db (Session): DB Session.
+        pkg_name (str): Name of the package to update.
+        db_package (Optional[models.Package]): The DB object corresponding to
+            this package, or `None` if it's not cached locally yet.
+        response (PyPiResponse): Fresh data for this package, retrieved from
+            the PyPi API.
+
+    Returns:
+        PackageStats: The fresh statistics of the package.
+    """
+    if writer.running:
+        stats = _queue_package(pkg_name, db_package, response)
     else:
-        last_release = last_release.date
+        stats = PackageStats.from_package(store_package(db, pkg_name, db_package, response))
+    return _cache_stats(pkg_name, stats)
+
+
+async def save_package_async(
+    db: Union[Session, AsyncSession], pkg_name: str, db_package: Optional[models.Package], response: PyPiResponse
+) -> PackageStats:
+    """Asynchronous version of `save_package` : if the informations are
+    stored right away, it's done in the threadpool (or in the event loop,
+    with an asynchronous DB Session).
+
+    Args:
+        db (Union[Session, AsyncSession]): DB Session.
+        pkg_name (str): Name of the package to update.
+        db_package (Optional[models.Package]): The DB object corresponding to
+            this package, or `None` if it's not cached locally yet.
+        response (PyPiResponse): Fresh data for this package, retrieved from
+            the PyPi API.
+
+    Returns:
+        PackageStats: The fresh statistics of the package.
+    """
+    if writer.running:
+        # Nothing is written to the DB, no need for a thread
+        return save_package(db, pkg_name, db_package, response)
+    if isinstance(db, AsyncSession):
+        db_package = await store_package_async(db, pkg_name, db_package, response)
+        return _cache_stats(pkg_name, PackageStats.from_package(db_package))
+    return await run_in_threadpool(save_package, db, pkg_name, db_package, response)
+
+
+def refresh_package(
+    db: Session, pkg_name: str, db_package: Optional[models.Package], conditional: bool = True
+) -> PackageStats:
+    """Function calling the PyPi API to retrieve fresh informations about a
+    package, and updating the local cache with it.
+
+    Args:
+        db (Session): DB Session.
+        pkg_name (str): Name of the package to refresh.
+        db_package (Optional[models.Package]): The DB object corresponding to
+            this package, or `None` if it's not cached locally yet.
+        conditional (bool, optional): If set to `True` and the package is
+            cached locally, a conditional request is sent to the PyPi API.
+            Defaults to `True`.
+
+    Returns:
+        PackageStats: The fresh statistics of the package.
+    """
+    response = fetch_from_pypi(pkg_name, db_package if conditional else None)
+    return save_package(db, pkg_name, db_package, response)
+
+
+async def refresh_package_async(
+    db: Union[Session, AsyncSession], pkg_name: str, db_package: Optional[models.Package], conditional: bool = True
+) -> PackageStats:
+    """Asynchronous version of `refresh_package`. The PyPi API is called
+    asynchronously, and the local cache is updated in the threadpool (or
+    queued to the writer, see `save_package_async`).
+
+    Args:
+        db (Union[Session, AsyncSession]): DB Session.
+        pkg_name (str): Name of the package to refresh.
+        db_package (Optional[models.Package]): The DB object corresponding to
+            this package, or `None` if it's not cached locally yet.
+        conditional (bool, optional): If set to `True` and the package is
+            cached locally, a conditional request is sent to the PyPi API.
+            Defaults to `True`.
+
+    Returns:
+        PackageStats: The fresh statistics of the package.
+    """
+    response = await fetch_from_pypi_async(pkg_name, db_package if conditional else None)
+    return await save_package_async(db, pkg_name, db_package, response)
+
+
+def _is_stale(db_package: Optional[models.Package]) -> bool:
+    """Check if a package cached in the DB should be refreshed."""
+    return db_package is None or db_package.last_updated < datetime.utcnow() - package_ttl(db_package)
+
+
+def _can_serve_stale(db_package: Optional[models.Package]) -> bool:
+    """Check if a stale package cached in the DB can still be served while it's
+    refreshed in the background (stale-while-revalidate).
+    """
+    grace = timedelta(seconds=config.stale_grace)
+    return (
+        config.stale_while_revalidate
+        and db_package is not None
+        and db_package.last_updated >= datetime.utcnow() - package_ttl(db_package) - grace
+    )
+
+
+async def _get_package_async(db: Union[Session, AsyncSession], pkg_name: str) -> Optional[models.Package]:
+    """Retrieve a package from the DB, in the event loop with an asynchronous
+    DB Session, or in the threadpool otherwise.
+    """
+    if isinstance(db, AsyncSession):
+        return await crud.get_package_by_name_async(db, pkg_name)
+    return await run_in_threadpool(crud.get_package_by_name, db, pkg_name)
+
+
+async def _get_packages_async(db: Union[Session, AsyncSession], pkg_names: List[str]) -> List[models.Package]:
+    """Retrieve several packages from the DB, in the event loop with an
+    asynchronous DB Session, or in the threadpool otherwise.
+    """
+    if isinstance(db, AsyncSession):
+        return await crud.get_packages_by_names_async(db, pkg_names)
+    return await run_in_threadpool(crud.get_packages_by_names, db, pkg_names)
+
 
-    return last_release, n_versions, n_versions_yanked
+async def refresh_in_background(pkg_name: str):
+    """Refresh a stale package, with its own DB session (asynchronous if
+    `async_db` is enabled). This is meant to be run in the background, after
+    serving the stale data.
+
+    Args:
+        pkg_name (str): Name of the package to refresh.
+    """
+    db = AsyncSessionLocal() if config.async_db else SessionLocal()
+    try:
+        # The package might have been refreshed by someone else in the meantime
+        db_package = await _get_package_async(db, pkg_name)
+        if _is_stale(db_package):
+            await refresh_flight.do_async(pkg_name, refresh_package_async, db, pkg_name, db_package)
+    except PyPiAPIException:
+        logger.warning(f"Couldn't refresh package `{pkg_name}` in the background", exc_info=True)
+    finally:
+        if isinstance(db, AsyncSession):
+            await db.close()
+        else:
+            db.close()
+
+
+def _cache_stats(pkg_name: str, stats: PackageStats) -> PackageStats:
+    """Keep the statistics of a package in memory, until they become stale.
+
+    With several workers, they're kept for at most `memory_cache_max_age`
+    seconds : another worker may refresh the package meanwhile, and the
+    memory of the other workers isn't invalidated.
+    """
+    expires_at = stats.expires_at
+    if config.workers > 1:
+        expires_at = min(expires_at, datetime.utcnow() + timedelta(seconds=config.memory_cache_max_age))
+    stats_cache.set(pkg_name, stats, expires_at=expires_at)
+    return stats
+
+
+def _count_outcome(outcome: str, stats: PackageStats) -> PackageStats:
+    """Count the outcome of a request of package informations (`unknown` if
+    the package has no release).
+    """
+    metrics.package_info_outcomes.inc(outcome="unknown" if stats.latest_release_date is None else outcome)
+    return stats
 
 
 def get_package_info(
@@ -118,10 +982,12 @@ def get_package_info(
 ) -> Tuple[str, int, int]:
     """Main function to retrieve informations about a PyPi package.
 
-    This function will first check if the informations is cached locally. If
-    it's not cached locally, the data is retrieved from the PyPi API and cached
-    locally.
-    The cache is valid for 24h.
+    This function will first check if the informations is cached locally (in
+    memory, then in the DB). If it's not cached locally, the data is retrieved
+    from the PyPi API and cached locally.
+    The cache is valid for 24h (or depending on the release cadence of the
+    package, if `adaptive_ttl` is enabled). Concurrent refreshes of the same
+    package are coalesced : only one call to the PyPi API is made.
 
     Args:
         db (Session): DB Session.
@@ -140,19 +1006,248 @@ def get_package_info(
             * The number of versions released
             * The number of versions yanked
     """
+    record_access(pkg_name)
+
+    # Hot packages are cached in memory, no need to hit the database
+    if not force_refresh:
+        stats = stats_cache.get(pkg_name)
+        if stats is not None:
+            return format_stats(_count_outcome("hit", stats), human_readable=human_readable)
+
     # Check the database to see if we already have that package's infos locally cached
     db_package = crud.get_package_by_name(db, pkg_name)
 
-    if db_package is None or db_package.last_updated < datetime.utcnow() - CACHE_TTL or force_refresh:
+    if _is_stale(db_package) or force_refresh:
         # This package is not cached locally, or the cache is stale
-        # Call the PyPi API to retrieve its informations and update our local cache
-        releases = get_package_info_from_pypi(pkg_name)
+        # Refresh it, making sure concurrent callers don't refresh it too (they share the fresh statistics)
+        try:
+            stats, _ = refresh_flight.do(
+                pkg_name, refresh_package, db, pkg_name, db_package, conditional=not force_refresh
+            )
+        except PyPiAPIException:
+            metrics.package_info_outcomes.inc(outcome="upstream_error")
+            raise
+        return format_stats(_count_outcome("miss", stats), human_readable=human_readable)
 
-        if db_package is not None:
-            db_package = crud.update_package(db, db_package, releases)
-        else:
-            db_package = crud.create_package(db, pkg_name)
-            crud.create_releases(db, releases, db_package.id)
+    # Retrieve the numbers we are interested in
+    stats = _cache_stats(pkg_name, PackageStats.from_package(db_package))
+    return format_stats(_count_outcome("hit", stats), human_readable=human_readable)
+
+
+async def get_package_stats_async(
+    db: Union[Session, AsyncSession],
+    pkg_name: str,
+    force_refresh: bool = False,
+    schedule: Optional[Callable[..., None]] = None,
+) -> PackageStats:
+    """Retrieve the raw statistics of a PyPi package (with their expiration
+    date), see `get_package_info_async`.
+
+    Args:
+        db (Union[Session, AsyncSession]): DB Session.
+        pkg_name (str): Name of the package for which we want data.
+        force_refresh (bool, optional): If set to `True`, the local cache is
+            ignored and the PyPi API is called. Note that it might be slower.
+            Defaults to `False`.
+        schedule (Optional[Callable[..., None]], optional): Function used to
+            schedule a background task (see `get_package_info_async`).
+            Defaults to `None`.
+
+    Returns:
+        PackageStats: The statistics for the package.
+    """
+    record_access(pkg_name)
+
+    # Hot packages are cached in memory, no need to hit the database
+    if not force_refresh:
+        stats = stats_cache.get(pkg_name)
+        if stats is not None:
+            return _count_outcome("hit", stats)
+
+    # Check the database to see if we already have that package's infos locally cached
+    db_package = await _get_package_async(db, pkg_name)
+
+    if _is_stale(db_package) and not force_refresh and schedule is not None and _can_serve_stale(db_package):
+        # Serve the stale data right away, and refresh it after
+        schedule(refresh_in_background, pkg_name)
+        return _count_outcome("stale", PackageStats.from_package(db_package))
+
+    if _is_stale(db_package) or force_refresh:
+        # This package is not cached locally, or the cache is stale
+        # Refresh it, making sure concurrent callers don't refresh it too (they share the fresh statistics)
+        try:
+            stats, _ = await refresh_flight.do_async(
+                pkg_name, refresh_package_async, db, pkg_name, db_package, conditional=not force_refresh
+            )
+        except PyPiAPIException:
+            metrics.package_info_outcomes.inc(outcome="upstream_error")
+            raise
+        return _count_outcome("miss", stats)
 
     # Retrieve the numbers we are interested in
-    return get_stats_for(db, db_package, human_readable=human_readable)
+    return _count_outcome("hit", _cache_stats(pkg_name, PackageStats.from_package(db_package)))
+
+
+async def get_package_info_async(
+    db: Union[Session, AsyncSession],
+    pkg_name: str,
+    human_readable: bool = True,
+    force_refresh: bool = False,
+    schedule: Optional[Callable[..., None]] = None,
+) -> Tuple[str, int, int]:
+    """Asynchronous version of `get_package_info`.
+
+    The PyPi API is called asynchronously, without holding a thread, and DB
+    operations are run in the threadpool. With an asynchronous DB Session
+    (`async_db`), DB operations are run in the event loop as well, so no
+    thread is used at all.
+
+    If `stale_while_revalidate` is enabled and a `schedule` function is given,
+    a stale package (within the `stale_grace` window) is returned right away,
+    and its refresh is scheduled in the background.
+
+    Args:
+        db (Union[Session, AsyncSession]): DB Session.
+        pkg_name (str): Name of the package for which we want data.
+        human_readable (bool, optional): If set to `True`, dates are returned
+            in human-readable format (like `3 days ago` for example). If set to
+            `False`, dates are returned in ISO 8601. Defaults to `True`.
+        force_refresh (bool, optional): If set to `True`, the local cache is
+            ignored and the PyPi API is called. Note that it might be slower.
+            Defaults to `False`.
+        schedule (Optional[Callable[..., None]], optional): Function used to
+            schedule a background task, called with the function to run and
+            its arguments (like FastAPI's `BackgroundTasks.add_task`). If
+            `None`, stale packages are always refreshed before returning.
+            Defaults to `None`.
+
+    Returns:
+        Tuple[str, int, int]: The statistics for the package (see
+            `get_package_info`).
+    """
+    stats = await get_package_stats_async(db, pkg_name, force_refresh=force_refresh, schedule=schedule)
+    return format_stats(stats, human_readable=human_readable)
+
+
+async def _refresh_packages_async(
+    db: Union[Session, AsyncSession],
+    pkg_names: List[str],
+    db_packages: Dict[str, models.Package],
+    conditional: bool = True,
+) -> Tuple[Dict[str, PackageStats], Dict[str, Exception]]:
+    """Refresh several packages : the PyPi API is called concurrently (with a
+    bounded concurrency), and the local cache is updated as each response
+    comes (see `save_package_async`). Like single refreshes, the refresh of
+    each package goes through `refresh_flight`, so it's coalesced with
+    concurrent refreshes of the same package.
+
+    Args:
+        db (Union[Session, AsyncSession]): DB Session.
+        pkg_names (List[str]): Names of the packages to refresh.
+        db_packages (Dict[str, models.Package]): DB objects of the packages
+            already cached locally, by name.
+        conditional (bool, optional): If set to `True`, conditional requests
+            are sent to the PyPi API for the packages cached locally. Defaults
+            to `True`.
+
+    Returns:
+        Tuple[Dict[str, PackageStats], Dict[str, Exception]]: The statistics
+            of the refreshed packages, and the errors of the packages which
+            couldn't be refreshed, by name.
+    """
+    if not pkg_names:
+        return {}, {}
+
+    semaphore = asyncio.Semaphore(config.batch_concurrency)
+    save_lock = asyncio.Lock()
+
+    async def refresh(pkg_name: str) -> PackageStats:
+        db_package = db_packages.get(pkg_name)
+        response = await fetch_from_pypi_async(pkg_name, db_package if conditional else None)
+        # The DB Session is shared by the whole batch, it can't be used concurrently
+        async with save_lock:
+            return await save_package_async(db, pkg_name, db_package, response)
+
+    async def refresh_coalesced(pkg_name: str) -> Any:
+        async with semaphore:
+            try:
+                # Concurrent refreshes of the same package (from other requests) are coalesced
+                stats, _ = await refresh_flight.do_async(pkg_name, refresh, pkg_name)
+                return stats
+            except PyPiAPIException as e:
+                return e
+
+    refreshed = await asyncio.gather(*[refresh_coalesced(pkg_name) for pkg_name in pkg_names])
+
+    stats, errors = {}, {}
+    for pkg_name, result in zip(pkg_names, refreshed):
+        if isinstance(result, Exception):
+            errors[pkg_name] = result
+        else:
+            stats[pkg_name] = result
+    return stats, errors
+
+
+async def get_packages_info_async(
+    db: Union[Session, AsyncSession], pkg_names: List[str], human_readable: bool = True, force_refresh: bool = False
+) -> Tuple[Dict[str, Tuple[str, int, int]], Dict[str, Exception]]:
+    """Function to retrieve informations about several PyPi packages at once.
+
+    Packages cached locally are retrieved with a single DB query, and the
+    other packages are retrieved concurrently from the PyPi API (at most
+    `batch_concurrency` calls in flight).
+
+    Args:
+        db (Union[Session, AsyncSession]): DB Session.
+        pkg_names (List[str]): Names of the packages for which we want data.
+        human_readable (bool, optional): If set to `True`, dates are returned
+            in human-readable format (like `3 days ago` for example). If set to
+            `False`, dates are returned in ISO 8601. Defaults to `True`.
+        force_refresh (bool, optional): If set to `True`, the local cache is
+            ignored and the PyPi API is called. Note that it might be slower.
+            Defaults to `False`.
+
+    Returns:
+        Tuple[Dict[str, Tuple[str, int, int]], Dict[str, Exception]]: The
+            statistics of each package (see `get_package_info`), and the
+            errors of each package we couldn't get statistics for
+            (`UnknownPackageException` or `PyPiAPIException`), by name.
+    """
+    pkg_names = list(dict.fromkeys(pkg_names))
+    record_access(*pkg_names)
+
+    # Hot packages are cached in memory, no need to hit the database
+    stats = {}
+    if not force_refresh:
+        stats = {pkg_name: stats_cache.get(pkg_name) for pkg_name in pkg_names}
+        stats = {pkg_name: s for pkg_name, s in stats.items() if s is not None}
+
+    # Check the database for the others, in a single query
+    to_check = [pkg_name for pkg_name in pkg_names if pkg_name not in stats]
+    db_packages = {}
+    if to_check:
+        db_packages = {p.name: p for p in await _get_packages_async(db, to_check)}
+
+    to_refresh = []
+    for pkg_name in to_check:
+        if _is_stale(db_packages.get(pkg_name)) or force_refresh:
+            to_refresh.append(pkg_name)
+        else:
+            stats[pkg_name] = _cache_stats(pkg_name, PackageStats.from_package(db_packages[pkg_name]))
+
+    # Finally, refresh the packages not cached locally (or stale)
+    refreshed, errors = await _refresh_packages_async(db, to_refresh, db_packages, conditional=not force_refresh)
+    stats.update(refreshed)
+
+    for pkg_name, s in stats.items():
+        _count_outcome("miss" if pkg_name in refreshed else "hit", s)
+    if errors:
+        metrics.package_info_outcomes.inc(len(errors), outcome="upstream_error")
+
+    results = {}
+    for pkg_name, s in stats.items():
+        try:
+            results[pkg_name] = format_stats(s, human_readable=human_readable)
+        except UnknownPackageException as e:
+            errors[pkg_name] = e
+    return results, errors
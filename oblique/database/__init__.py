@@ -2,7 +2,11 @@
 interact with the DB.
 """
 
+from typing import Any, Dict, Optional
+
 from sqlalchemy import MetaData, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
@@ -10,16 +14,119 @@ from sqlalchemy.pool import StaticPool
 from oblique import config
 
 
+try:
+    import aiosqlite
+except ImportError:
+    aiosqlite = None
+
+
+# Alembic revision of the DB schema described by the models, update it with each new migration
+SCHEMA_REVISION = "7b3e91c4d2a6"
+
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """Pragmas set on each new SQLite connection, from the configuration.
+
+    When `sqlite_tuning` is enabled, the DB uses a write-ahead log (readers
+    don't block writers, and the other way around), syncs less often (still
+    safe in WAL mode), keeps more pages in memory, reads the DB file through
+    mmap, and waits for locks instead of failing right away.
+
+    Returns:
+        Dict[str, Any]: Value of each pragma, by name.
+    """
+    pragmas = {"foreign_keys": "ON"}
+    if config.sqlite_tuning:
+        pragmas.update(
+            journal_mode=config.sqlite_journal_mode,
+            synchronous=config.sqlite_synchronous,
+            cache_size=config.sqlite_cache_size,
+            mmap_size=config.sqlite_mmap_size,
+            busy_timeout=config.sqlite_busy_timeout,
+            temp_store=config.sqlite_temp_store,
+        )
+    return pragmas
+
+
+def set_sqlite_pragmas(dbapi_con, con_record):
+    """Listener of the `connect` event, setting the pragmas of each new
+    SQLite connection.
+    """
+    cursor = dbapi_con.cursor()
+    for name, value in sqlite_pragmas().items():
+        cursor.execute(f"pragma {name}={value}")
+    cursor.close()
+
+
+# The `memory` profile might be backed by a DB file, with several workers or `async_db` (see `shared_db_path`)
+in_memory = make_url(config.db_url).database in (None, "", ":memory:")
+
 kwargs = {}
 if config.db_url.startswith("sqlite"):
     kwargs["connect_args"] = {"check_same_thread": False}
-    if config.db == "memory":
+    if in_memory:
         kwargs["poolclass"] = StaticPool
+    else:
+        # Sessions are kept during the calls to the PyPi API, so the pool should be larger than the threadpool
+        kwargs.update(
+            pool_size=config.db_pool_size,
+            max_overflow=config.db_pool_max_overflow,
+            pool_timeout=config.db_pool_timeout,
+        )
 
 engine = create_engine(config.db_url, **kwargs)
-event.listen(engine, "connect", lambda dbapi_con, con_record: dbapi_con.execute("pragma foreign_keys=ON"))
+event.listen(engine, "connect", set_sqlite_pragmas)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+_async_engine: Optional[AsyncEngine] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """Get the asynchronous engine (using `aiosqlite`), used when `async_db`
+    is enabled. It's created on first use, and connects to the same DB as the
+    synchronous engine.
+
+    Each asynchronous DB Session has its own connection, so the DB should be a
+    file : with the `memory` profile, a temporary DB file is used instead (see
+    `shared_db_path`).
+
+    Raises:
+        ImportError: Exception raised if `aiosqlite` is not installed.
+        ValueError: Exception raised if the DB is in-memory.
+
+    Returns:
+        AsyncEngine: Asynchronous engine.
+    """
+    global _async_engine
+
+    if _async_engine is None:
+        if aiosqlite is None:
+            raise ImportError("The asynchronous DB requires `aiosqlite`, install it with `pip install oblique[async]`")
+
+        if in_memory:
+            # The connections of the asynchronous engine can't share an in-memory DB (with each other, or with the
+            # synchronous engine) without sharing their transactions
+            raise ValueError("The asynchronous DB requires a DB file, it can't be used with an in-memory DB")
+
+        url = make_url(config.db_url).set(drivername="sqlite+aiosqlite")
+        async_kwargs = {k: v for k, v in kwargs.items() if k != "connect_args"}
+        _async_engine = create_async_engine(url, **async_kwargs)
+        event.listen(_async_engine.sync_engine, "connect", set_sqlite_pragmas)
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    """Create a new asynchronous DB Session (see `get_async_engine`).
+
+    Attributes are not expired on commit, since loading them again would
+    require an `await`.
+
+    Returns:
+        AsyncSession: Asynchronous DB Session.
+    """
+    return AsyncSession(get_async_engine(), autoflush=False, expire_on_commit=False)
+
+
 meta = MetaData(
     naming_convention={
         "ix": "ix_%(column_0_label)s",
@@ -1,8 +1,11 @@
 """CRUD functions to interact with the DB."""
 
 from datetime import datetime
-from typing import List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 
@@ -18,17 +21,21 @@ def create_tables():
     models.Base.metadata.create_all(bind=engine)
 
 
-def create_package(db: Session, pkg_name: str) -> models.Package:
+def create_package(db: Session, pkg_name: str, upstream_infos: Optional[Dict[str, Any]] = None) -> models.Package:
     """CRUD function to create a new Package.
 
     Args:
         db (Session): DB Session.
         pkg_name (str): Name of the package to create.
+        upstream_infos (Optional[Dict[str, Any]], optional): Informations about
+            the PyPi API response (`etag`, `last_modified`, `serial`,
+            `payload_size`) and the TTL of the package to store. Defaults to
+            `None`.
 
     Returns:
         models.Package: Created Package.
     """
-    db_package = models.Package(name=pkg_name, last_updated=func.now())
+    db_package = models.Package(name=pkg_name, last_updated=func.now(), **(upstream_infos or {}))
     db.add(db_package)
     db.commit()
     db.refresh(db_package)
@@ -36,7 +43,8 @@ def create_package(db: Session, pkg_name: str) -> models.Package:
 
 
 def create_release(db: Session, version: str, date: datetime, is_yanked: bool, package_id: int) -> models.Release:
-    """CRUD function to create a new Release.
+    """CRUD function to create a new Release. The statistics stored in the
+    Package are updated accordingly.
 
     Args:
         db (Session): DB Session.
@@ -50,14 +58,79 @@ def create_release(db: Session, version: str, date: datetime, is_yanked: bool, p
     """
     db_release = models.Release(version=version, date=date, is_yanked=is_yanked, package_id=package_id)
     db.add(db_release)
+    db.flush()
+    _update_stats(db, package_id)
     db.commit()
     db.refresh(db_release)
     return db_release
 
 
+def _upsert_releases():
+    """Statement inserting Releases : if a package already has a release with
+    the same version (like one written by a concurrent refresh), it's updated
+    instead, so the inserts are idempotent.
+    """
+    statement = sqlite_insert(models.Release)
+    return statement.on_conflict_do_update(
+        index_elements=[models.Release.package_id, models.Release.version],
+        set_={"date": statement.excluded.date, "is_yanked": statement.excluded.is_yanked},
+    )
+
+
+def _insert_releases(db: Session, releases_data: List[Tuple[str, datetime, bool]], package_id: int):
+    """Insert several new Releases at once (in a single `executemany`),
+    without committing. Releases already stored are updated instead (see
+    `_upsert_releases`).
+
+    Args:
+        db (Session): DB Session.
+        releases_data (List[Tuple[str, datetime, bool]]): List of releases data.
+            Each element is a tuple with the version name, the release date,
+            and if this release is yanked or not.
+        package_id (int): ID of the package this release is associated with.
+    """
+    if not releases_data:
+        return
+
+    db.execute(
+        _upsert_releases(),
+        [
+            {"version": version, "date": date, "is_yanked": is_yanked, "package_id": package_id}
+            for version, date, is_yanked in releases_data
+        ],
+    )
+
+
+def _update_stats(db: Session, package_id: int):
+    """Recompute the statistics stored in a Package from its releases,
+    without committing.
+
+    Args:
+        db (Session): DB Session.
+        package_id (int): ID of the package to update.
+    """
+    latest_release_date, n_versions, n_versions_yanked = (
+        db.query(
+            func.max(models.Release.date),
+            func.count(models.Release.id),
+            func.coalesce(func.sum(case((models.Release.is_yanked.is_(True), 1), else_=0)), 0),
+        )
+        .filter(models.Release.package_id == package_id)
+        .one()
+    )
+    db.execute(
+        update(models.Package)
+        .where(models.Package.id == package_id)
+        .values(latest_release_date=latest_release_date, n_versions=n_versions, n_versions_yanked=n_versions_yanked)
+    )
+
+
 def create_releases(db: Session, releases_data: List[Tuple[str, datetime, bool]], package_id: int):
     """CRUD function to create several new Releases.
 
+    All releases are inserted in bulk, within a single transaction. The
+    statistics stored in the Package are updated accordingly.
+
     Args:
         db (Session): DB Session.
         releases_data (List[Tuple[str, datetime, bool]]): List of releases data.
@@ -65,8 +138,72 @@ def create_releases(db: Session, releases_data: List[Tuple[str, datetime, bool]]
             and if this release is yanked or not.
         package_id (int): ID of the package this release is associated with.
     """
-    for version, date, is_yanked in releases_data:
-        create_release(db, version, date, is_yanked, package_id)
+    _insert_releases(db, releases_data, package_id)
+    _update_stats(db, package_id)
+    db.commit()
+
+
+def create_packages(
+    db: Session,
+    packages_data: Dict[str, List[Tuple[str, datetime, bool]]],
+    upstream_infos: Optional[Dict[str, Dict[str, Any]]] = None,
+    commit: bool = True,
+) -> int:
+    """CRUD function to create several new Packages with their Releases.
+
+    Everything is inserted in bulk (one `executemany` for the packages, one
+    for the releases) within a single transaction. The statistics stored in
+    the Packages are computed directly from the given releases.
+
+    Args:
+        db (Session): DB Session.
+        packages_data (Dict[str, List[Tuple[str, datetime, bool]]]): Releases
+            data of each package to create, by name (see `create_releases`).
+        upstream_infos (Optional[Dict[str, Dict[str, Any]]], optional):
+            Informations to store in each package, by name (see
+            `create_package`). Defaults to `None`.
+        commit (bool, optional): If set to `False`, the changes are not
+            committed (to write them along with other changes). Defaults to
+            `True`.
+
+    Returns:
+        int: Number of Releases created.
+    """
+    if not packages_data:
+        return 0
+
+    upstream_infos = upstream_infos or {}
+    info_keys = set().union(*upstream_infos.values())
+    now = datetime.utcnow()
+
+    package_rows = []
+    for pkg_name, releases_data in packages_data.items():
+        infos = upstream_infos.get(pkg_name, {})
+        package_rows.append(
+            {
+                "name": pkg_name,
+                "last_updated": now,
+                "latest_release_date": max((date for _, date, _ in releases_data if date is not None), default=None),
+                "n_versions": len(releases_data),
+                "n_versions_yanked": sum(is_yanked for _, _, is_yanked in releases_data),
+                **{k: infos.get(k) for k in info_keys},
+            }
+        )
+    db.execute(insert(models.Package), package_rows)
+
+    query = select(models.Package.name, models.Package.id).where(models.Package.name.in_(list(packages_data)))
+    ids = dict(db.execute(query).tuples().all())
+    release_rows = [
+        {"version": version, "date": date, "is_yanked": is_yanked, "package_id": ids[pkg_name]}
+        for pkg_name, releases_data in packages_data.items()
+        for version, date, is_yanked in releases_data
+    ]
+    if release_rows:
+        db.execute(_upsert_releases(), release_rows)
+
+    if commit:
+        db.commit()
+    return len(release_rows)
 
 
 def get_package_by_name(db: Session, pkg_name: str) -> models.Package:
@@ -82,14 +219,105 @@ def get_package_by_name(db: Session, pkg_name: str) -> models.Package:
     return db.query(models.Package).filter(models.Package.name == pkg_name).first()
 
 
+def get_packages_by_names(db: Session, pkg_names: List[str]) -> List[models.Package]:
+    """CRUD function to retrieve several Packages from their names, in a
+    single query.
+
+    Args:
+        db (Session): DB Session.
+        pkg_names (List[str]): Names of the packages to retrieve.
+
+    Returns:
+        List[models.Package]: Packages found (packages which are not in the DB
+            are simply ignored).
+    """
+    return db.query(models.Package).filter(models.Package.name.in_(pkg_names)).all()
+
+
+async def get_package_by_name_async(db: AsyncSession, pkg_name: str) -> models.Package:
+    """Asynchronous version of `get_package_by_name`.
+
+    Args:
+        db (AsyncSession): Asynchronous DB Session.
+        pkg_name (str): Name of the package to retrieve.
+
+    Returns:
+        models.Package: Package with the given name.
+    """
+    return await db.scalar(select(models.Package).where(models.Package.name == pkg_name).limit(1))
+
+
+async def get_packages_by_names_async(db: AsyncSession, pkg_names: List[str]) -> List[models.Package]:
+    """Asynchronous version of `get_packages_by_names`.
+
+    Args:
+        db (AsyncSession): Asynchronous DB Session.
+        pkg_names (List[str]): Names of the packages to retrieve.
+
+    Returns:
+        List[models.Package]: Packages found (packages which are not in the DB
+            are simply ignored).
+    """
+    return list(await db.scalars(select(models.Package).where(models.Package.name.in_(pkg_names))))
+
+
+def _commit_package(db: Session, db_package: models.Package, commit: bool) -> models.Package:
+    """Commit the changes made to a Package and reload it, or only flush them."""
+    if not commit:
+        db.flush()
+        return db_package
+
+    db.commit()
+    db.refresh(db_package)
+    return db_package
+
+
+def touch_package(
+    db: Session, db_package: models.Package, upstream_infos: Optional[Dict[str, Any]] = None, commit: bool = True
+) -> models.Package:
+    """CRUD function to mark a Package as up-to-date (changing the
+    `last_updated` attribute), without touching its releases.
+
+    Args:
+        db (Session): DB Session.
+        db_package (models.Package): Package to update.
+        upstream_infos (Optional[Dict[str, Any]], optional): Informations about
+            the PyPi API response (`etag`, `last_modified`, `serial`,
+            `payload_size`) and the TTL of the package to store. Defaults to
+            `None`.
+        commit (bool, optional): If set to `False`, the changes are only
+            flushed, not committed (see `update_package`). Defaults to `True`.
+
+    Returns:
+        models.Package: Package updated.
+    """
+    db_package.last_updated = func.now()
+    for k, v in (upstream_infos or {}).items():
+        setattr(db_package, k, v)
+    return _commit_package(db, db_package, commit)
+
+
 def update_package(
-    db: Session, db_package: models.Package, releases_data: List[Tuple[str, datetime, bool]]
+    db: Session,
+    db_package: models.Package,
+    releases_data: List[Tuple[str, datetime, bool]],
+    upstream_infos: Optional[Dict[str, Any]] = None,
+    commit: bool = True,
 ) -> models.Package:
     """CRUD function to update a Package (changing the `last_updated`
     attribute).
 
-    This will simply update the `last_updated` field, delete all associated
-    releases, and recreate them from the given data.
+    This will update the `last_updated` field, and synchronize the associated
+    releases with the given data : the stored releases are compared with the
+    fresh data (using the version name as key), and only the differences are
+    written (new releases are inserted, releases with a different date or
+    yanked status are updated, releases which are not in the fresh data
+    anymore are deleted). The statistics stored in the Package are updated
+    accordingly. Everything is done within a single transaction.
+
+    Concurrent updates of the same package (e.g. from several workers) don't
+    duplicate releases : new releases are upserted, and the statistics are
+    recomputed from the stored releases.
 
     Args:
         db (Session): DB Session.
@@ -97,22 +325,46 @@ def update_package(
         releases_data (List[Tuple[str, datetime, bool]]): List of releases data.
             Each element is a tuple with the version name, the release date,
             and if this release is yanked or not.
+        upstream_infos (Optional[Dict[str, Any]], optional): Informations about
+            the PyPi API response (`etag`, `last_modified`, `serial`,
+            `payload_size`) and the TTL of the package to store. Defaults to
+            `None`.
+        commit (bool, optional): If set to `False`, the changes are only
+            flushed, not committed (to write several packages within the same
+            transaction). Defaults to `True`.
 
     Returns:
         models.Package: Package updated.
     """
     # Update the element itself
     db_package.last_updated = func.now()
-    db.commit()
+    for k, v in (upstream_infos or {}).items():
+        setattr(db_package, k, v)
+
+    # Compare the stored releases with the fresh data
+    fresh = {version: (date, is_yanked) for version, date, is_yanked in releases_data}
+    stored = db.query(models.Release.id, models.Release.version, models.Release.date, models.Release.is_yanked).filter(
+        models.Release.package_id == db_package.id
+    )
 
-    # Delete all of its previous releases
-    db.query(models.Release).filter(models.Release.package_id == db_package.id).delete()
+    to_delete, to_update = [], []
+    for release_id, version, date, is_yanked in stored:
+        if version not in fresh:
+            to_delete.append(release_id)
+            continue
 
-    # Recreate the releases from the fresh data
-    create_releases(db, releases_data, db_package.id)
+        fresh_date, fresh_is_yanked = fresh.pop(version)
+        if date != fresh_date or is_yanked != fresh_is_yanked:
+            to_update.append({"id": release_id, "date": fresh_date, "is_yanked": fresh_is_yanked})
 
-    db.refresh(db_package)
-    return db_package
+    # Only write the differences
+    if to_delete:
+        db.query(models.Release).filter(models.Release.id.in_(to_delete)).delete(synchronize_session=False)
+    if to_update:
+        db.execute(update(models.Release), to_update)
+    _insert_releases(db, [(version, date, is_yanked) for version, (date, is_yanked) in fresh.items()], db_package.id)
+    _update_stats(db, db_package.id)
+    return _commit_package(db, db_package, commit)
 
 
 def get_latest_release_of(db: Session, db_package: models.Package) -> models.Release:
@@ -165,3 +417,75 @@ def get_n_versions_yanked_of(db: Session, db_package: models.Package) -> int:
         .filter(models.Release.is_yanked.is_(True))
         .count()
     )
+
+
+# The asynchronous versions of the write functions run the same code as the synchronous ones, but within the
+# event loop : the queries are awaited through the asynchronous driver, so no thread is needed
+
+
+async def create_package_async(
+    db: AsyncSession, pkg_name: str, upstream_infos: Optional[Dict[str, Any]] = None
+) -> models.Package:
+    """Asynchronous version of `create_package`.
+
+    Args:
+        db (AsyncSession): Asynchronous DB Session.
+        pkg_name (str): Name of the package to create.
+        upstream_infos (Optional[Dict[str, Any]], optional): Informations to
+            store in the package (see `create_package`). Defaults to `None`.
+
+    Returns:
+        models.Package: Created Package.
+    """
+    return await db.run_sync(create_package, pkg_name, upstream_infos)
+
+
+async def create_releases_async(db: AsyncSession, releases_data: List[Tuple[str, datetime, bool]], package_id: int):
+    """Asynchronous version of `create_releases`.
+
+    Args:
+        db (AsyncSession): Asynchronous DB Session.
+        releases_data (List[Tuple[str, datetime, bool]]): List of releases data
+            (see `create_releases`).
+        package_id (int): ID of the package this release is associated with.
+    """
+    await db.run_sync(create_releases, releases_data, package_id)
+
+
+async def touch_package_async(
+    db: AsyncSession, db_package: models.Package, upstream_infos: Optional[Dict[str, Any]] = None
+) -> models.Package:
+    """Asynchronous version of `touch_package`.
+
+    Args:
+        db (AsyncSession): Asynchronous DB Session.
+        db_package (models.Package): Package to update.
+        upstream_infos (Optional[Dict[str, Any]], optional): Informations to
+            store in the package (see `touch_package`). Defaults to `None`.
+
+    Returns:
+        models.Package: Package updated.
+    """
+    return await db.run_sync(touch_package, db_package, upstream_infos)
+
+
+async def update_package_async(
+    db: AsyncSession,
+    db_package: models.Package,
+    releases_data: List[Tuple[str, datetime, bool]],
+    upstream_infos: Optional[Dict[str, Any]] = None,
+) -> models.Package:
+    """Asynchronous version of `update_package`.
+
+    Args:
+        db (AsyncSession): Asynchronous DB Session.
+        db_package (models.Package): Package to update.
+        releases_data (List[Tuple[str, datetime, bool]]): List of releases data
+            (see `update_package`).
+        upstream_infos (Optional[Dict[str, Any]], optional): Informations to
+            store in the package (see `update_package`). Defaults to `None`.
+
+    Returns:
+        models.Package: Package updated.
+    """
+    return await db.run_sync(update_package, db_package, releases_data, upstream_infos)
@@ -1,6 +1,6 @@
 """Declaration of the DB model."""
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from oblique.database import Base
@@ -15,6 +15,20 @@ class Package(Base):
     last_updated = Column(DateTime)
     name = Column(String, unique=True, index=True)
 
+    # Statistics about the releases, maintained when releases are written
+    latest_release_date = Column(DateTime)
+    n_versions = Column(Integer, default=0)
+    n_versions_yanked = Column(Integer, default=0)
+
+    # Informations about the last response of the PyPi API, used to send conditional requests
+    etag = Column(String)
+    last_modified = Column(String)
+    serial = Column(Integer)
+    payload_size = Column(Integer)
+
+    # How long the cached data stays fresh (in seconds), computed from the release cadence
+    ttl = Column(Integer)
+
     releases = relationship("Release", back_populates="package", passive_deletes=True)
 
 
@@ -22,11 +36,13 @@ class Release(Base):
     """Table representing a single release of a python package."""
 
     __tablename__ = "releases"
+    # Releases are synchronized by version name, so a package can't have the same version twice
+    __table_args__ = (UniqueConstraint("package_id", "version"),)
 
     id = Column(Integer, primary_key=True, index=True)
     version = Column(String, nullable=False)
     date = Column(DateTime)
     is_yanked = Column(Boolean, default=False)
-    package_id = Column(Integer, ForeignKey("packages.id", ondelete="CASCADE"))
+    package_id = Column(Integer, ForeignKey("packages.id", ondelete="CASCADE"), index=True)
 
     package = relationship("Package", back_populates="releases")
@@ -1,6 +1,9 @@
 """Dependencies used in both the web-app and the API."""
 
-from oblique.database import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from oblique.database import AsyncSessionLocal, SessionLocal
+from oblique.profiling import record_thread
 
 
 def get_db() -> SessionLocal:
@@ -9,8 +12,24 @@ def get_db() -> SessionLocal:
     Yields:
         SessionLocal: DB Session.
     """
+    # This runs in the threadpool : if the request is profiled, sample this thread too
+    record_thread()
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncSession:
+    """FastAPI dependency to create an asynchronous DB Session. If `async_db`
+    is enabled, it replaces `get_db` in the app.
+
+    Yields:
+        AsyncSession: Asynchronous DB Session.
+    """
+    db = AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
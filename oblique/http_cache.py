@@ -0,0 +1,78 @@
+"""Helpers for HTTP caching : ETags, conditional requests and `Cache-Control`
+headers.
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts: Any) -> str:
+    """Compute a strong ETag from the data used to build a response. The same
+    data always gives the same response, so the same ETag.
+
+    Args:
+        parts (Any): Data used to build the response.
+
+    Returns:
+        str: ETag (quoted).
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def cache_headers(etag: str, expires_at: Optional[datetime], vary: Optional[str] = None) -> Dict[str, str]:
+    """Build the HTTP caching headers of a response, so clients and proxies can
+    keep it until the data becomes stale.
+
+    Args:
+        etag (str): ETag of the response.
+        expires_at (Optional[datetime]): When the data of the response becomes
+            stale. If `None`, the response should be revalidated every time.
+        vary (Optional[str], optional): Request headers the response depends
+            on, so caches don't serve it to requests with other values.
+            Defaults to `None`.
+
+    Returns:
+        Dict[str, str]: Headers to add to the response.
+    """
+    max_age = max(int((expires_at - datetime.utcnow()).total_seconds()), 0) if expires_at is not None else 0
+    headers = {"ETag": etag, "Cache-Control": f"max-age={max_age}"}
+    if vary is not None:
+        headers["Vary"] = vary
+    return headers
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Check if the client already has the response, from the `If-None-Match`
+    header of its request.
+
+    Args:
+        request (Request): Request received.
+        etag (str): ETag of the response.
+
+    Returns:
+        bool: `True` if a `304 Not Modified` can be sent instead of the
+            response.
+    """
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+
+    # Weak comparison, as required for `If-None-Match`
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    """Build a `304 Not Modified` response.
+
+    Args:
+        headers (Dict[str, str]): Caching headers of the response.
+
+    Returns:
+        Response: Empty response, with the caching headers.
+    """
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,346 @@
+"""Metrics of the app (latency of the routes, cache effectiveness, calls to the
+PyPi API, DB queries, etc...), exposed in the Prometheus text format.
+
+Metrics register themselves when created. Statistics already kept by other
+components (like the memory cache) are exposed through `CallbackMetric`, read
+only when the metrics are scraped.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import anyio.to_thread
+from fastapi import FastAPI, Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from oblique import config, database
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Samples of a metric : name, labels and value
+Sample = Tuple[str, Dict[str, str], float]
+
+# All metrics created, in order
+registry: List["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_sample(name: str, labels: Dict[str, str], value: float) -> str:
+    """Format a sample in the Prometheus text format."""
+    labels_str = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+    return f"{name}{{{labels_str}}} {value}" if labels_str else f"{name} {value}"
+
+
+class Metric:
+    """Base class of the metrics.
+
+    Args:
+        name (str): Name of the metric.
+        documentation (str): Description of the metric.
+        labels (Sequence[str], optional): Names of the labels of the metric.
+            Defaults to `()`.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Values of the labels, in order."""
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self) -> Iterator[Sample]:
+        """Current samples of the metric."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Render the metric in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(_format_sample(*sample) for sample in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Counter, which can only go up."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        """Increment the counter.
+
+        Args:
+            amount (float, optional): Increment. Defaults to `1`.
+            labels (str): Values of the labels.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[Sample]:
+        """Current samples of the metric."""
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Histogram(Metric):
+    """Histogram, counting the observed values in buckets.
+
+    Args:
+        name (str): Name of the metric.
+        documentation (str): Description of the metric.
+        labels (Sequence[str], optional): Names of the labels of the metric.
+            Defaults to `()`.
+        buckets (Sequence[float], optional): Upper bounds of the buckets.
+            Defaults to `LATENCY_BUCKETS`.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # For each labels : count of each bucket (plus `+Inf`), sum and count of the values
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str):
+        """Observe a value.
+
+        Args:
+            value (float): Value observed.
+            labels (str): Values of the labels.
+        """
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, n = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0, 0))
+            counts[i] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    @contextmanager
+    def time(self, **labels: str):
+        """Context manager observing the time spent in its block, in seconds.
+
+        Args:
+            labels (str): Values of the labels.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[Sample]:
+        """Current samples of the metric."""
+        with self._lock:
+            values = sorted((key, (list(counts), total, n)) for key, (counts, total, n) in self._values.items())
+        for key, (counts, total, n) in values:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": str(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, n
+
+
+class CallbackMetric(Metric):
+    """Metric whose value is read from a function when the metrics are
+    scraped.
+
+    Args:
+        name (str): Name of the metric.
+        documentation (str): Description of the metric.
+        callback (Callable[[], Union[float, Dict[str, float]]]): Function
+            returning the value of the metric, or the value for each value of
+            the label.
+        kind (str, optional): Type of the metric (`gauge` or `counter`).
+            Defaults to `gauge`.
+        label (Optional[str], optional): Name of the label, if the callback
+            returns several values. Defaults to `None`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Union[float, Dict[str, float]]],
+        kind: str = "gauge",
+        label: Optional[str] = None,
+    ):
+        super().__init__(name, documentation, (label,) if label is not None else ())
+        self.kind = kind
+        self.callback = callback
+
+    def samples(self) -> Iterator[Sample]:
+        """Current samples of the metric."""
+        value = self.callback()
+        if value is None:
+            return
+        elif isinstance(value, dict):
+            for label_value, v in sorted(value.items()):
+                yield self.name, {self.labels[0]: label_value}, v
+        else:
+            yield self.name, {}, value
+
+
+def render() -> str:
+    """Render all the metrics in the Prometheus text format.
+
+    Returns:
+        str: Metrics.
+    """
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+# Routes
+http_request_duration = Histogram(
+    "oblique_http_request_duration_seconds",
+    "Latency of the HTTP requests, by route (name of its endpoint).",
+    labels=("method", "route", "status"),
+)
+
+# Packages informations
+package_info_outcomes = Counter(
+    "oblique_package_info_total",
+    "Requests of package informations, by outcome (hit, stale, miss, unknown, upstream_error).",
+    labels=("outcome",),
+)
+
+# PyPi API
+pypi_request_duration = Histogram(
+    "oblique_pypi_request_duration_seconds", "Latency of the calls to the PyPi API.", labels=("status",)
+)
+pypi_payload_size = Histogram(
+    "oblique_pypi_payload_size_bytes", "Size of the responses of the PyPi API.", buckets=SIZE_BUCKETS
+)
+
+# Database (the listeners are set on the engines by `install_metrics`)
+sql_query_duration = Histogram(
+    "oblique_sql_query_duration_seconds", "Duration of the SQL queries.", labels=("statement",)
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Keep the start time of a SQL query."""
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Observe the duration of a SQL query."""
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    sql_query_duration.observe(duration, statement=statement.lstrip().split(None, 1)[0].upper())
+
+
+def _handle_error(context):
+    """Forget the start time of a failed SQL query."""
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+# Threadpool (used for the DB operations)
+def _threadpool_tokens() -> Optional[Tuple[int, int]]:
+    """Number of threads used, and maximum number of threads, of the default
+    threadpool (only available in the event loop).
+    """
+    try:
+        limiter = anyio.to_thread.current_default_thread_limiter()
+    except RuntimeError:
+        return None
+    return limiter.borrowed_tokens, limiter.total_tokens
+
+
+CallbackMetric(
+    "oblique_threadpool_busy_threads",
+    "Number of threads of the threadpool currently used.",
+    lambda: (_threadpool_tokens() or (None, None))[0],
+)
+CallbackMetric(
+    "oblique_threadpool_max_threads",
+    "Maximum number of threads of the threadpool.",
+    lambda: (_threadpool_tokens() or (None, None))[1],
+)
+
+
+def _route_label(request: Request) -> str:
+    """Name of the route matched by a request (like `get_pkg_infos`), so the
+    number of labels doesn't grow with the number of packages requested.
+    """
+    # The path of the route isn't used : for included routers, it may not contain the prefix
+    route = request.scope.get("route")
+    return getattr(route, "name", None) or "unmatched"
+
+
+async def metrics_middleware(request: Request, call_next: Callable) -> Response:
+    """Middleware observing the latency of each request, by route.
+
+    Args:
+        request (Request): Request received.
+        call_next (Callable): Function processing the request.
+
+    Returns:
+        Response: Response to the request.
+    """
+    start = time.perf_counter()
+    response = await call_next(request)
+    http_request_duration.observe(
+        time.perf_counter() - start, method=request.method, route=_route_label(request), status=response.status_code
+    )
+    return response
+
+
+async def metrics_endpoint() -> Response:
+    """Route exposing the metrics, in the Prometheus text format."""
+    return Response(render(), media_type=CONTENT_TYPE)
+
+
+def _listen_sql_queries(engine: Engine):
+    """Set the listeners observing the SQL queries on an engine (only once)."""
+    for name, listener in (
+        ("before_cursor_execute", _before_cursor_execute),
+        ("after_cursor_execute", _after_cursor_execute),
+        ("handle_error", _handle_error),
+    ):
+        if not event.contains(engine, name, listener):
+            event.listen(engine, name, listener)
+
+
+def install_metrics(app: FastAPI):
+    """Install the middleware observing the latency of the routes and the
+    route exposing the metrics on the app, and the listeners observing the SQL
+    queries on the DB engines : the synchronous one, and the asynchronous one
+    if `async_db`.
+
+    Args:
+        app (FastAPI): App to observe.
+    """
+    _listen_sql_queries(database.engine)
+    if config.async_db:
+        _listen_sql_queries(database.get_async_engine().sync_engine)
+
+    app.middleware("http")(metrics_middleware)
+    app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
@@ -0,0 +1,221 @@
+"""Offline ingest of PyPi JSON documents saved locally, for air-gapped or
+batch use.
+
+Two layouts are supported :
+
+* A directory tree of documents, saved either as `<name>/json` (like the
+  path of the PyPi API) or as `<name>.json`.
+* A JSON-lines dump (optionally gzip-compressed), with one document per line.
+  In this case, the name of each package is read from the document itself.
+"""
+
+import gzip
+import itertools
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy.orm import Session
+
+from oblique import config, core
+from oblique.database import SessionLocal, crud
+from oblique.parsing import ReleasesParser
+
+
+# Results of the parsing of a document : name of the package, releases data, and error (if any)
+ParsedDocument = Tuple[Optional[str], Optional[List[Tuple]], Optional[str]]
+
+
+def iter_documents(path: str) -> Iterator[Tuple[Optional[str], Union[str, bytes]]]:
+    """Iterate over the documents to ingest, without loading them all in
+    memory.
+
+    Args:
+        path (str): Path of the directory tree of documents, or of the
+            JSON-lines dump.
+
+    Yields:
+        Tuple[Optional[str], Union[str, bytes]]: The name of the package (if
+            known from the path), and either the path of the document or the
+            document itself (for JSON-lines dumps).
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename == "json":
+                    yield os.path.basename(root), os.path.join(root, filename)
+                elif filename.endswith(".json"):
+                    yield filename[: -len(".json")], os.path.join(root, filename)
+    else:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield None, line
+
+
+def parse_document(pkg_name: Optional[str], source: Union[str, bytes]) -> ParsedDocument:
+    """Extract the releases data from a document, with the same parser used
+    for the responses of the PyPi API.
+
+    Args:
+        pkg_name (Optional[str]): Name of the package, or `None` to read it
+            from the document.
+        source (Union[str, bytes]): Path of the document, or the document
+            itself.
+
+    Returns:
+        ParsedDocument: The name of the package, its releases data, and the
+            error if the document couldn't be parsed.
+    """
+    parser = ReleasesParser()
+    try:
+        if isinstance(source, bytes):
+            parser.feed(source)
+        else:
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(core.CHUNK_SIZE), b""):
+                    parser.feed(chunk)
+        releases = parser.close()
+    except (OSError, ValueError) as e:
+        return pkg_name or parser.name, None, str(e)
+
+    pkg_name = pkg_name or parser.name
+    if pkg_name is None:
+        return None, None, "Missing package name"
+    return pkg_name, releases, None
+
+
+def _parse_batch(batch: List[Tuple[Optional[str], Union[str, bytes]]]) -> List[ParsedDocument]:
+    """Parse a batch of documents (run in a worker process)."""
+    return [parse_document(pkg_name, source) for pkg_name, source in batch]
+
+
+def _batched(iterable: Iterable, n: int) -> Iterator[List]:
+    """Split an iterable into lists of `n` elements (the last one may be
+    shorter).
+    """
+    it = iter(iterable)
+    while batch := list(itertools.islice(it, n)):
+        yield batch
+
+
+def _write_batch(db: Session, parsed: List[ParsedDocument], counts: Counter):
+    """Store a batch of parsed documents in the DB, in a single transaction :
+    new packages are inserted in bulk, packages already cached are updated.
+    """
+    packages_data = {}
+    for pkg_name, releases, error in parsed:
+        if error is not None:
+            counts["failed"] += 1
+        else:
+            packages_data[pkg_name] = releases
+
+    for db_package in crud.get_packages_by_names(db, list(packages_data)):
+        releases = packages_data.pop(db_package.name)
+        ttl = core.compute_ttl([d for _, d, _ in releases])
+        crud.update_package(db, db_package, releases, {"ttl": ttl}, commit=False)
+        core.stats_cache.pop(db_package.name)
+        counts["packages"] += 1
+        counts["releases"] += len(releases)
+
+    ttls = {name: {"ttl": core.compute_ttl([d for _, d, _ in releases])} for name, releases in packages_data.items()}
+    counts["releases"] += crud.create_packages(db, packages_data, ttls, commit=False)
+    counts["packages"] += len(packages_data)
+    db.commit()
+
+
+def ingest(
+    db: Session,
+    path: str,
+    workers: Optional[int] = None,
+    batch_size: int = 1000,
+    progress: Optional[Callable[[Counter, float], None]] = None,
+) -> Counter:
+    """Ingest the PyPi JSON documents saved locally into the DB.
+
+    Documents are parsed by a pool of worker processes, one batch at a time,
+    while the current process is the single writer : each batch is stored in
+    bulk, in a single transaction. At most two batches per worker are in
+    flight, so the memory used doesn't depend on the number of documents.
+
+    Args:
+        db (Session): DB Session.
+        path (str): Path of the directory tree of documents, or of the
+            JSON-lines dump.
+        workers (Optional[int], optional): Number of worker processes. If
+            `None`, the number of CPUs is used. Defaults to `None`.
+        batch_size (int, optional): Number of documents per batch. Defaults
+            to `1000`.
+        progress (Optional[Callable[[Counter, float], None]], optional):
+            Function called after each batch is stored, with the counts so far
+            (`packages`, `releases`, `failed`) and the time elapsed (in
+            seconds). Defaults to `None`.
+
+    Returns:
+        Counter: Counts of the packages and releases stored, and of the
+            documents which couldn't be parsed (`failed`).
+    """
+    workers = workers or os.cpu_count() or 1
+    counts = Counter()
+    start = time.perf_counter()
+
+    def write(parsed: List[ParsedDocument]):
+        _write_batch(db, parsed, counts)
+        if progress is not None:
+            progress(counts, time.perf_counter() - start)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in _batched(iter_documents(path), batch_size):
+            pending.append(executor.submit(_parse_batch, batch))
+            if len(pending) >= 2 * workers:
+                write(pending.popleft().result())
+
+        while pending:
+            write(pending.popleft().result())
+
+    return counts
+
+
+def print_progress(counts: Counter, elapsed: float):
+    """Print the progress of the ingest, and its throughput.
+
+    Args:
+        counts (Counter): Counts of the packages and releases stored so far.
+        elapsed (float): Time elapsed since the start of the ingest, in
+            seconds.
+    """
+    rows = counts["packages"] + counts["releases"]
+    throughput = rows / elapsed if elapsed > 0 else 0
+    print(
+        f"{counts['packages']} packages, {counts['releases']} releases, {counts['failed']} failed "
+        f"({throughput:.0f} rows/s)",
+        file=sys.stderr,
+    )
+
+
+def ingest_mirror():
+    """The function called to ingest the documents given by `mirror_path`."""
+    if config.mirror_path is None:
+        sys.exit("Please specify the documents to ingest with `mirror_path=<path>`")
+
+    if config.db == "memory":
+        print("Warning : the in-memory DB is used, ingested packages will be lost on exit", file=sys.stderr)
+        crud.create_tables()
+
+    db = SessionLocal()
+    try:
+        ingest(
+            db,
+            config.mirror_path,
+            workers=config.mirror_workers or None,
+            batch_size=config.mirror_batch_size,
+            progress=print_progress,
+        )
+    finally:
+        db.close()
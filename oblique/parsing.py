@@ -0,0 +1,378 @@
+"""Incremental parsing of the JSON documents sent by the PyPi API."""
+
+import codecs
+import json
+import re
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from dateutil.parser import isoparse
+
+
+WHITESPACES = " \t\n\r"
+
+# Marker returned when more data is needed to decode a value
+_NEED_MORE = object()
+
+# Content of a string (up to its closing quote), and characters to look for outside of strings (start of a string,
+# nesting, or end of a scalar value)
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_STRUCTURE = re.compile(r'["{}\[\],]')
+
+
+def _scan_string(buf: str, i: int) -> Tuple[int, bool]:
+    """Scan the rest of a JSON string, from the given position.
+
+    Returns:
+        Tuple[int, bool]: The position after the end of the string and `True`,
+            or the position to resume the scan from (once more data is
+            available) and `False`.
+    """
+    # Stops before the closing quote, or before a backslash whose escaped character isn't there yet
+    end = _STRING_BODY.match(buf, i).end()
+    if end < len(buf) and buf[end] == '"':
+        return end + 1, True
+    return end, False
+
+
+def _scan(buf: str, i: int, depth: int, in_string: bool) -> Tuple[int, int, bool, bool]:
+    """Scan a JSON value, from the given position and state. Only the
+    characters delimiting strings and nested values are looked at.
+
+    Returns:
+        Tuple[int, int, bool, bool]: The position where the scan stopped, the
+            nesting depth and if it's inside a string at this position, and
+            if the end of the value was found (the position is then the end
+            of the value).
+    """
+    while True:
+        if in_string:
+            i, closed = _scan_string(buf, i)
+            if not closed or depth == 0:
+                return i, depth, not closed, closed
+            in_string = False
+            continue
+
+        m = _STRUCTURE.search(buf, i)
+        if m is None:
+            return len(buf), depth, False, False
+        c = m.group()
+        if depth == 0 and c in ",}]":
+            # End of a scalar value (the delimiter belongs to the enclosing object)
+            return m.start(), depth, False, True
+
+        i = m.end()
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            depth += 1
+        elif c in "}]":
+            depth -= 1
+            if depth == 0:
+                return i, depth, False, True
+
+
+class ReleasesParser:
+    """Incremental parser for the JSON document describing a package, sent by
+    the PyPi API.
+
+    The document is fed chunk by chunk, and only the data we need (the upload
+    date and yanked status of the first file of each release) is extracted
+    and kept : the rest of the document is skipped without being decoded, and
+    discarded as it comes. Values are only decoded once they are complete, and
+    each character is scanned once. So the memory used doesn't depend on the
+    number of releases of the package, nor on the size of the values skipped
+    (like the description of the package).
+
+    Releases without any file are ignored. The name of the package (from the
+    `info` section) is also kept, in `name`.
+    """
+
+    def __init__(self):
+        self.name: Optional[str] = None
+        self.releases: List[Tuple[str, datetime, bool]] = []
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._key = None
+        # Progress of the scan of the current value : offset from `_pos`, nesting depth, and if inside a string
+        self._scan_state: Optional[Tuple[int, int, bool]] = None
+        self._state = self._start
+
+    def feed(self, data: bytes):
+        """Feed the next chunk of the document to the parser.
+
+        Args:
+            data (bytes): Next chunk of the document.
+
+        Raises:
+            ValueError: Exception raised if the document is not valid.
+        """
+        self._append(self._decoder.decode(data))
+
+    def close(self) -> List[Tuple[str, datetime, bool]]:
+        """Signal the end of the document to the parser, and retrieve the
+        releases data.
+
+        Raises:
+            ValueError: Exception raised if the document is not valid or
+                incomplete.
+
+        Returns:
+            List[Tuple[str, datetime, bool]]: Releases data extracted from the
+                document. Each element is a tuple with the version name, the
+                release date, and if this release is yanked or not.
+        """
+        self._eof = True
+        self._append(self._decoder.decode(b"", final=True))
+
+        if self._state is not None:
+            raise ValueError("Incomplete JSON document")
+        return self.releases
+
+    def _append(self, text: str):
+        """Append decoded text to the buffer (dropping what was already
+        consumed), and run the state machine until more data is needed.
+        """
+        self._buf = self._buf[self._pos :] + text
+        self._pos = 0
+        while self._state is not None and self._state():
+            pass
+
+    def _next_char(self) -> str:
+        """Skip whitespaces, and return the next character (or an empty string
+        if more data is needed).
+        """
+        while self._pos < len(self._buf) and self._buf[self._pos] in WHITESPACES:
+            self._pos += 1
+        return self._buf[self._pos] if self._pos < len(self._buf) else ""
+
+    def _expect(self, char: str) -> bool:
+        """Consume the given character if it's the next one. Return `False` if
+        more data is needed.
+        """
+        c = self._next_char()
+        if c == "":
+            if self._eof:
+                raise ValueError("Incomplete JSON document")
+            return False
+        elif c != char:
+            raise ValueError(f"Expected `{char}` at position {self._pos}, got `{c}`")
+
+        self._pos += 1
+        return True
+
+    def _scan_value(self, skip: bool) -> Optional[int]:
+        """Find the end of the next JSON value, resuming where the previous
+        call stopped (each character is scanned once). The value isn't
+        validated.
+
+        Args:
+            skip (bool): If set to `True`, the characters scanned are consumed
+                right away, so they are dropped from the buffer.
+
+        Raises:
+            ValueError: Exception raised if the document is incomplete.
+
+        Returns:
+            Optional[int]: Position of the end of the value in the buffer, or
+                `None` if more data is needed.
+        """
+        if self._scan_state is None:
+            if self._next_char() == "":
+                if self._eof:
+                    raise ValueError("Incomplete JSON document")
+                return None
+            self._scan_state = (0, 0, False)
+
+        offset, depth, in_string = self._scan_state
+        i, depth, in_string, found = _scan(self._buf, self._pos + offset, depth, in_string)
+
+        if not found:
+            if not self._eof:
+                if skip:
+                    # Drop the characters scanned from the buffer
+                    self._pos = i
+                self._scan_state = (i - self._pos, depth, in_string)
+                return None
+            if in_string or depth > 0:
+                raise ValueError("Incomplete JSON document")
+
+        self._scan_state = None
+        return i
+
+    def _decode(self) -> Any:
+        """Decode the next JSON value. Return `_NEED_MORE` if the value is not
+        complete yet.
+        """
+        end = self._scan_value(skip=False)
+        if end is None:
+            return _NEED_MORE
+
+        value, length = self._json.raw_decode(self._buf[self._pos : end])
+        self._pos += length
+        return value
+
+    def _skip(self) -> bool:
+        """Skip the next JSON value. Return `False` if the value is not
+        complete yet.
+        """
+        end = self._scan_value(skip=True)
+        if end is None:
+            return False
+        self._pos = end
+        return True
+
+    # States of the parser. Each state returns `True` if it made progress,
+    # `False` if more data is needed.
+
+    def _start(self) -> bool:
+        if not self._expect("{"):
+            return False
+        self._state = self._top_key
+        return True
+
+    def _top_key(self) -> bool:
+        c = self._next_char()
+        if c == "}":
+            self._pos += 1
+            self._state = None
+            return True
+        elif c == ",":
+            self._pos += 1
+            return True
+
+        key = self._decode()
+        if key is _NEED_MORE:
+            return False
+        self._key = key
+        self._state = self._top_colon
+        return True
+
+    def _top_colon(self) -> bool:
+        if not self._expect(":"):
+            return False
+        if self._key == "releases":
+            self._state = self._releases_start
+        elif self._key == "info":
+            self._state = self._info_start
+        else:
+            self._state = self._top_value
+        return True
+
+    def _top_value(self) -> bool:
+        # We don't need these values, they are skipped
+        if not self._skip():
+            return False
+        self._state = self._top_key
+        return True
+
+    def _info_start(self) -> bool:
+        c = self._next_char()
+        if c == "" and not self._eof:
+            return False
+        elif c == "{":
+            self._pos += 1
+            self._state = self._info_key
+        else:
+            self._state = self._top_value
+        return True
+
+    def _info_key(self) -> bool:
+        c = self._next_char()
+        if c == "}":
+            self._pos += 1
+            self._state = self._top_key
+            return True
+        elif c == ",":
+            self._pos += 1
+            return True
+
+        key = self._decode()
+        if key is _NEED_MORE:
+            return False
+        self._key = key
+        self._state = self._info_colon
+        return True
+
+    def _info_colon(self) -> bool:
+        if not self._expect(":"):
+            return False
+        self._state = self._info_value
+        return True
+
+    def _info_value(self) -> bool:
+        # We only need the name of the package from this section, the rest is skipped
+        if self._key == "name":
+            value = self._decode()
+            if value is _NEED_MORE:
+                return False
+            self.name = value
+        elif not self._skip():
+            return False
+        self._state = self._info_key
+        return True
+
+    def _releases_start(self) -> bool:
+        if not self._expect("{"):
+            return False
+        self._state = self._release_key
+        return True
+
+    def _release_key(self) -> bool:
+        c = self._next_char()
+        if c == "}":
+            self._pos += 1
+            self._state = self._top_key
+            return True
+        elif c == ",":
+            self._pos += 1
+            return True
+
+        key = self._decode()
+        if key is _NEED_MORE:
+            return False
+        self._key = key
+        self._state = self._release_colon
+        return True
+
+    def _release_colon(self) -> bool:
+        if not self._expect(":"):
+            return False
+        self._state = self._release_files
+        return True
+
+    def _release_files(self) -> bool:
+        files = self._decode()
+        if files is _NEED_MORE:
+            return False
+
+        if files:
+            try:
+                info = files[0]
+                self.releases.append((self._key, isoparse(info["upload_time"]), info["yanked"]))
+            except (KeyError, TypeError) as e:
+                raise ValueError(f"Invalid files for release `{self._key}`") from e
+        self._state = self._release_key
+        return True
+
+
+def parse_releases(document: bytes) -> List[Tuple[str, datetime, bool]]:
+    """Extract the releases data from a complete JSON document describing a
+    package.
+
+    Args:
+        document (bytes): JSON document, as sent by the PyPi API.
+
+    Raises:
+        ValueError: Exception raised if the document is not valid.
+
+    Returns:
+        List[Tuple[str, datetime, bool]]: Releases data extracted from the
+            document (see `ReleasesParser.close`).
+    """
+    parser = ReleasesParser()
+    parser.feed(document)
+    return parser.close()
@@ -0,0 +1,233 @@
+"""Opt-in profiling of single requests, to find where the time goes (calls to
+the PyPi API, parsing, DB operations, rendering, etc...).
+
+When `profiling` is enabled, requests sent with the `profiling_header` header
+are profiled : the stacks of the threads working for this request (the thread
+of the event loop, and the threads of the threadpool running its DB
+operations) are sampled while the request is processed, and the SQL statements
+executed for this request are recorded with their duration. The report is either stored in `profiling_dir`, or returned
+instead of the response.
+
+When `profiling` is disabled, nothing is installed, so there is no overhead.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+from oblique import config, database
+
+
+# Number of functions listed in the summary of the report
+TOP_FUNCTIONS = 30
+
+# Innermost functions of idle threads (waiting for work), ignored when sampling. They are identified by module and
+# function (like in the stacks of the report), so busy functions with the same name are still sampled
+_IDLE_FUNCTIONS = {
+    "threading.py:wait",
+    "queue.py:get",
+    "thread.py:_worker",
+    "selectors.py:select",
+    "base_events.py:run_forever",
+    "socket.py:accept",
+}
+
+
+class Profile:
+    """Profile of a single request : samples of the stacks of the threads
+    working for this request, and SQL statements executed.
+
+    Args:
+        interval (float): Time between two samples, in seconds.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self.statements: List[Tuple[str, float]] = []
+        self.duration: Optional[float] = None
+        self.threads = {threading.get_ident()}
+        self._start = time.perf_counter()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="oblique-profiler", daemon=True)
+
+    def start(self):
+        """Start sampling the stacks of the threads. The profile should be
+        started from the thread of the event loop, which is sampled.
+        """
+        self._sampler.start()
+
+    def stop(self):
+        """Stop sampling, and wait for the sampler to finish."""
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self._start
+
+    def add_thread(self, thread_id: int):
+        """Sample also the given thread (a thread of the threadpool working for
+        this request).
+        """
+        self.threads.add(thread_id)
+
+    def _sample(self):
+        """Sample the stacks of the (non-idle) threads working for this
+        request, until stopped.
+        """
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.threads.copy():
+                frame = frames.get(thread_id)
+                if frame is not None and _frame_name(frame) not in _IDLE_FUNCTIONS:
+                    self.stacks[_collapse(frame)] += 1
+
+    def report(self) -> Dict[str, Any]:
+        """Build the report of the profile.
+
+        Returns:
+            Dict[str, Any]: Duration of the request, SQL statements with their
+                duration, and samples : the number of samples in which each
+                function appears (`top`), and the count of each stack (in the
+                collapsed format used by flame graph tools).
+        """
+        functions = Counter()
+        for stack, count in self.stacks.items():
+            for function in set(stack.split(";")):
+                functions[function] += count
+
+        return {
+            "duration": self.duration,
+            "sql": {
+                "count": len(self.statements),
+                "duration": sum(d for _, d in self.statements),
+                "statements": [{"statement": s, "duration": d} for s, d in self.statements],
+            },
+            "samples": {
+                "interval": self.interval,
+                "count": sum(self.stacks.values()),
+                "top": functions.most_common(TOP_FUNCTIONS),
+                "stacks": dict(self.stacks.most_common()),
+            },
+        }
+
+
+def _frame_name(frame) -> str:
+    """Name of the function of a frame, with its module (like `queue.py:get`)."""
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+
+def _collapse(frame) -> str:
+    """Format the stack of a frame on a single line, outermost frame first."""
+    functions = []
+    while frame is not None:
+        functions.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(functions))
+
+
+# Profile of the request being processed (also visible from the threadpool)
+current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+
+
+def record_thread():
+    """Record the current thread as working for the request being processed,
+    so it's sampled if the request is profiled.
+    """
+    profile = current_profile.get()
+    if profile is not None:
+        profile.add_thread(threading.get_ident())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Keep the start time of a SQL query, if the request is profiled."""
+    profile = current_profile.get()
+    if profile is not None:
+        # The DB operations of the request might run in another thread of the threadpool
+        profile.add_thread(threading.get_ident())
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Record a SQL query, if the request is profiled."""
+    profile = current_profile.get()
+    starts = conn.info.get("profile_query_start")
+    if profile is not None and starts:
+        profile.statements.append((statement, time.perf_counter() - starts.pop()))
+
+
+def _write_report(report: Dict[str, Any]) -> str:
+    """Store a report in `profiling_dir`, and return the path of the file."""
+    os.makedirs(config.profiling_dir, exist_ok=True)
+    path = os.path.join(config.profiling_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+async def profiling_middleware(request: Request, call_next: Callable) -> Response:
+    """Middleware profiling the requests sent with the `profiling_header`
+    header. Other requests are processed as usual.
+
+    Args:
+        request (Request): Request received.
+        call_next (Callable): Function processing the request.
+
+    Returns:
+        Response: Response to the request. If the report isn't stored in
+            `profiling_dir`, the report is returned instead.
+    """
+    if config.profiling_header not in request.headers:
+        return await call_next(request)
+
+    profile = Profile(config.profiling_interval)
+    token = current_profile.set(profile)
+    profile.start()
+    try:
+        response = await call_next(request)
+        # Consume the body, so the whole processing of the request is profiled
+        body = b"".join([chunk async for chunk in response.body_iterator])
+    finally:
+        profile.stop()
+        current_profile.reset(token)
+
+    report = {"method": request.method, "url": str(request.url), "status_code": response.status_code}
+    report.update(profile.report())
+
+    if config.profiling_dir is None:
+        return JSONResponse(report)
+
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    headers["X-Oblique-Profile-Report"] = await run_in_threadpool(_write_report, report)
+    return Response(body, status_code=response.status_code, headers=headers, media_type=response.media_type)
+
+
+def install_profiling(app: FastAPI):
+    """Install the profiling middleware on the app, and the listeners
+    recording the SQL statements of the profiled requests on the DB engines
+    (the synchronous one, and the asynchronous one if `async_db`).
+
+    Args:
+        app (FastAPI): App to profile.
+    """
+    engines = [database.engine]
+    if config.async_db:
+        engines.append(database.get_async_engine().sync_engine)
+
+    for engine in engines:
+        for name, listener in (
+            ("before_cursor_execute", _before_cursor_execute),
+            ("after_cursor_execute", _after_cursor_execute),
+        ):
+            if not event.contains(engine, name, listener):
+                event.listen(engine, name, listener)
+    app.middleware("http")(profiling_middleware)
@@ -0,0 +1,158 @@
+"""Background scheduler, refreshing the hottest packages before they become
+stale.
+"""
+
+import heapq
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from oblique import config, core, metrics
+from oblique.database import SessionLocal, crud
+
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshScheduler:
+    """Scheduler refreshing the hottest packages shortly before their cache
+    expires, so users never have to wait for the PyPi API.
+
+    The access frequency of each package is tracked with a decaying score :
+    at each tick, the accesses recorded by `core` are added to the scores, and
+    the scores are decayed. The `scheduler_hot_packages` packages with the
+    highest scores are considered hot, and are queued for refresh when their
+    expiration date is less than `scheduler_lead` seconds away (minus a random
+    jitter, to spread the refreshes over time). The queue is processed at most
+    at `scheduler_max_rate` refreshes per second, earliest expiration first.
+
+    Statistics (refreshes, failures, refresh lag) are kept in `stats`.
+    """
+
+    def __init__(self):
+        self.scores: Dict[str, float] = {}
+        self.stats = Counter()
+        self.last_lag: Optional[float] = None
+        self._queue: List[Tuple[datetime, str]] = []
+        self._queued = set()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of packages waiting to be refreshed."""
+        return len(self._queue)
+
+    def update_scores(self):
+        """Add the accesses recorded since the last tick to the scores of the
+        packages, decay the scores, and forget the coldest packages.
+        """
+        accesses = core.drain_accesses()
+        for pkg_name in set(self.scores) | set(accesses):
+            self.scores[pkg_name] = self.scores.get(pkg_name, 0) * config.scheduler_decay + accesses[pkg_name]
+
+        hottest = heapq.nlargest(config.scheduler_hot_packages, self.scores.items(), key=lambda x: x[1])
+        self.scores = {pkg_name: score for pkg_name, score in hottest if score >= 0.01}
+
+    def enqueue_due(self, db):
+        """Queue the hot packages which are about to expire.
+
+        Args:
+            db (Session): DB Session.
+        """
+        now = datetime.utcnow()
+        candidates = [pkg_name for pkg_name in self.scores if pkg_name not in self._queued]
+        for db_package in crud.get_packages_by_names(db, candidates) if candidates else []:
+            expires_at = db_package.last_updated + core.package_ttl(db_package)
+            jitter = timedelta(seconds=random.uniform(0, config.scheduler_jitter))
+            if expires_at - timedelta(seconds=config.scheduler_lead) - jitter <= now:
+                heapq.heappush(self._queue, (expires_at, db_package.name))
+                self._queued.add(db_package.name)
+
+    def refresh_next(self, db):
+        """Refresh the package of the queue expiring first.
+
+        Args:
+            db (Session): DB Session.
+        """
+        expires_at, pkg_name = heapq.heappop(self._queue)
+        self._queued.discard(pkg_name)
+
+        try:
+            db_package = crud.get_package_by_name(db, pkg_name)
+            core.refresh_flight.do(pkg_name, core.refresh_package, db, pkg_name, db_package)
+        except core.PyPiAPIException:
+            self.stats["failures"] += 1
+            logger.warning(f"Couldn't refresh package `{pkg_name}`", exc_info=True)
+        else:
+            self.stats["refreshes"] += 1
+
+        # How late the refresh was, compared to the expiration of the package (negative if in time)
+        self.last_lag = (datetime.utcnow() - expires_at).total_seconds()
+
+    def tick(self):
+        """Run one iteration of the scheduler : update the scores, queue the
+        packages about to expire, and refresh as many queued packages as the
+        rate limit allows until the next tick.
+        """
+        self.update_scores()
+
+        db = SessionLocal()
+        try:
+            self.enqueue_due(db)
+
+            max_refreshes = max(int(config.scheduler_max_rate * config.scheduler_interval), 1)
+            for _ in range(max_refreshes):
+                if not self._queue or self._stop.is_set():
+                    break
+                started = time.monotonic()
+                self.refresh_next(db)
+                # Refreshes are paced on their start, so the time taken by the refresh itself counts
+                time.sleep(max(started + 1 / config.scheduler_max_rate - time.monotonic(), 0))
+        finally:
+            db.close()
+
+    def run(self):
+        """Run the scheduler until it's stopped."""
+        while not self._stop.wait(config.scheduler_interval):
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Refresh scheduler tick failed")
+
+    def start(self):
+        """Start the scheduler in a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="oblique-refresh-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler, and wait for its thread to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+scheduler = RefreshScheduler()
+
+# Expose the statistics of the scheduler in the metrics
+metrics.CallbackMetric(
+    "oblique_scheduler_refreshes_total",
+    "Refreshes done by the scheduler, by result (success, failure).",
+    lambda: {"success": scheduler.stats["refreshes"], "failure": scheduler.stats["failures"]},
+    kind="counter",
+    label="result",
+)
+metrics.CallbackMetric(
+    "oblique_scheduler_queue_depth", "Number of packages waiting to be refreshed.", lambda: scheduler.queue_depth
+)
+metrics.CallbackMetric(
+    "oblique_scheduler_lag_seconds",
+    "How late the last refresh was, compared to the expiration of the package (negative if in time).",
+    lambda: scheduler.last_lag,
+)
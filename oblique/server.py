@@ -1,25 +1,109 @@
 """File containing the main function, serving the app."""
 
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 
 from oblique import __version__, config
 from oblique.api import handler as api_handler
 from oblique.api import router as api_router
 from oblique.app import handler as app_handler
+from oblique.app import prerender_static_pages
 from oblique.app import router as app_router
+from oblique.assets import load_assets
+from oblique.configuration import SHARED_DB_ENV
+from oblique.core import close_async_client
 from oblique.database import crud
+from oblique.dependencies import get_async_db, get_db
+from oblique.metrics import install_metrics
+from oblique.profiling import install_profiling
+from oblique.scheduler import scheduler
+from oblique.snapshot import load_snapshot
+from oblique.writer import writer
+
+
+# Environment variable giving the lock file of the refresh scheduler to the workers (see `_take_scheduler_lock`)
+SCHEDULER_LOCK_ENV = "OBLIQUE_SCHEDULER_LOCK"
+
+
+def _take_scheduler_lock() -> bool:
+    """With several workers, only one of them runs the refresh scheduler : the
+    first one to create the lock file.
+
+    Returns:
+        bool: `True` if this worker should run the scheduler.
+    """
+    try:
+        os.close(os.open(os.environ[SCHEDULER_LOCK_ENV], os.O_CREAT | os.O_EXCL))
+    except (KeyError, FileExistsError):
+        return False
+    return True
+
+
+def _remove_files(*paths: str):
+    """Remove the given files, ignoring the files which don't exist."""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Lifespan of the app : compress the static assets and render the static
+    pages on startup, and release the connections to the PyPi API on shutdown.
+    If enabled, the writer applying the cache updates runs while serving, and
+    writes what is still queued on shutdown. With several workers, one of the
+    workers runs the refresh scheduler while serving.
+    """
+    load_assets()
+    prerender_static_pages()
+    if config.write_behind:
+        writer.start()
+    # Accesses are recorded in the memory of each worker, so the scheduler has to run in a worker
+    run_scheduler = config.scheduler and config.workers > 1 and _take_scheduler_lock()
+    if run_scheduler:
+        scheduler.start()
+    yield
+    await close_async_client()
+    if config.write_behind:
+        writer.stop()
+    if run_scheduler:
+        scheduler.stop()
+        _remove_files(os.environ[SCHEDULER_LOCK_ENV])
 
 
 def get_main_app():
     """Create the main FastAPI app, which is made of the web-app and the API."""
-    main_app = FastAPI(title="Oblique", version=__version__, redoc_url=None)
+    main_app = FastAPI(title="Oblique", version=__version__, redoc_url=None, lifespan=lifespan)
+
+    # Compress the dynamic responses (static assets are already compressed)
+    main_app.add_middleware(
+        GZipMiddleware, minimum_size=config.compression_min_size, compresslevel=config.compression_level
+    )
+
+    if config.metrics:
+        # Observe the latency of each route and the SQL queries, and expose all the metrics
+        install_metrics(main_app)
+
+    if config.profiling:
+        install_profiling(main_app)
+
+    if config.async_db:
+        # Run the DB operations of the requests in the event loop, instead of the threadpool
+        main_app.dependency_overrides[get_db] = get_async_db
 
     main_app.add_exception_handler(*api_handler)
     main_app.add_exception_handler(*app_handler)
 
-    main_app.include_router(app_router, tags=["HTML"])
+    # The web-app has a catch-all route, so the API routes should come first
     main_app.include_router(api_router, prefix="/api", tags=["API"])
+    main_app.include_router(app_router, tags=["HTML"])
 
     return main_app
 
@@ -27,11 +111,46 @@ def get_main_app():
 def run():
     """The function called to run the server.
 
-    It will simply run the FastAPI app. Also, if the selected DB is in-memory,
-    it will ensure the tables are created.
+    It will simply run the FastAPI app, created by each worker from the app
+    factory (`get_main_app`). Also, if the selected DB is in-memory, it will
+    ensure the tables are created. If a snapshot of the cache is given, it's
+    loaded before serving. If enabled, the scheduler refreshing the hot
+    packages is run in the background while serving.
+
+    With several `workers`, the workers are separate processes : the `memory`
+    profile uses a temporary DB file shared by all workers (removed on exit),
+    and the scheduler runs in one of the workers. It also uses a temporary DB
+    file with `async_db`.
     """
     if config.db == "memory":
         crud.create_tables()
 
-    main_app = get_main_app()
-    uvicorn.run(main_app, host=config.host, port=config.port)
+    load_snapshot()
+
+    multi_workers = config.workers > 1
+    if multi_workers:
+        os.environ[SCHEDULER_LOCK_ENV] = os.path.join(tempfile.gettempdir(), f"oblique-{os.getpid()}.scheduler")
+        _remove_files(os.environ[SCHEDULER_LOCK_ENV])
+    elif config.scheduler:
+        scheduler.start()
+
+    try:
+        uvicorn.run(
+            "oblique.server:get_main_app",
+            factory=True,
+            host=config.host,
+            port=config.port,
+            workers=config.workers,
+            loop=config.loop,
+            http=config.http,
+            timeout_keep_alive=config.keep_alive_timeout,
+            backlog=config.backlog,
+            limit_concurrency=config.limit_concurrency,
+        )
+    finally:
+        scheduler.stop()
+        if multi_workers:
+            _remove_files(os.environ.pop(SCHEDULER_LOCK_ENV))
+        if config.db == "memory" and (multi_workers or config.async_db):
+            db_path = os.environ[SHARED_DB_ENV]
+            _remove_files(db_path, f"{db_path}-wal", f"{db_path}-shm")
@@ -0,0 +1,153 @@
+"""Export and import of snapshots of the local cache.
+
+A snapshot is a gzip-compressed JSON-lines file. The first line is a header
+(version of the format, alembic revision of the DB schema, and columns of each
+table). Each following line is a block of rows of a table, stored by columns
+(which compresses much better than rows).
+"""
+
+import gzip
+import json
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import DateTime, Table, delete, insert, select
+from sqlalchemy.orm import Session
+
+from oblique import config, core, database
+from oblique.database import SCHEMA_REVISION, SessionLocal, models
+
+
+FORMAT_VERSION = 1
+BLOCK_SIZE = 10_000
+EPOCH = datetime(1970, 1, 1)
+
+# Tables included in the snapshot, parents first
+TABLES: List[Table] = [models.Package.__table__, models.Release.__table__]
+
+
+def _encode(value: Any) -> Any:
+    """Encode a value of the DB into a JSON-compatible value. Dates are stored
+    as timestamps.
+    """
+    return (value - EPOCH).total_seconds() if isinstance(value, datetime) else value
+
+
+def _decoder(table: Table, name: str) -> Callable[[Any], Any]:
+    """Get the function decoding the values of the given column."""
+    if isinstance(table.c[name].type, DateTime):
+        return lambda v: None if v is None else EPOCH + timedelta(seconds=v)
+    return lambda v: v
+
+
+def export_snapshot(db: Session, path: str) -> Dict[str, int]:
+    """Write a snapshot of the local cache (packages and releases) to a file.
+
+    Rows are read and written by blocks, so the whole cache is never loaded in
+    memory.
+
+    Args:
+        db (Session): DB Session.
+        path (str): Path of the snapshot file to write.
+
+    Returns:
+        Dict[str, int]: Number of rows written, by table.
+    """
+    counts = Counter()
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        header = {
+            "format": FORMAT_VERSION,
+            "revision": SCHEMA_REVISION,
+            "tables": {table.name: [c.name for c in table.columns] for table in TABLES},
+        }
+        f.write(json.dumps(header) + "\n")
+
+        for table in TABLES:
+            result = db.execute(select(table).order_by(table.c.id).execution_options(yield_per=BLOCK_SIZE))
+            for rows in result.partitions():
+                columns = {c.name: [_encode(row[i]) for row in rows] for i, c in enumerate(table.columns)}
+                f.write(json.dumps({"table": table.name, "columns": columns}, separators=(",", ":")) + "\n")
+                counts[table.name] += len(rows)
+    return dict(counts)
+
+
+def import_snapshot(db: Session, path: str) -> Dict[str, int]:
+    """Replace the content of the local cache with a snapshot.
+
+    Rows are inserted in bulk, one block at a time, and everything is
+    committed at once.
+
+    Args:
+        db (Session): DB Session.
+        path (str): Path of the snapshot file to load.
+
+    Raises:
+        ValueError: Exception raised if the snapshot was made with another
+            version of the format or of the DB schema.
+
+    Returns:
+        Dict[str, int]: Number of rows loaded, by table.
+    """
+    tables = {table.name: table for table in TABLES}
+    counts = Counter()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format : {header.get('format')}")
+        if header.get("revision") != SCHEMA_REVISION:
+            raise ValueError(
+                f"Snapshot made for the DB revision `{header.get('revision')}`, but the current DB revision is "
+                f"`{SCHEMA_REVISION}`"
+            )
+
+        for table in reversed(TABLES):
+            db.execute(delete(table))
+
+        for line in f:
+            block = json.loads(line)
+            table = tables[block["table"]]
+            columns = {name: map(_decoder(table, name), values) for name, values in block["columns"].items()}
+            rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+            db.execute(insert(table), rows)
+            counts[table.name] += len(rows)
+
+    db.commit()
+
+    # The statistics cached in memory might not match the snapshot
+    core.stats_cache.clear()
+    return dict(counts)
+
+
+def snapshot_cache():
+    """The function called to export a snapshot of the local cache to the file
+    given by `snapshot_file`.
+    """
+    if config.snapshot_file is None:
+        sys.exit("Please specify the file to write with `snapshot_file=<path>`")
+    if database.in_memory:
+        # The in-memory DB only lives as long as this process : there is nothing to export
+        sys.exit("The in-memory DB can't be exported, please specify a persistent DB (like `db=local`)")
+
+    db = SessionLocal()
+    try:
+        counts = export_snapshot(db, config.snapshot_file)
+    finally:
+        db.close()
+
+    print(f"Exported {counts.get('packages', 0)} packages, {counts.get('releases', 0)} releases", file=sys.stderr)
+
+
+def load_snapshot():
+    """Load the snapshot given by `snapshot_file` into the local cache, if
+    any.
+    """
+    if config.snapshot_file is None:
+        return
+
+    db = SessionLocal()
+    try:
+        import_snapshot(db, config.snapshot_file)
+    finally:
+        db.close()
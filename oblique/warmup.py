@@ -0,0 +1,191 @@
+"""Command-line tool preloading the local cache with a list of packages."""
+
+import asyncio
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from oblique import config, core
+from oblique.database import SessionLocal, crud, models
+
+
+def read_package_names(lines: Iterable[str]) -> List[str]:
+    """Read the names of the packages to preload, one per line. Empty lines
+    and comments (starting with `#`) are ignored, and duplicates are removed.
+
+    Args:
+        lines (Iterable[str]): Lines to read (like an opened file).
+
+    Returns:
+        List[str]: Names of the packages, in the order they were read.
+    """
+    names = (line.split("#", 1)[0].strip() for line in lines)
+    return list(dict.fromkeys(name for name in names if name))
+
+
+async def _fetch_chunk(
+    pkg_names: List[str], db_packages: Dict[str, models.Package]
+) -> Tuple[Dict[str, core.PyPiResponse], Dict[str, Exception]]:
+    """Retrieve the data of several packages from the PyPi API, concurrently
+    (at most `batch_concurrency` calls in flight). Conditional requests are
+    sent for the packages already cached.
+    """
+    semaphore = asyncio.Semaphore(config.batch_concurrency)
+
+    async def fetch(pkg_name: str):
+        async with semaphore:
+            try:
+                return await core.fetch_from_pypi_async(pkg_name, db_packages.get(pkg_name))
+            except core.PyPiAPIException as e:
+                return e
+
+    fetched = await asyncio.gather(*[fetch(pkg_name) for pkg_name in pkg_names])
+
+    responses, errors = {}, {}
+    for pkg_name, result in zip(pkg_names, fetched):
+        if isinstance(result, Exception):
+            errors[pkg_name] = result
+        else:
+            responses[pkg_name] = result
+    return responses, errors
+
+
+def _store_chunk(db: Session, responses: Dict[str, core.PyPiResponse], db_packages: Dict[str, models.Package]):
+    """Store the data retrieved for a chunk of packages in a single
+    transaction : new packages are inserted in bulk, packages already cached
+    are updated.
+    """
+    packages_data, infos = {}, {}
+    for pkg_name, response in responses.items():
+        core.stats_cache.pop(pkg_name)
+        db_package = db_packages.get(pkg_name)
+        if response.releases is None:
+            crud.touch_package(db, db_package, response.upstream_infos(), commit=False)
+            continue
+
+        pkg_infos = {**response.upstream_infos(), "ttl": core.compute_ttl([d for _, d, _ in response.releases])}
+        if db_package is not None:
+            crud.update_package(db, db_package, response.releases, pkg_infos, commit=False)
+        else:
+            packages_data[pkg_name] = response.releases
+            infos[pkg_name] = pkg_infos
+
+    crud.create_packages(db, packages_data, infos, commit=False)
+    db.commit()
+
+
+async def warm_packages(
+    db: Session,
+    pkg_names: List[str],
+    chunk_size: int = 500,
+    progress: Optional[Callable[[Counter, float], None]] = None,
+) -> Counter:
+    """Preload the local cache with the given packages.
+
+    Packages are processed by chunks : the packages of a chunk already cached
+    (and fresh) are skipped, and the others are retrieved concurrently from
+    the PyPi API (at most `batch_concurrency` calls in flight). Then the whole
+    chunk is stored in a single transaction, with the new packages inserted in
+    bulk. Each chunk is stored before the next one starts, so if interrupted,
+    the warm-up can be resumed by running it again : the packages already
+    preloaded won't be fetched again.
+
+    Args:
+        db (Session): DB Session.
+        pkg_names (List[str]): Names of the packages to preload.
+        chunk_size (int, optional): Number of packages per chunk. Defaults to
+            `500`.
+        progress (Optional[Callable[[Counter, float], None]], optional):
+            Function called after each chunk, with the counts so far (`done`,
+            `fetched`, `unknown`, `failed`) and the time elapsed (in seconds).
+            Defaults to `None`.
+
+    Returns:
+        Counter: Counts of the packages processed (`done`), fetched from the
+            PyPi API (`fetched`), unknown (`unknown`) and which couldn't be
+            retrieved (`failed`).
+    """
+    counts = Counter()
+    start = time.perf_counter()
+    for i in range(0, len(pkg_names), chunk_size):
+        chunk = pkg_names[i : i + chunk_size]
+
+        db_packages = {p.name: p for p in crud.get_packages_by_names(db, chunk)}
+        now = datetime.utcnow()
+        to_fetch = [
+            pkg_name
+            for pkg_name in chunk
+            if pkg_name not in db_packages
+            or db_packages[pkg_name].last_updated < now - core.package_ttl(db_packages[pkg_name])
+        ]
+
+        responses, errors = await _fetch_chunk(to_fetch, db_packages)
+        _store_chunk(db, responses, db_packages)
+
+        counts["done"] += len(chunk)
+        counts["fetched"] += len(to_fetch)
+        counts["unknown"] += sum(
+            r.releases == [] or (r.releases is None and db_packages[name].n_versions == 0)
+            for name, r in responses.items()
+        )
+        counts["failed"] += len(errors)
+
+        if progress is not None:
+            progress(counts, time.perf_counter() - start)
+
+    await core.close_async_client()
+    return counts
+
+
+def print_progress(counts: Counter, elapsed: float, total: int):
+    """Print the progress of the warm-up, and its throughput.
+
+    Args:
+        counts (Counter): Counts of the packages processed so far.
+        elapsed (float): Time elapsed since the start of the warm-up, in
+            seconds.
+        total (int): Total number of packages to preload.
+    """
+    throughput = counts["done"] / elapsed if elapsed > 0 else 0
+    print(
+        f"[{counts['done']}/{total}] {counts['fetched']} fetched, {counts['unknown']} unknown, "
+        f"{counts['failed']} failed ({throughput:.1f} packages/s)",
+        file=sys.stderr,
+    )
+
+
+def warm():
+    """The function called to preload the local cache.
+
+    The names of the packages are read from the file given by `warm_file`
+    (from stdin if it's `-`).
+    """
+    if config.db == "memory":
+        print("Warning : the in-memory DB is used, preloaded packages will be lost on exit", file=sys.stderr)
+        crud.create_tables()
+
+    if config.warm_file == "-":
+        pkg_names = read_package_names(sys.stdin)
+    else:
+        with open(config.warm_file, "r", encoding="utf-8") as f:
+            pkg_names = read_package_names(f)
+
+    db = SessionLocal()
+    try:
+        counts = asyncio.run(
+            warm_packages(
+                db,
+                pkg_names,
+                chunk_size=config.warm_chunk_size,
+                progress=lambda counts, elapsed: print_progress(counts, elapsed, len(pkg_names)),
+            )
+        )
+    finally:
+        db.close()
+
+    if counts["failed"]:
+        sys.exit(1)
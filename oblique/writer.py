@@ -0,0 +1,182 @@
+"""Write-behind queue : a single writer applying the fresh data retrieved from
+the PyPi API to the DB, so requests don't have to wait for (or compete for)
+DB writes.
+"""
+
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from oblique import config, metrics
+from oblique.database import SessionLocal, crud
+
+
+logger = logging.getLogger(__name__)
+
+# Fresh data of a package : its releases (`None` if it wasn't modified since the last refresh) and the
+# informations to store with it (see `crud.update_package`)
+PendingWrite = Tuple[Optional[List[Tuple[str, datetime, bool]]], Dict[str, Any]]
+
+
+class WriteBehindQueue:
+    """Queue of the packages to write in the DB, applied by a single writer
+    thread in batched transactions.
+
+    Writes are coalesced per package : if a package is submitted again before
+    it's written, only the latest data is written. The queue is flushed when
+    the writer is stopped.
+
+    Statistics (submitted, coalesced, written, batches, failures) are kept in
+    `stats`.
+    """
+
+    def __init__(self):
+        self.stats = Counter()
+        self._pending: Dict[str, PendingWrite] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """If the writer thread is running (writes are applied right away
+        otherwise).
+        """
+        return self._thread is not None
+
+    @property
+    def pending(self) -> int:
+        """Number of packages waiting to be written."""
+        return len(self._pending)
+
+    def submit(self, pkg_name: str, releases: Optional[List[Tuple[str, datetime, bool]]], infos: Dict[str, Any]):
+        """Queue the fresh data of a package, to be written by the writer.
+
+        Args:
+            pkg_name (str): Name of the package.
+            releases (Optional[List[Tuple[str, datetime, bool]]]): Releases
+                data of the package, or `None` if it wasn't modified since the
+                last refresh.
+            infos (Dict[str, Any]): Informations about the PyPi API response
+                and TTL of the package to store.
+        """
+        with self._lock:
+            previous = self._pending.get(pkg_name)
+            if previous is not None:
+                self.stats["coalesced"] += 1
+                if releases is None:
+                    # Not modified since the data already queued : keep it
+                    releases = previous[0]
+                    infos = {**previous[1], **infos}
+            self._pending[pkg_name] = (releases, infos)
+            self.stats["submitted"] += 1
+        self._wake.set()
+
+    def _write_batch(self, db: Session, batch: Dict[str, PendingWrite]):
+        """Write a batch of packages, in a single transaction."""
+        db_packages = {p.name: p for p in crud.get_packages_by_names(db, list(batch))}
+
+        new_packages, new_infos = {}, {}
+        for pkg_name, (releases, infos) in batch.items():
+            db_package = db_packages.get(pkg_name)
+            if db_package is None:
+                if releases is not None:
+                    new_packages[pkg_name], new_infos[pkg_name] = releases, infos
+            elif releases is None:
+                crud.touch_package(db, db_package, infos, commit=False)
+            else:
+                crud.update_package(db, db_package, releases, infos, commit=False)
+        crud.create_packages(db, new_packages, new_infos, commit=False)
+
+        db.commit()
+
+    def _try_write(self, batch: Dict[str, PendingWrite]) -> Optional[Exception]:
+        """Write a batch of packages, with its own DB Session.
+
+        Returns:
+            Optional[Exception]: The exception raised if the batch couldn't be
+                written (nothing is written then), or `None`.
+        """
+        db = SessionLocal()
+        try:
+            self._write_batch(db, batch)
+        except Exception as e:
+            db.rollback()
+            return e
+        finally:
+            db.close()
+
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+        return None
+
+    def flush(self):
+        """Write all the packages queued so far.
+
+        If a batch conflicts with the DB (like a package created meanwhile by
+        another process), its packages are written one by one, so only the
+        conflicting packages fail.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+
+            items = list(pending.items())
+            for i in range(0, len(items), config.write_behind_batch_size):
+                batch = dict(items[i : i + config.write_behind_batch_size])
+                error = self._try_write(batch)
+                if isinstance(error, IntegrityError) and len(batch) > 1:
+                    logger.warning(f"Conflict while writing {len(batch)} packages, writing them one by one")
+                    errors = {pkg_name: self._try_write({pkg_name: write}) for pkg_name, write in batch.items()}
+                    errors = {pkg_name: e for pkg_name, e in errors.items() if e is not None}
+                else:
+                    errors = dict.fromkeys(batch, error) if error is not None else {}
+
+                if errors:
+                    # The data is still cached in memory, and will be fetched again once it expires
+                    self.stats["failures"] += len(errors)
+                    logger.error(f"Couldn't write {len(errors)} packages", exc_info=next(iter(errors.values())))
+
+    def run(self):
+        """Write the queued packages as they come, until stopped."""
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            # Let more writes accumulate, so they're batched together
+            self._stop.wait(config.write_behind_delay)
+            self.flush()
+
+    def start(self):
+        """Start the writer in a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="oblique-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the writer, and write what is still queued."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+writer = WriteBehindQueue()
+
+# Expose the statistics of the writer in the metrics
+metrics.CallbackMetric("oblique_writer_pending", "Number of packages waiting to be written.", lambda: writer.pending)
+metrics.CallbackMetric(
+    "oblique_writer_events_total",
+    "Packages handled by the writer, by event (submitted, coalesced, written, failures).",
+    lambda: {k: writer.stats[k] for k in ("submitted", "coalesced", "written", "failures")},
+    kind="counter",
+    label="event",
+)
@@ -15,11 +15,15 @@ reqs = [
     "sqlalchemy~=2.0",
     "jinjax~=0.25",
     "requests~=2.31",
+    "httpx~=0.27",
     "python-dateutil~=2.8",
 ]
 
 extras_require = {
     "admin": ["alembic~=1.12"],
+    "http2": ["httpx[http2]~=0.27"],
+    "brotli": ["brotli~=1.1"],
+    "async": ["sqlalchemy[asyncio]~=2.0", "aiosqlite~=0.20"],
     "test": ["pytest~=8.0", "pytest-cov~=6.0", "coverage-badge~=1.0"],
     "hook": ["pre-commit~=4.0"],
     "lint": ["black~=24.1", "ruff~=0.1", "djlint~=1.33"],
@@ -50,5 +54,12 @@ setuptools.setup(
     python_requires=">=3.9",
     install_requires=reqs,
     extras_require=extras_require,
-    entry_points={"console_scripts": ["oblique=oblique:run"]},
+    entry_points={
+        "console_scripts": [
+            "oblique=oblique:run",
+            "oblique-warm=oblique:warm",
+            "oblique-snapshot=oblique:snapshot_cache",
+            "oblique-mirror=oblique:ingest_mirror",
+        ]
+    },
 )
@@ -1,4 +1,7 @@
+import atexit
 import os
+import shutil
+import tempfile
 
 import pytest
 from fastapi.testclient import TestClient
@@ -6,16 +9,33 @@ from fastapi.testclient import TestClient
 
 # Before importing oblique, set some options specifically for testing
 # Importing oblique will load the configuration, so this should be done before !
-os.environ["OBLIQUE_DB"] = "memory"
+# The asynchronous DB can't use an in-memory DB, so a temporary DB file is used (removed at the end of the tests)
+TMP_DB_DIR = tempfile.mkdtemp(prefix="oblique-tests-")
+atexit.register(shutil.rmtree, TMP_DB_DIR, ignore_errors=True)
+os.environ["OBLIQUE_DB"] = "local"
+os.environ["OBLIQUE_DB_PATH"] = os.path.join(TMP_DB_DIR, "db.sql")
 
 
 import oblique  # noqa: E402
 from oblique.database import SessionLocal, crud  # noqa: E402
 
+from .mock_pypi_api import start_server  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def mock_pypi_api():
+    # Make oblique call a local stand-in of the PyPi API instead of the real one
+    url, server = start_server()
+    oblique.config.pypi_url = url
+
+    yield url
+
+    server.shutdown()
+
 
 @pytest.fixture(scope="session")
 def db():
-    # Create the tables for the in-memory DB
+    # Create the tables for the temporary DB
     crud.create_tables()
 
     db = SessionLocal()
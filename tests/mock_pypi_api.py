@@ -1,68 +1,80 @@
+import json
 import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
 
-import requests
 
-
-class ResponseOk:
-    def __init__(self):
-        self.status_code = 200
-
-    def json(self):
-        return {
-            "releases": {
-                "v1.2.10": [
-                    {
-                        "upload_time": "2021-08-09T14:27:16",
-                        "yanked": False,
-                    }
-                ],
-                "v1.1.0": [
-                    {
-                        "upload_time": "2021-06-09T14:27:16",
-                        "yanked": True,
-                    }
-                ],
-                "v0.2.0": [
-                    {
-                        "upload_time": "2021-05-09T14:27:16",
-                        "yanked": False,
-                    }
-                ],
+RELEASES = {
+    "releases": {
+        "v1.2.10": [
+            {
+                "upload_time": "2021-08-09T14:27:16",
+                "yanked": False,
             }
-        }
-
-
-class Response404:
-    def __init__(self):
-        self.status_code = 404
-
-    def json(self):
-        return {"message": "Not Found"}
-
-
-class Response301:
-    def __init__(self):
-        self.status_code = 301
-
-    def json(self):
-        return {"message": "Redirected"}
-
-
-def mock_get(url: str):
-    z = re.match(r"https://pypi.org/pypi/([^/]+)/json", url)
-    assert z, f"Oblique is trying to access {url}, which is not mocked. Can't run the test."
-
-    pkg_name = z.group(1)
-
-    if pkg_name.startswith("transformers"):
-        return ResponseOk()
-    elif pkg_name == "lisduyfg" or pkg_name.startswith("unknown"):
-        return Response404()
-    elif pkg_name == "redirected" or pkg_name.startswith("crashapi"):
-        return Response301()
-    else:
-        assert False, f"Oblique is trying to access package `{pkg_name}`, which is not mocked. Can't run the test."
-
-
-# Mock the `get` function of requests
-requests.get = mock_get
+        ],
+        "v1.1.0": [
+            {
+                "upload_time": "2021-06-09T14:27:16",
+                "yanked": True,
+            }
+        ],
+        "v0.2.0": [
+            {
+                "upload_time": "2021-05-09T14:27:16",
+                "yanked": False,
+            }
+        ],
+    }
+}
+ETAG = '"transformers-etag"'
+
+
+class MockPyPiHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the PyPi API, answering depending on the package name."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        z = re.match(r"/pypi/([^/]+)/json", self.path)
+        assert z, f"Oblique is trying to access {self.path}, which is not mocked. Can't run the test."
+
+        pkg_name = unquote(z.group(1))
+
+        if pkg_name.startswith("transformers") and self.headers.get("If-None-Match") == ETAG:
+            self.send_json(304, None, headers={"ETag": ETAG})
+        elif pkg_name.startswith("transformers"):
+            self.send_json(200, RELEASES, headers={"ETag": ETAG, "X-PyPI-Last-Serial": "1234"})
+        elif pkg_name == "lisduyfg" or pkg_name.startswith("unknown"):
+            self.send_json(404, {"message": "Not Found"})
+        elif pkg_name == "invalid":
+            self.send_json(200, {"releases": [1, 2, 3]})
+        elif pkg_name.startswith("Moved"):
+            # Non-canonical name, redirected to the canonical one
+            canonical_name = "transformers" + pkg_name[len("Moved") :]
+            self.send_json(301, None, headers={"Location": f"/pypi/{quote(canonical_name)}/json"})
+        elif pkg_name == "redirected" or pkg_name.startswith("crashapi"):
+            self.send_json(301, {"message": "Redirected"})
+        else:
+            # Oblique is trying to access a package which is not mocked, make the test crash
+            self.send_json(500, {"message": f"Package `{pkg_name}` is not mocked"})
+
+    def send_json(self, status_code, data, headers=None):
+        body = json.dumps(data).encode() if data is not None else b""
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    """Start the mocked PyPi API in a background thread, and return its URL and the server."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockPyPiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
@@ -1,5 +1,9 @@
+from datetime import timedelta
+
 from dateutil.parser import isoparse
 
+import oblique
+from oblique import core
 from oblique.database import crud
 
 
@@ -29,7 +33,110 @@ def test_pkg_infos_force_refresh(client, db):
     assert data["n_versions_yanked"] == 1
 
 
+def test_pkg_infos_stale_while_revalidate(client, db, monkeypatch):
+    monkeypatch.setattr(oblique.config, "stale_while_revalidate", True)
+    monkeypatch.setattr(core, "CACHE_TTL", timedelta())
+    db_pkg = crud.create_package(db, "transformers#api_swr")
+    crud.create_releases(db, [("v0.0.1", isoparse("2002-07-25T11:27:16"), False)], db_pkg.id)
+
+    # The stale data is returned right away, and refreshed in the background
+    r = client.post("/api/pkg_infos", json={"pkg_name": "transformers#api_swr"})
+    assert r.status_code == 200
+    assert r.json()["n_versions"] == 1
+
+    r = client.post("/api/pkg_infos", json={"pkg_name": "transformers#api_swr"})
+    assert r.status_code == 200
+    assert r.json()["n_versions"] == 3
+
+
+def test_pkg_infos_stale_while_revalidate_force_refresh(client, db, monkeypatch):
+    monkeypatch.setattr(oblique.config, "stale_while_revalidate", True)
+    monkeypatch.setattr(core, "CACHE_TTL", timedelta())
+    db_pkg = crud.create_package(db, "transformers#api_swr_2")
+    crud.create_releases(db, [("v0.0.1", isoparse("2002-07-25T11:27:16"), False)], db_pkg.id)
+
+    r = client.post("/api/pkg_infos", json={"pkg_name": "transformers#api_swr_2", "force_refresh": True})
+    assert r.status_code == 200
+    assert r.json()["n_versions"] == 3
+
+
 def test_pkg_infos_unknown_package(client, db):
     r = client.post("/api/pkg_infos", json={"pkg_name": "unknown#api"})
 
     assert r.status_code == 404
+
+
+def test_batch_pkg_infos(client, db):
+    db_pkg = crud.create_package(db, "crashapi#api_batch")
+    crud.create_releases(db, [("v0.0.1", isoparse("2002-07-25T11:27:16"), False)], db_pkg.id)
+
+    r = client.post(
+        "/api/pkg_infos/batch",
+        json={"pkg_names": ["crashapi#api_batch", "transformers#api_batch", "unknown#api_batch", "redirected"]},
+    )
+
+    assert r.status_code == 200
+    data = r.json()
+    assert data["packages"] == {
+        "crashapi#api_batch": {"last_release": "2002-07-25T11:27:16", "n_versions": 1, "n_versions_yanked": 0},
+        "transformers#api_batch": {"last_release": "2021-08-09T14:27:16", "n_versions": 3, "n_versions_yanked": 1},
+    }
+    assert data["errors"]["unknown#api_batch"]["status_code"] == 404
+    assert data["errors"]["redirected"]["status_code"] == 502
+
+
+def test_batch_pkg_infos_force_refresh(client, db):
+    db_pkg = crud.create_package(db, "transformers#api_batch_2")
+    crud.create_releases(db, [("v0.0.1", isoparse("2002-07-25T11:27:16"), False)], db_pkg.id)
+
+    r = client.post("/api/pkg_infos/batch", json={"pkg_names": ["transformers#api_batch_2"], "force_refresh": True})
+
+    assert r.status_code == 200
+    assert r.json()["packages"]["transformers#api_batch_2"]["n_versions"] == 3
+
+
+def test_batch_pkg_infos_too_many_packages(client, db):
+    names = [f"transformers#{i}" for i in range(oblique.config.batch_max_size + 1)]
+    r = client.post("/api/pkg_infos/batch", json={"pkg_names": names})
+
+    assert r.status_code == 422
+
+
+def test_pkg_infos_get(client, db):
+    db_pkg = crud.create_package(db, "transformers#api_get")
+    crud.create_releases(db, [("v0.0.1", isoparse("2002-07-25T11:27:16"), False)], db_pkg.id)
+
+    r = client.get("/api/pkg_infos", params={"pkg_name": "transformers#api_get"})
+
+    assert r.status_code == 200
+    assert r.json()["last_release"] == "2002-07-25T11:27:16"
+    assert r.headers["etag"].startswith('"')
+    max_age = int(r.headers["cache-control"].removeprefix("max-age="))
+    assert 0 < max_age <= core.CACHE_TTL.total_seconds()
+
+
+def test_pkg_infos_get_not_modified(client, db):
+    r = client.get("/api/pkg_infos", params={"pkg_name": "transformers_api_304"})
+    etag = r.headers["etag"]
+
+    r = client.get("/api/pkg_infos", params={"pkg_name": "transformers_api_304"}, headers={"If-None-Match": etag})
+
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == etag
+
+    # Weak comparison, and several ETags
+    r = client.get(
+        "/api/pkg_infos", params={"pkg_name": "transformers_api_304"}, headers={"If-None-Match": f'"other", W/{etag}'}
+    )
+    assert r.status_code == 304
+
+    r = client.get("/api/pkg_infos", params={"pkg_name": "transformers_api_304"}, headers={"If-None-Match": '"other"'})
+    assert r.status_code == 200
+
+
+def test_pkg_infos_get_unknown(client, db):
+    r = client.get("/api/pkg_infos", params={"pkg_name": "unknown_api_get"})
+
+    assert r.status_code == 404
+    assert "etag" not in r.headers
@@ -1,3 +1,9 @@
+from fastapi.testclient import TestClient
+
+import oblique
+from oblique import app
+
+
 def test_home_route(client):
     r = client.get("/")
     assert r.status_code == 200
@@ -26,6 +32,21 @@ def test_search_basic(client, db):
     assert "1" in r.text and "Versions yanked" in r.text
 
 
+def test_search_not_modified(client, db):
+    pkg = "transformers_app_304"
+    r = client.get(f"/search?pkg={pkg}", headers={"hx-request": "true"})
+
+    assert r.headers["cache-control"].startswith("max-age=")
+    # Caches shouldn't serve this fragment to requests which aren't from HTMX
+    assert "HX-Request" in r.headers["vary"]
+
+    r = client.get(f"/search?pkg={pkg}", headers={"hx-request": "true", "If-None-Match": r.headers["etag"]})
+
+    assert r.status_code == 304
+    assert "HX-Request" in r.headers["vary"]
+    assert r.text == ""
+
+
 def test_search_unknown(client, db):
     pkg = "unknown_app_1"
     r = client.get(f"/search?pkg={pkg}", headers={"hx-request": "true"})
@@ -46,3 +67,25 @@ def test_search_not_htmx(client, db):
     r = client.get(f"/search?pkg={pkg}")
 
     assert r.status_code == 404
+
+
+def test_prerender_static_pages(db):
+    app.static_pages.clear()
+
+    # Static pages are rendered on startup
+    with TestClient(oblique.server.get_main_app()) as client:
+        assert len(app.static_pages) == len(app.STATIC_PAGES)
+        assert client.get("/").text == app.static_pages[("HomePage",)]
+
+
+def test_render_fragment_cache():
+    kwargs = {"pkg_name": "app_fragment", "last_release": "3 days ago", "n_versions": 3, "n_versions_yanked": 1}
+    hits = app.fragment_cache.stats["hits"]
+
+    html = app.render("SearchResult", **kwargs)
+
+    assert app.render("SearchResult", **kwargs) is html
+    assert app.fragment_cache.stats["hits"] == hits + 1
+
+    # Different statistics are rendered again
+    assert "42" in app.render("SearchResult", **{**kwargs, "n_versions": 42})
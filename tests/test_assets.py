@@ -0,0 +1,75 @@
+import pytest
+
+from oblique import assets
+
+
+@pytest.fixture(scope="module", autouse=True)
+def loaded_assets():
+    assets.load_assets()
+
+
+def test_load_assets():
+    logo = assets.assets["logo.svg"]
+
+    assert logo.media_type == "image/svg+xml"
+    assert logo.url.startswith("/static/logo.") and logo.url.endswith(".svg")
+    assert assets.asset_url("logo.svg") == logo.url
+    assert assets.find_asset(logo.url) is logo
+    assert len(logo.variants["gzip"]) < len(logo.variants["identity"])
+
+
+def test_asset_url_not_loaded():
+    assert assets.asset_url("unknown.css") == "/unknown.css"
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("", "identity"),
+        ("gzip, deflate", "gzip"),
+        ("br;q=1.0, gzip;q=0.8", "br"),
+        ("br;q=0, gzip", "gzip"),
+        ("gzip;q=0", "identity"),
+        ("*", "br"),
+        ("gzip;q=invalid", "identity"),
+    ],
+)
+def test_negotiate_encoding(accept_encoding, expected):
+    available = {"identity": b"...", "gzip": b"..", "br": b"."}
+
+    assert assets.negotiate_encoding(accept_encoding, available) == expected
+
+
+def test_static_asset_route(client):
+    url = assets.asset_url("logo.svg")
+
+    r = client.get(url, headers={"Accept-Encoding": "gzip"})
+
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert "immutable" in r.headers["cache-control"]
+    assert r.content == assets.assets["logo.svg"].variants["identity"]
+
+    r = client.get(url, headers={"If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
+
+
+def test_static_asset_route_unknown(client):
+    r = client.get("/static/logo.0123456789abcdef.svg")
+
+    assert r.status_code == 404
+
+
+def test_favicon_revalidated(client):
+    r = client.get("/favicon.ico", headers={"Accept-Encoding": "identity"})
+
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == "no-cache"
+    assert "content-encoding" not in r.headers
+
+
+def test_dynamic_responses_compressed(client):
+    r = client.get("/", headers={"Accept-Encoding": "gzip"})
+
+    assert r.headers["content-encoding"] == "gzip"
+    assert assets.asset_url("logo.svg") in r.text
@@ -0,0 +1,171 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from dateutil.parser import isoparse
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+
+pytest.importorskip("aiosqlite")
+
+import oblique  # noqa: E402
+from oblique import core, database  # noqa: E402
+from oblique.database import AsyncSessionLocal, crud  # noqa: E402
+
+
+RELEASES = [("v0.0.1", isoparse("2002-07-25T11:27:16"), False), ("v0.0.2", isoparse("2002-08-25T11:27:16"), True)]
+
+
+def run_with_session(fn, *args):
+    async def run():
+        async with AsyncSessionLocal() as adb:
+            return await fn(adb, *args)
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def no_threadpool(monkeypatch):
+    def forbidden(*args, **kwargs):
+        raise AssertionError("The threadpool shouldn't be used with an asynchronous DB Session")
+
+    monkeypatch.setattr(core, "run_in_threadpool", forbidden)
+
+
+@pytest.fixture
+def async_client(db, monkeypatch, no_threadpool):
+    monkeypatch.setattr(oblique.config, "async_db", True)
+    yield TestClient(oblique.server.get_main_app())
+
+
+def test_async_crud_read(db):
+    db_pkg = crud.create_package(db, "async#1")
+    crud.create_releases(db, RELEASES, db_pkg.id)
+
+    pkg = run_with_session(crud.get_package_by_name_async, "async#1")
+    assert (pkg.id, pkg.n_versions, pkg.n_versions_yanked) == (db_pkg.id, 2, 1)
+
+    pkgs = run_with_session(crud.get_packages_by_names_async, ["async#1", "async#unknown"])
+    assert [p.name for p in pkgs] == ["async#1"]
+
+
+def test_async_crud_write(db):
+    async def write(adb):
+        db_pkg = await crud.create_package_async(adb, "async#2", {"etag": "a"})
+        await crud.create_releases_async(adb, RELEASES[:1], db_pkg.id)
+        await crud.update_package_async(adb, db_pkg, RELEASES, {"etag": "b"})
+        return await crud.touch_package_async(adb, db_pkg, {"etag": "c"})
+
+    pkg = run_with_session(write)
+
+    assert (pkg.n_versions, pkg.etag) == (2, "c")
+    db_pkg = crud.get_package_by_name(db, "async#2")
+    assert (db_pkg.n_versions, db_pkg.n_versions_yanked, db_pkg.etag) == (2, 1, "c")
+    assert len(db_pkg.releases) == 2
+
+
+def test_async_get_package_info(db, no_threadpool):
+    assert run_with_session(core.get_package_info_async, "transformers#async_3") == ("09 Aug 2021", 3, 1)
+
+    db_pkg = crud.get_package_by_name(db, "transformers#async_3")
+    assert db_pkg.n_versions == 3
+    assert db_pkg.ttl is not None
+
+
+def test_async_refresh_not_modified(db, no_threadpool):
+    db_pkg = crud.create_package(db, "transformers#async_4", {"etag": '"transformers-etag"'})
+    crud.create_releases(db, RELEASES, db_pkg.id)
+    db_pkg.last_updated = datetime.utcnow() - timedelta(days=2)
+    db.commit()
+
+    stats = run_with_session(core.get_package_stats_async, "transformers#async_4")
+
+    assert stats[1:3] == (2, 1)
+    db.refresh(db_pkg)
+    assert db_pkg.last_updated > datetime.utcnow() - timedelta(hours=1)
+
+
+def test_async_get_packages_info(db, no_threadpool):
+    db_pkg = crud.create_package(db, "crashapi#async_5")
+    crud.create_releases(db, RELEASES, db_pkg.id)
+
+    results, errors = run_with_session(
+        core.get_packages_info_async, ["crashapi#async_5", "transformers#async_5", "unknown#async_5"]
+    )
+
+    assert results == {"crashapi#async_5": ("25 Aug 2002", 2, 1), "transformers#async_5": ("09 Aug 2021", 3, 1)}
+    assert isinstance(errors["unknown#async_5"], core.UnknownPackageException)
+    assert crud.get_package_by_name(db, "transformers#async_5").n_versions == 3
+
+
+def test_async_api_routes(async_client):
+    r = async_client.post("/api/pkg_infos", json={"pkg_name": "transformers#async_api"})
+    assert r.status_code == 200
+    assert r.json()["n_versions"] == 3
+
+    r = async_client.get("/api/pkg_infos", params={"pkg_name": "transformers#async_api", "force_refresh": True})
+    assert r.status_code == 200
+    assert r.json()["last_release"] == "2021-08-09T14:27:16"
+
+    r = async_client.post("/api/pkg_infos/batch", json={"pkg_names": ["transformers#async_api", "unknown#async_api"]})
+    assert r.status_code == 200
+    assert list(r.json()["packages"]) == ["transformers#async_api"]
+    assert r.json()["errors"]["unknown#async_api"]["status_code"] == 404
+
+
+def test_async_metrics(async_client):
+    async_client.post("/api/pkg_infos", json={"pkg_name": "transformers#async_metrics"})
+
+    sync_engine = database.get_async_engine().sync_engine
+    assert event.contains(sync_engine, "after_cursor_execute", oblique.metrics._after_cursor_execute)
+
+
+def test_async_search(async_client):
+    r = async_client.get("/search?pkg=transformers_async_app", headers={"hx-request": "true"})
+
+    assert r.status_code == 200
+    assert "09 Aug 2021" in r.text
+
+
+def test_async_stale_while_revalidate(async_client, db, monkeypatch):
+    monkeypatch.setattr(oblique.config, "stale_while_revalidate", True)
+    monkeypatch.setattr(core, "CACHE_TTL", timedelta())
+    db_pkg = crud.create_package(db, "transformers#async_swr")
+    crud.create_releases(db, RELEASES[:1], db_pkg.id)
+
+    r = async_client.post("/api/pkg_infos", json={"pkg_name": "transformers#async_swr"})
+    assert r.json()["n_versions"] == 1
+
+    # Refreshed in the background, with its own asynchronous DB Session
+    db.refresh(db_pkg)
+    assert db_pkg.n_versions == 3
+
+
+def test_async_engine_requires_db_file(monkeypatch):
+    monkeypatch.setattr(database, "in_memory", True)
+    monkeypatch.setattr(database, "_async_engine", None)
+
+    # The connections of the asynchronous engine can't share an in-memory DB
+    with pytest.raises(ValueError):
+        database.get_async_engine()
+
+
+def test_async_engine_requires_aiosqlite(monkeypatch):
+    monkeypatch.setattr(database, "aiosqlite", None)
+    monkeypatch.setattr(database, "_async_engine", None)
+
+    with pytest.raises(ImportError):
+        database.get_async_engine()
+
+
+def test_store_package_async_created_concurrently(db):
+    response = core.fetch_from_pypi("transformers")
+    db_pkg = crud.create_package(db, "async#created")
+    crud.create_releases(db, RELEASES, db_pkg.id)
+
+    # The package was created by another worker after it was looked up
+    pkg = run_with_session(core.store_package_async, "async#created", None, response)
+
+    assert (pkg.n_versions, pkg.n_versions_yanked) == (3, 1)
+    assert len(crud.get_packages_by_names(db, ["async#created"])) == 1
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from oblique.cache import LRUCache
+
+
+def test_lru_cache_hit_and_miss():
+    cache = LRUCache(2)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_lru_cache_evict_least_recently_used():
+    cache = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats["evictions"] == 1
+
+
+def test_lru_cache_expired_entry():
+    cache = LRUCache(2)
+    cache.set("a", 1, expires_at=datetime.utcnow() - timedelta(seconds=1))
+    cache.set("b", 2, expires_at=datetime.utcnow() + timedelta(hours=1))
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_lru_cache_pop_and_clear():
+    cache = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.pop("a")
+    cache.pop("unknown")
+    assert cache.get("a") is None
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_lru_cache_disabled():
+    cache = LRUCache(0)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
@@ -1,3 +1,6 @@
+import asyncio
+import threading
+import time
 from datetime import datetime, timedelta
 
 import pytest
@@ -5,9 +8,9 @@ from dateutil.parser import isoparse
 
 import oblique
 from oblique import core
-from oblique.database import crud
+from oblique.database import SessionLocal, crud
 
-from . import mock_pypi_api  # noqa: F401 (just importing it will monkey-patch requests.get to mimic PyPi API !)
+from . import mock_pypi_api
 
 
 def test_package_has_version():
@@ -34,6 +37,84 @@ def test_request_pypi_api_unknown_status_code():
         core.get_package_info_from_pypi("redirected")
 
 
+def test_request_pypi_api_invalid_response():
+    with pytest.raises(core.PyPiAPIException):
+        core.get_package_info_from_pypi("invalid")
+
+    with pytest.raises(core.PyPiAPIException):
+        asyncio.run(core.get_package_info_from_pypi_async("invalid"))
+
+
+def test_fetch_pypi_api_store_validators():
+    response = core.fetch_from_pypi("transformers")
+
+    assert len(response.releases) == 3
+    assert response.etag == mock_pypi_api.ETAG
+    assert response.serial == 1234
+    assert response.payload_size > 0
+
+
+def test_fetch_pypi_api_not_modified(db):
+    db_pkg = crud.create_package(db, "transformers#fetch_304", {"etag": mock_pypi_api.ETAG})
+
+    response = core.fetch_from_pypi("transformers#fetch_304", db_pkg)
+    assert response.releases is None
+    assert response.upstream_infos() == {"etag": mock_pypi_api.ETAG}
+
+    response = asyncio.run(core.fetch_from_pypi_async("transformers#fetch_304", db_pkg))
+    assert response.releases is None
+
+
+@pytest.fixture
+def pypi_api_down(monkeypatch):
+    # Nothing is listening on port 1
+    monkeypatch.setattr(oblique.config, "pypi_url", "http://127.0.0.1:1")
+
+
+def test_request_pypi_api_unreachable(pypi_api_down):
+    with pytest.raises(core.PyPiAPIException):
+        core.get_package_info_from_pypi("transformers")
+
+
+def test_request_pypi_api_async_valid_package():
+    data = asyncio.run(core.get_package_info_from_pypi_async("transformers"))
+
+    assert len(data) == 3
+    assert ("v1.2.10", isoparse("2021-08-09T14:27:16"), False) in data
+
+
+def test_request_pypi_api_redirected_package():
+    # Non-canonical names are redirected by the PyPi API, both clients follow the redirection
+    assert len(core.get_package_info_from_pypi("Moved")) == 3
+    assert len(asyncio.run(core.get_package_info_from_pypi_async("Moved"))) == 3
+
+
+def test_get_package_info_async_redirected_package(db):
+    assert asyncio.run(core.get_package_info_async(db, "Moved#core_redirect")) == ("09 Aug 2021", 3, 1)
+
+
+def test_request_pypi_api_async_nonexisting_package():
+    assert asyncio.run(core.get_package_info_from_pypi_async("lisduyfg")) == []
+
+
+def test_request_pypi_api_async_unreachable(pypi_api_down):
+    with pytest.raises(core.PyPiAPIException):
+        asyncio.run(core.get_package_info_from_pypi_async("transformers"))
+
+
+def test_async_client_shared_within_event_loop():
+    async def get_clients():
+        client = core.get_async_client()
+        same_client = core.get_async_client()
+        await core.close_async_client()
+        return client, same_client, core.get_async_client()
+
+    client, same_client, new_client = asyncio.run(get_clients())
+
+    assert client is same_client
+    assert client is not new_client
+
+
 @pytest.fixture(scope="session")
 def pkg_release_2022(db):
     db_pkg = crud.create_package(db, "pkg_release_2022")
@@ -185,6 +266,127 @@ def test_get_package_info_ttl_exceeded(db, temporary_reduce_ttl):
     assert n_versions_yanked == 1
 
 
+def test_get_package_info_ttl_exceeded_not_modified(db, temporary_reduce_ttl):
+    # Create a package in our local cache, as if it was retrieved from the PyPi API before
+    db_pkg = crud.create_package(db, "transformers#10", {"etag": mock_pypi_api.ETAG, "payload_size": 100})
+    crud.create_releases(db, [("v1.2.10", isoparse("2022-07-09T14:27:16"), False)], db_pkg.id)
+    last_updated = db_pkg.last_updated
+    not_modified, bytes_saved = core.upstream_stats["not_modified"], core.upstream_stats["bytes_saved"]
+
+    # Since the package didn't change, it's not rewritten, only marked as up-to-date
+    last_release, n_versions, n_versions_yanked = core.get_package_info(db, "transformers#10")
+
+    assert last_release == "09 Jul 2022"
+    assert n_versions == 1
+    assert n_versions_yanked == 0
+    assert db_pkg.last_updated >= last_updated
+    assert core.upstream_stats["not_modified"] == not_modified + 1
+    assert core.upstream_stats["bytes_saved"] == bytes_saved + 100
+
+
+def test_get_package_info_force_refresh_not_conditional(db):
+    db_pkg = crud.create_package(db, "transformers#11", {"etag": mock_pypi_api.ETAG})
+    crud.create_releases(db, [], db_pkg.id)
+
+    # With force refresh, the data is downloaded again even if it didn't change
+    assert core.get_package_info(db, "transformers#11", force_refresh=True) == ("09 Aug 2021", 3, 1)
+
+
+@pytest.fixture
+def stale_while_revalidate(monkeypatch, temporary_reduce_ttl):
+    monkeypatch.setattr(oblique.config, "stale_while_revalidate", True)
+
+
+def test_get_package_info_async_stale_while_revalidate(db, stale_while_revalidate):
+    db_pkg = crud.create_package(db, "transformers#12")
+    crud.create_releases(db, [("v1.2.10", isoparse("2022-07-09T14:27:16"), False)], db_pkg.id)
+    scheduled = []
+
+    stats = asyncio.run(
+        core.get_package_info_async(db, "transformers#12", schedule=lambda *args: scheduled.append(args))
+    )
+
+    assert stats == ("09 Jul 2022", 1, 0)
+    assert scheduled == [(core.refresh_in_background, "transformers#12")]
+
+    # Run the background refresh
+    asyncio.run(core.refresh_in_background("transformers#12"))
+    db.refresh(db_pkg)
+    assert db_pkg.n_versions == 3
+
+
+def test_get_package_info_async_stale_beyond_grace(db, stale_while_revalidate, monkeypatch):
+    monkeypatch.setattr(oblique.config, "stale_grace", 0)
+    db_pkg = crud.create_package(db, "transformers#13")
+    crud.create_releases(db, [("v1.2.10", isoparse("2022-07-09T14:27:16"), False)], db_pkg.id)
+
+    # Too stale : the package is refreshed before returning
+    stats = asyncio.run(core.get_package_info_async(db, "transformers#13", schedule=lambda *args: None))
+
+    assert stats == ("09 Aug 2021", 3, 1)
+
+
+def test_refresh_in_background_failure(db, temporary_reduce_ttl):
+    crud.create_package(db, "crashapi#background")
+
+    # Failures are logged, not raised
+    asyncio.run(core.refresh_in_background("crashapi#background"))
+
+
+@pytest.fixture
+def no_ttl_jitter(monkeypatch):
+    monkeypatch.setattr(oblique.config, "ttl_jitter", 0.0)
+
+
+def test_compute_ttl_active_package(no_ttl_jitter):
+    now = datetime.utcnow()
+    dates = [now - timedelta(days=i) for i in range(1, 30)]
+
+    assert core.compute_ttl(dates) == int(0.1 * 24 * 3600)
+
+
+def test_compute_ttl_dormant_package(no_ttl_jitter):
+    dates = [datetime(2015, 1, 1), datetime(2015, 1, 2)]
+
+    assert core.compute_ttl(dates) == oblique.config.max_ttl
+
+
+def test_compute_ttl_bounds(no_ttl_jitter):
+    now = datetime.utcnow()
+    dates = [now - timedelta(minutes=i) for i in range(1, 10)]
+
+    assert core.compute_ttl(dates) == oblique.config.min_ttl
+
+
+def test_compute_ttl_no_release(no_ttl_jitter):
+    assert core.compute_ttl([]) == core.CACHE_TTL.total_seconds()
+
+
+def test_compute_ttl_jitter(monkeypatch):
+    monkeypatch.setattr(oblique.config, "ttl_jitter", 0.5)
+    ttls = {core.compute_ttl([]) for _ in range(10)}
+
+    assert len(ttls) > 1
+    ttl = core.CACHE_TTL.total_seconds()
+    assert all(0.5 * ttl <= t <= 1.5 * ttl for t in ttls)
+
+
+def test_get_package_info_adaptive_ttl(db, monkeypatch):
+    core.get_package_info(db, "transformers#adaptive_ttl")
+    db_pkg = crud.get_package_by_name(db, "transformers#adaptive_ttl")
+
+    # The TTL is always stored, but only used when enabled
+    assert db_pkg.ttl is not None
+    assert core.package_ttl(db_pkg) == core.CACHE_TTL
+
+    monkeypatch.setattr(oblique.config, "adaptive_ttl", True)
+    assert core.package_ttl(db_pkg) == timedelta(seconds=db_pkg.ttl)
+
+    db_pkg.ttl = 0
+    db.commit()
+    assert core._is_stale(db_pkg)
+
+
 def test_get_package_info_force_refresh(db):
     # Create a package in our local cache, with no release
     db_pkg = crud.create_package(db, "transformers#3")
@@ -204,3 +406,273 @@ def test_get_package_info_non_human_readable(db):
     assert last_release == isoparse("2021-08-09T14:27:16")
     assert n_versions == 3
     assert n_versions_yanked == 1
+
+
+def test_single_flight_coalesce_concurrent_calls():
+    flight = core.SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def slow_fn():
+        calls.append(1)
+        release.wait()
+        return 42
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("pkg", slow_fn))) for _ in range(5)]
+    for t in threads:
+        t.start()
+
+    # Wait for all callers to be waiting on the leader before letting it finish
+    while flight.stats["coalesced"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert sorted(results) == [(42, False)] + [(42, True)] * 4
+    assert flight.stats["executed"] == 1
+
+
+def test_single_flight_sequential_calls_not_coalesced():
+    flight = core.SingleFlight()
+
+    assert flight.do("pkg", lambda: 1) == (1, False)
+    assert flight.do("pkg", lambda: 2) == (2, False)
+    assert flight.stats["coalesced"] == 0
+
+
+def test_single_flight_share_exception():
+    flight = core.SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def failing_fn():
+        release.wait()
+        raise core.PyPiAPIException()
+
+    def call():
+        try:
+            flight.do("pkg", failing_fn)
+        except core.PyPiAPIException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    while flight.stats["coalesced"] < 2:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 3
+
+
+def test_get_package_info_coalesce_refresh(db, monkeypatch):
+    # Simulate another caller already refreshing this package : its fresh statistics are shared
+    crud.create_releases(db, [], crud.create_package(db, "transformers#5").id)
+
+    def concurrent_refresh(key, fn, *args, **kwargs):
+        return fn(*args, **kwargs), True
+
+    monkeypatch.setattr(core.refresh_flight, "do", concurrent_refresh)
+    last_release, n_versions, n_versions_yanked = core.get_package_info(db, "transformers#5", force_refresh=True)
+
+    assert last_release == "09 Aug 2021"
+    assert n_versions == 3
+    assert n_versions_yanked == 1
+
+
+def test_get_package_info_memory_cache(db):
+    core.get_package_info(db, "transformers#6")
+
+    # The second call is served from memory, without touching the DB
+    last_release, n_versions, n_versions_yanked = core.get_package_info(None, "transformers#6")
+
+    assert last_release == "09 Aug 2021"
+    assert n_versions == 3
+    assert n_versions_yanked == 1
+
+
+def test_get_package_info_memory_cache_invalidated_on_refresh(db):
+    db_pkg = crud.create_package(db, "transformers#7")
+    crud.create_releases(db, [("v0.0.1", isoparse("2002-07-25T11:27:16"), False)], db_pkg.id)
+    assert core.get_package_info(db, "transformers#7") == ("25 Jul 2002", 1, 0)
+
+    # A forced refresh bypasses the memory cache, and updates it
+    assert core.get_package_info(db, "transformers#7", force_refresh=True) == ("09 Aug 2021", 3, 1)
+    assert core.get_package_info(None, "transformers#7") == ("09 Aug 2021", 3, 1)
+
+
+def test_get_package_info_memory_cache_capped_with_several_workers(db, monkeypatch):
+    monkeypatch.setattr(oblique.config, "workers", 4)
+    monkeypatch.setattr(oblique.config, "memory_cache_max_age", 0)
+    assert core.get_package_info(db, "transformers#workers") == ("09 Aug 2021", 3, 1)
+
+    # Another worker may refresh the package : the statistics are read from the DB again
+    assert core.stats_cache.get("transformers#workers") is None
+
+
+def test_store_package_created_concurrently(db):
+    response = core.fetch_from_pypi("transformers")
+    db_pkg = crud.create_package(db, "transformers#created")
+    crud.create_releases(db, [("v0.0.1", isoparse("2002-07-25T11:27:16"), False)], db_pkg.id)
+
+    # The package was created by another worker after it was looked up
+    db_pkg = core.store_package(db, "transformers#created", None, response)
+
+    assert (db_pkg.n_versions, db_pkg.n_versions_yanked) == (3, 1)
+    assert len(crud.get_packages_by_names(db, ["transformers#created"])) == 1
+
+
+def test_single_flight_async_coalesce_concurrent_calls():
+    flight = core.SingleFlight()
+    calls = []
+
+    async def slow_fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def run():
+        return await asyncio.gather(*[flight.do_async("pkg", slow_fn) for _ in range(5)])
+
+    results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert sorted(results) == [(42, False)] + [(42, True)] * 4
+    assert flight.stats["coalesced"] == 4
+
+
+def test_single_flight_sync_and_async_calls_coalesced():
+    flight = core.SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow_fn():
+        calls.append("sync")
+        release.wait()
+        return 42
+
+    async def async_fn():
+        calls.append("async")
+        return 0
+
+    leader = threading.Thread(target=flight.do, args=("pkg", slow_fn))
+    leader.start()
+    while not calls:
+        time.sleep(0.001)
+
+    async def run():
+        follower = asyncio.ensure_future(flight.do_async("pkg", async_fn))
+        while flight.stats["coalesced"] < 1:
+            await asyncio.sleep(0.001)
+        # The event loop isn't blocked while waiting for the synchronous leader
+        release.set()
+        return await follower
+
+    assert asyncio.run(run()) == (42, True)
+    leader.join()
+    assert calls == ["sync"]
+
+
+def test_single_flight_async_leader_cancelled():
+    flight = core.SingleFlight()
+    calls = []
+
+    async def slow_fn():
+        calls.append(1)
+        await asyncio.sleep(0.05 if len(calls) == 1 else 0)
+        return len(calls)
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do_async("pkg", slow_fn))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.do_async("pkg", slow_fn))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    # The follower isn't cancelled along with the leader : it makes the call instead
+    assert asyncio.run(run()) == (2, False)
+    assert flight.stats["executed"] == 2
+
+
+def test_single_flight_async_share_exception():
+    flight = core.SingleFlight()
+
+    async def failing_fn():
+        await asyncio.sleep(0.01)
+        raise core.PyPiAPIException()
+
+    async def run():
+        return await asyncio.gather(*[flight.do_async("pkg", failing_fn) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, core.PyPiAPIException) for r in results)
+
+
+def test_get_package_info_async_new_package(db):
+    last_release, n_versions, n_versions_yanked = asyncio.run(core.get_package_info_async(db, "transformers#8"))
+
+    assert last_release == "09 Aug 2021"
+    assert n_versions == 3
+    assert n_versions_yanked == 1
+
+
+def test_get_package_info_async_coalesce_refresh(db):
+    # Each concurrent caller has its own DB session
+    sessions = [SessionLocal() for _ in range(3)]
+
+    async def run():
+        return await asyncio.gather(
+            *[core.get_package_info_async(s, "transformers#9", human_readable=False) for s in sessions]
+        )
+
+    executed = core.refresh_flight.stats["executed"]
+    results = asyncio.run(run())
+    for s in sessions:
+        s.close()
+
+    assert results == [(isoparse("2021-08-09T14:27:16"), 3, 1)] * 3
+    assert core.refresh_flight.stats["executed"] == executed + 1
+
+
+def test_get_packages_info_async_coalesce_refresh(db):
+    # A batch and a single request for the same package, each with its own DB session
+    batch_db, single_db = SessionLocal(), SessionLocal()
+
+    async def run():
+        return await asyncio.gather(
+            core.get_packages_info_async(batch_db, ["transformers#batch_coalesce"]),
+            core.get_package_info_async(single_db, "transformers#batch_coalesce"),
+        )
+
+    executed = core.refresh_flight.stats["executed"]
+    (results, errors), single = asyncio.run(run())
+    batch_db.close()
+    single_db.close()
+
+    assert errors == {}
+    assert results["transformers#batch_coalesce"] == single == ("09 Aug 2021", 3, 1)
+    # The package requested by both was refreshed (and written) only once
+    assert core.refresh_flight.stats["executed"] == executed + 1
+
+
+def test_get_packages_info_async(db):
+    db_pkg = crud.create_package(db, "crashapi#batch")
+    crud.create_releases(db, [("v1.2.10", isoparse("2022-07-09T14:27:16"), False)], db_pkg.id)
+
+    names = ["crashapi#batch", "transformers#batch", "transformers#batch", "unknown#batch"]
+    results, errors = asyncio.run(core.get_packages_info_async(db, names))
+
+    assert results == {"crashapi#batch": ("09 Jul 2022", 1, 0), "transformers#batch": ("09 Aug 2021", 3, 1)}
+    assert list(errors) == ["unknown#batch"]
+    assert isinstance(errors["unknown#batch"], core.UnknownPackageException)
+
+    # Now everything is cached in memory
+    results, errors = asyncio.run(core.get_packages_info_async(None, ["crashapi#batch", "transformers#batch"]))
+    assert len(results) == 2
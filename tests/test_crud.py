@@ -0,0 +1,123 @@
+from dateutil.parser import isoparse
+
+from oblique.database import crud
+
+
+def test_create_release(db):
+    db_pkg = crud.create_package(db, "crud_create_release")
+    db_release = crud.create_release(db, "v0.1.0", isoparse("2021-08-09T14:27:16"), True, db_pkg.id)
+
+    assert db_release.id is not None
+    assert db_release.package_id == db_pkg.id
+    assert crud.get_n_versions_yanked_of(db, db_pkg) == 1
+
+    # The statistics stored in the package are updated too
+    db.refresh(db_pkg)
+    assert (db_pkg.n_versions, db_pkg.n_versions_yanked) == (1, 1)
+    assert db_pkg.latest_release_date == isoparse("2021-08-09T14:27:16")
+
+
+def test_create_releases_bulk(db):
+    db_pkg = crud.create_package(db, "crud_create_releases")
+    releases = [(f"v{i}", isoparse("2021-08-09T14:27:16"), i % 2 == 0) for i in range(100)]
+    crud.create_releases(db, releases, db_pkg.id)
+
+    assert crud.get_n_versions_of(db, db_pkg) == 100
+    assert crud.get_n_versions_yanked_of(db, db_pkg) == 50
+
+
+def test_create_releases_update_stats(db):
+    db_pkg = crud.create_package(db, "crud_create_releases_stats")
+    assert db_pkg.n_versions == 0 and db_pkg.latest_release_date is None
+
+    crud.create_releases(db, [("v0.1.0", isoparse("2021-08-09T14:27:16"), True)], db_pkg.id)
+    crud.create_releases(db, [("v0.2.0", isoparse("2022-08-09T14:27:16"), False)], db_pkg.id)
+
+    assert db_pkg.latest_release_date == isoparse("2022-08-09T14:27:16")
+    assert db_pkg.n_versions == 2
+    assert db_pkg.n_versions_yanked == 1
+
+
+def test_create_releases_idempotent(db):
+    db_pkg = crud.create_package(db, "crud_create_releases_idempotent")
+    crud.create_releases(db, [("v0.1.0", isoparse("2021-08-09T14:27:16"), False)], db_pkg.id)
+
+    # Like a concurrent refresh writing the same release : it's updated, not duplicated
+    crud.create_releases(db, [("v0.1.0", isoparse("2021-08-09T14:27:16"), True)], db_pkg.id)
+
+    assert db_pkg.n_versions == 1
+    assert db_pkg.n_versions_yanked == 1
+    assert len(db_pkg.releases) == 1
+
+
+def test_update_package_replace_releases(db):
+    db_pkg = crud.create_package(db, "crud_update_package")
+    crud.create_releases(db, [("v0.1.0", isoparse("2021-08-09T14:27:16"), False)], db_pkg.id)
+    last_updated = db_pkg.last_updated
+
+    releases = [("v0.2.0", isoparse("2022-08-09T14:27:16"), False), ("v0.3.0", isoparse("2023-08-09T14:27:16"), True)]
+    db_pkg = crud.update_package(db, db_pkg, releases)
+
+    assert db_pkg.last_updated >= last_updated
+    assert crud.get_n_versions_of(db, db_pkg) == 2
+    assert crud.get_n_versions_yanked_of(db, db_pkg) == 1
+    assert crud.get_latest_release_of(db, db_pkg).version == "v0.3.0"
+
+
+def test_update_package_only_write_differences(db):
+    db_pkg = crud.create_package(db, "crud_update_package_diff")
+    releases = [
+        ("v0.1.0", isoparse("2021-08-09T14:27:16"), False),
+        ("v0.2.0", isoparse("2022-08-09T14:27:16"), False),
+        ("v0.3.0", isoparse("2023-08-09T14:27:16"), False),
+    ]
+    crud.create_releases(db, releases, db_pkg.id)
+    ids = {r.version: r.id for r in db_pkg.releases}
+
+    fresh_releases = [
+        ("v0.2.0", isoparse("2022-08-09T14:27:16"), False),
+        ("v0.3.0", isoparse("2023-08-09T14:27:16"), True),
+        ("v0.4.0", isoparse("2024-08-09T14:27:16"), False),
+    ]
+    db_pkg = crud.update_package(db, db_pkg, fresh_releases)
+    new_ids = {r.version: r.id for r in db_pkg.releases}
+
+    # Unchanged and updated releases are kept, vanished releases are deleted
+    assert new_ids["v0.2.0"] == ids["v0.2.0"]
+    assert new_ids["v0.3.0"] == ids["v0.3.0"]
+    assert "v0.1.0" not in new_ids
+    assert "v0.4.0" in new_ids
+    assert crud.get_n_versions_yanked_of(db, db_pkg) == 1
+    assert crud.get_latest_release_of(db, db_pkg).version == "v0.4.0"
+
+    # Stored statistics are updated as well
+    assert db_pkg.latest_release_date == isoparse("2024-08-09T14:27:16")
+    assert db_pkg.n_versions == 3
+    assert db_pkg.n_versions_yanked == 1
+
+
+def test_create_packages(db):
+    packages_data = {
+        "crud_create_packages_1": [
+            ("v0.1.0", isoparse("2021-08-09T14:27:16"), True),
+            ("v0.2.0", isoparse("2022-08-09T14:27:16"), False),
+        ],
+        "crud_create_packages_2": [],
+    }
+    n_releases = crud.create_packages(db, packages_data, {"crud_create_packages_1": {"etag": '"etag"'}})
+
+    assert n_releases == 2
+    db_pkg = crud.get_package_by_name(db, "crud_create_packages_1")
+    assert db_pkg.etag == '"etag"'
+    assert crud.get_n_versions_yanked_of(db, db_pkg) == 1
+
+    # Stored statistics are the same as if computed from the DB
+    assert db_pkg.latest_release_date == crud.get_latest_release_of(db, db_pkg).date
+    assert db_pkg.n_versions == crud.get_n_versions_of(db, db_pkg)
+    assert db_pkg.n_versions_yanked == 1
+
+    db_pkg = crud.get_package_by_name(db, "crud_create_packages_2")
+    assert db_pkg.etag is None
+    assert db_pkg.latest_release_date is None
+    assert db_pkg.n_versions == 0
+    assert crud.create_packages(db, {}) == 0
@@ -0,0 +1,40 @@
+import sqlite3
+
+import oblique
+from oblique import database
+
+
+def pragma(con, name):
+    return con.execute(f"pragma {name}").fetchone()[0]
+
+
+def test_sqlite_pragmas_tuned(tmp_path):
+    con = sqlite3.connect(tmp_path / "db.sql")
+
+    database.set_sqlite_pragmas(con, None)
+
+    assert pragma(con, "foreign_keys") == 1
+    assert pragma(con, "journal_mode") == "wal"
+    assert pragma(con, "synchronous") == 1
+    assert pragma(con, "cache_size") == oblique.config.sqlite_cache_size
+    assert pragma(con, "busy_timeout") == oblique.config.sqlite_busy_timeout
+    assert pragma(con, "temp_store") == 2
+
+
+def test_sqlite_pragmas_not_tuned(tmp_path, monkeypatch):
+    monkeypatch.setattr(oblique.config, "sqlite_tuning", False)
+    con = sqlite3.connect(tmp_path / "db.sql")
+
+    database.set_sqlite_pragmas(con, None)
+
+    assert database.sqlite_pragmas() == {"foreign_keys": "ON"}
+    assert pragma(con, "foreign_keys") == 1
+    assert pragma(con, "journal_mode") == "delete"
+
+
+def test_engine_connections_tuned(db):
+    con = database.engine.raw_connection()
+    try:
+        assert pragma(con, "busy_timeout") == oblique.config.sqlite_busy_timeout
+    finally:
+        con.close()
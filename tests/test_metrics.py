@@ -0,0 +1,107 @@
+import pytest
+from dateutil.parser import isoparse
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import oblique
+from oblique import core, database, metrics
+from oblique.database import crud
+
+
+def sample_value(text, line_prefix):
+    return [float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(line_prefix)]
+
+
+def test_counter_render():
+    counter = metrics.Counter("test_events_total", "Events.", labels=("kind",))
+    metrics.registry.remove(counter)
+
+    counter.inc(kind="a")
+    counter.inc(2, kind="a")
+    counter.inc(kind='b"')
+
+    assert counter.render() == "\n".join(
+        [
+            "# HELP test_events_total Events.",
+            "# TYPE test_events_total counter",
+            'test_events_total{kind="a"} 3',
+            'test_events_total{kind="b\\""} 1',
+        ]
+    )
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram("test_duration_seconds", "Durations.", buckets=(0.1, 1))
+    metrics.registry.remove(histogram)
+
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    lines = histogram.render().splitlines()
+    assert lines[2:] == [
+        'test_duration_seconds_bucket{le="0.1"} 1',
+        'test_duration_seconds_bucket{le="1"} 2',
+        'test_duration_seconds_bucket{le="+Inf"} 3',
+        "test_duration_seconds_sum 5.55",
+        "test_duration_seconds_count 3",
+    ]
+
+
+def test_callback_metric_skipped_when_none():
+    metric = metrics.CallbackMetric("test_gauge", "Gauge.", lambda: None)
+    metrics.registry.remove(metric)
+
+    assert metric.render() == "# HELP test_gauge Gauge.\n# TYPE test_gauge gauge"
+
+
+def test_metrics_endpoint(client, db):
+    db_pkg = crud.create_package(db, "transformers#metrics_1")
+    crud.create_releases(db, [("v0.0.1", isoparse("2002-07-25T11:27:16"), False)], db_pkg.id)
+    client.post("/api/pkg_infos", json={"pkg_name": "transformers#metrics_1"})
+
+    r = client.get("/metrics")
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'oblique_http_request_duration_seconds_count{method="POST",route="get_pkg_infos",status="200"}' in r.text
+    assert sample_value(r.text, 'oblique_package_info_total{outcome="hit"}')[0] >= 1
+    assert sample_value(r.text, 'oblique_sql_query_duration_seconds_count{statement="SELECT"}')[0] >= 1
+    assert "# TYPE oblique_threadpool_max_threads gauge" in r.text
+    assert "# TYPE oblique_scheduler_queue_depth gauge" in r.text
+
+
+def test_metrics_outcomes(db):
+    before = metrics.package_info_outcomes._values.copy()
+
+    core.get_package_info(db, "transformers#metrics_2")
+    core.get_package_info(db, "transformers#metrics_2")
+    with pytest.raises(core.PyPiAPIException):
+        core.get_package_info(db, "crashapi#metrics_2")
+
+    after = metrics.package_info_outcomes._values
+    diff = {key[0]: after[key] - before.get(key, 0) for key in after if after[key] != before.get(key, 0)}
+    assert diff == {"miss": 1, "hit": 1, "upstream_error": 1}
+
+
+def test_metrics_pypi_requests(client):
+    client.post("/api/pkg_infos", json={"pkg_name": "transformers#metrics_3"})
+
+    text = metrics.render()
+    assert sample_value(text, 'oblique_pypi_request_duration_seconds_count{status="200"}')[0] >= 1
+    assert sample_value(text, "oblique_pypi_payload_size_bytes_count")[0] >= 1
+    assert sample_value(text, "oblique_pypi_requests_total")[0] >= 1
+
+
+def test_metrics_sql_listeners(client):
+    # Only set on the engine of the app, not on all engines
+    assert event.contains(database.engine, "after_cursor_execute", metrics._after_cursor_execute)
+    assert not event.contains(Engine, "after_cursor_execute", metrics._after_cursor_execute)
+
+
+def test_metrics_disabled(db, monkeypatch):
+    monkeypatch.setattr(oblique.config, "metrics", False)
+    client = TestClient(oblique.server.get_main_app())
+
+    assert client.get("/metrics").status_code == 404
@@ -0,0 +1,90 @@
+import gzip
+import json
+
+import pytest
+
+import oblique
+from oblique import mirror
+from oblique.database import crud
+
+
+def document(name, n_releases=2, yanked=False):
+    releases = {
+        f"v{i}.0": [{"upload_time": f"2021-0{i + 1}-01T00:00:00", "yanked": yanked}] for i in range(n_releases)
+    }
+    return {"info": {"name": name}, "releases": releases}
+
+
+@pytest.fixture
+def documents_dir(tmp_path):
+    (tmp_path / "mirror-a").mkdir()
+    (tmp_path / "mirror-a" / "json").write_text(json.dumps(document("mirror-a")))
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "nested" / "mirror-b.json").write_text(json.dumps(document("Mirror-B", n_releases=3, yanked=True)))
+    (tmp_path / "mirror-invalid.json").write_text('{"releases": [1, 2')
+    (tmp_path / "README.md").write_text("Not a document")
+    return tmp_path
+
+
+def test_iter_documents_directory(documents_dir):
+    names = [name for name, _ in mirror.iter_documents(str(documents_dir))]
+
+    assert names == ["mirror-invalid", "mirror-a", "mirror-b"]
+
+
+def test_parse_document_name_from_document():
+    pkg_name, releases, error = mirror.parse_document(None, json.dumps(document("mirror-c")).encode())
+
+    assert pkg_name == "mirror-c"
+    assert len(releases) == 2
+    assert error is None
+
+    assert mirror.parse_document(None, b'{"releases": {}}')[2] is not None
+
+
+def test_ingest_directory(db, documents_dir):
+    progress = []
+    counts = mirror.ingest(db, str(documents_dir), workers=2, batch_size=1, progress=lambda c, e: progress.append(c))
+
+    assert counts == {"packages": 2, "releases": 5, "failed": 1}
+    assert len(progress) == 3
+
+    db_pkg = crud.get_package_by_name(db, "mirror-b")
+    assert db_pkg.n_versions == 3
+    assert db_pkg.n_versions_yanked == 3
+    assert len(db_pkg.releases) == 3
+    assert db_pkg.ttl is not None
+
+
+def test_ingest_jsonlines_update_existing(db, tmp_path, monkeypatch):
+    crud.create_package(db, "mirror-d")
+    commits = []
+    commit = db.commit
+    monkeypatch.setattr(db, "commit", lambda: commits.append(1) or commit())
+    path = tmp_path / "dump.jsonl.gz"
+    with gzip.open(path, "wt") as f:
+        f.write(json.dumps(document("mirror-d", n_releases=4)) + "\n\n")
+        f.write(json.dumps(document("mirror-e")) + "\n")
+
+    counts = mirror.ingest(db, str(path), workers=1)
+
+    assert counts == {"packages": 2, "releases": 6}
+    # The update and the insertion are committed together, once for the batch
+    assert len(commits) == 1
+    db_pkg = crud.get_package_by_name(db, "mirror-d")
+    db.refresh(db_pkg)
+    assert db_pkg.n_versions == 4
+
+
+def test_ingest_mirror_cli(db, documents_dir, monkeypatch, capsys):
+    monkeypatch.setattr(oblique.config, "mirror_path", str(documents_dir / "nested"))
+    monkeypatch.setattr(oblique.config, "mirror_workers", 1)
+
+    mirror.ingest_mirror()
+
+    assert "rows/s" in capsys.readouterr().err
+
+
+def test_ingest_mirror_cli_no_path():
+    with pytest.raises(SystemExit):
+        mirror.ingest_mirror()
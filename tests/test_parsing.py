@@ -0,0 +1,101 @@
+import json
+
+import pytest
+from dateutil.parser import isoparse
+
+from oblique.parsing import ReleasesParser, parse_releases
+
+
+DOCUMENT = {
+    "info": {
+        "name": "oblique",
+        "description": "Ünïcödé description " * 100,
+        # Only the top-level `releases` should be considered
+        "releases": {"v9.9.9": [{"upload_time": "2021-01-01T00:00:00", "yanked": False}]},
+    },
+    "last_serial": 123456789,
+    "releases": {
+        "v0.1.0": [
+            {"upload_time": "2021-05-09T14:27:16", "yanked": False, "digests": {"sha256": "abc"}},
+            {"upload_time": "2021-05-10T14:27:16", "yanked": True},
+        ],
+        "v0.2.0": [],
+        "v1.0.0": [{"upload_time": "2021-08-09T14:27:16", "yanked": True}],
+    },
+    "urls": [],
+}
+RELEASES = [
+    ("v0.1.0", isoparse("2021-05-09T14:27:16"), False),
+    ("v1.0.0", isoparse("2021-08-09T14:27:16"), True),
+]
+
+
+def test_parse_releases():
+    assert parse_releases(json.dumps(DOCUMENT).encode()) == RELEASES
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+def test_parse_releases_by_chunks(chunk_size):
+    document = json.dumps(DOCUMENT, ensure_ascii=False, indent=2).encode()
+
+    parser = ReleasesParser()
+    for i in range(0, len(document), chunk_size):
+        parser.feed(document[i : i + chunk_size])
+
+    assert parser.close() == RELEASES
+    assert parser.name == "oblique"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3])
+def test_parse_releases_skip_escaped_strings(chunk_size):
+    document = {
+        "info": {"description": 'Quotes \\" and brackets "}]\\\\', "name": "oblique", "urls": [{"a": "]}"}]},
+        "urls": ["}", '\\"]'],
+        "releases": DOCUMENT["releases"],
+    }
+    document = json.dumps(document).encode()
+
+    parser = ReleasesParser()
+    for i in range(0, len(document), chunk_size):
+        parser.feed(document[i : i + chunk_size])
+
+    assert parser.close() == RELEASES
+    assert parser.name == "oblique"
+
+
+def test_parse_releases_large_value_not_buffered():
+    document = json.dumps({"info": {"name": "oblique", "description": "Long\n description " * 100_000}}).encode()
+
+    parser = ReleasesParser()
+    buffered = 0
+    for i in range(0, len(document), 1024):
+        parser.feed(document[i : i + 1024])
+        buffered = max(buffered, len(parser._buf))
+
+    # The skipped description is dropped as it comes, instead of being kept until it's complete
+    assert buffered <= 1024 + 1
+    assert parser.close() == []
+    assert parser.name == "oblique"
+
+
+def test_parse_releases_top_level_number_split():
+    parser = ReleasesParser()
+    parser.feed(b'{"releases": {}, "last_serial": 123')
+    parser.feed(b"456}")
+    parser.close()
+
+    assert parser.releases == []
+
+
+def test_parse_releases_incomplete_document():
+    with pytest.raises(ValueError):
+        parse_releases(json.dumps(DOCUMENT).encode()[:-10])
+
+
+@pytest.mark.parametrize(
+    "document",
+    [b"[]", b'{"releases": []}', b'{"releases": {"v1": [{"yanked": false}]}}', b'{"releases" {}}', b"{"],
+)
+def test_parse_releases_invalid_document(document):
+    with pytest.raises(ValueError):
+        parse_releases(document)
@@ -0,0 +1,134 @@
+import contextvars
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import oblique
+from oblique import profiling
+
+
+@pytest.fixture
+def profiled_client(db, monkeypatch):
+    monkeypatch.setattr(oblique.config, "profiling", True)
+    yield TestClient(oblique.server.get_main_app())
+
+
+def test_profile_report(profiled_client):
+    r = profiled_client.post(
+        "/api/pkg_infos", json={"pkg_name": "transformers#profiling_1"}, headers={"X-Oblique-Profile": "1"}
+    )
+
+    assert r.status_code == 200
+    report = r.json()
+    assert report["status_code"] == 200
+    assert report["url"].endswith("/api/pkg_infos")
+    assert report["duration"] > 0
+    assert report["sql"]["count"] == len(report["sql"]["statements"]) > 0
+    assert any(s["statement"].startswith("INSERT INTO releases") for s in report["sql"]["statements"])
+    assert report["samples"]["count"] == sum(report["samples"]["stacks"].values())
+
+
+def test_not_profiled_without_header(profiled_client):
+    r = profiled_client.post("/api/pkg_infos", json={"pkg_name": "transformers#profiling_2"})
+
+    assert r.status_code == 200
+    assert "sql" not in r.json()
+
+
+def test_profile_report_stored(profiled_client, monkeypatch, tmp_path):
+    monkeypatch.setattr(oblique.config, "profiling_dir", str(tmp_path))
+
+    r = profiled_client.get("/", headers={"X-Oblique-Profile": "1"})
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/html")
+    with open(r.headers["X-Oblique-Profile-Report"]) as f:
+        report = json.load(f)
+    assert report["status_code"] == 200
+
+
+def test_profiling_disabled(client):
+    r = client.post(
+        "/api/pkg_infos", json={"pkg_name": "transformers#profiling_3"}, headers={"X-Oblique-Profile": "1"}
+    )
+
+    assert "sql" not in r.json()
+
+
+def test_profile_top_functions():
+    profile = profiling.Profile(0.001)
+    profile.stacks.update({"a:main;b:parse;c:feed": 3, "a:main;b:parse": 1, "a:main;d:render": 2})
+    profile.statements.append(("SELECT 1", 0.5))
+
+    report = profile.report()
+
+    assert report["samples"]["top"][:2] == [("a:main", 6), ("b:parse", 4)]
+    assert report["sql"]["duration"] == 0.5
+
+
+def test_profile_samples_request_threads_only():
+    stop = threading.Event()
+
+    def unrelated_work():
+        while not stop.is_set():
+            sum(range(1000))
+
+    def request_work():
+        end = time.perf_counter() + 0.05
+        while time.perf_counter() < end:
+            sum(range(1000))
+
+    unrelated = threading.Thread(target=unrelated_work, daemon=True)
+    unrelated.start()
+    profile = profiling.Profile(0.001)
+    profile.start()
+    try:
+        request_work()
+    finally:
+        profile.stop()
+        stop.set()
+        unrelated.join()
+
+    assert any("request_work" in stack for stack in profile.stacks)
+    assert not any("unrelated_work" in stack for stack in profile.stacks)
+
+
+def test_record_thread():
+    profile = profiling.Profile(0.001)
+    token = profiling.current_profile.set(profile)
+    try:
+        # Like the threadpool, the thread runs in a copy of the context
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(profiling.record_thread,))
+        thread.start()
+        thread.join()
+    finally:
+        profiling.current_profile.reset(token)
+
+    assert thread.ident in profile.threads
+
+
+def test_profile_idle_threads_by_module():
+    def get():
+        # Busy, despite having the same name as `queue.Queue.get`
+        end = time.perf_counter() + 0.05
+        while time.perf_counter() < end:
+            sum(range(1000))
+
+    idle = threading.Event()
+    waiting = threading.Thread(target=idle.wait, daemon=True)
+    waiting.start()
+    profile = profiling.Profile(0.001)
+    profile.add_thread(waiting.ident)
+    profile.start()
+    try:
+        get()
+    finally:
+        profile.stop()
+        idle.set()
+        waiting.join()
+
+    assert any(stack.endswith("test_profiling.py:get") for stack in profile.stacks)
+    assert not any(stack.endswith("threading.py:wait") for stack in profile.stacks)
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+import pytest
+from dateutil.parser import isoparse
+
+import oblique
+from oblique import core
+from oblique.database import crud
+from oblique.scheduler import RefreshScheduler
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(oblique.config, "scheduler", True)
+    monkeypatch.setattr(oblique.config, "scheduler_max_rate", 1000.0)
+    monkeypatch.setattr(oblique.config, "scheduler_jitter", 0)
+    core.drain_accesses()
+
+    yield RefreshScheduler()
+
+    core.drain_accesses()
+
+
+def test_scheduler_no_access_recorded_when_disabled(db):
+    core.drain_accesses()
+    core.get_package_info(db, "transformers")
+
+    assert core.drain_accesses() == {}
+
+
+def test_scheduler_scores_decay(scheduler, monkeypatch):
+    monkeypatch.setattr(oblique.config, "scheduler_decay", 0.5)
+    core.record_access("a", "a", "b")
+    scheduler.update_scores()
+
+    assert scheduler.scores == {"a": 2, "b": 1}
+
+    core.record_access("b")
+    scheduler.update_scores()
+
+    assert scheduler.scores == {"a": 1, "b": 1.5}
+
+
+def test_scheduler_keeps_hottest_packages(scheduler, monkeypatch):
+    monkeypatch.setattr(oblique.config, "scheduler_hot_packages", 2)
+    core.record_access("a", "a", "a", "b", "b", "c")
+    scheduler.update_scores()
+
+    assert set(scheduler.scores) == {"a", "b"}
+
+
+def test_scheduler_refresh_package_about_to_expire(db, scheduler):
+    db_pkg = crud.create_package(db, "transformers#scheduler")
+    crud.create_releases(db, [("v1.2.10", isoparse("2022-07-09T14:27:16"), False)], db_pkg.id)
+    db_pkg.last_updated = datetime.utcnow() - core.CACHE_TTL + timedelta(minutes=1)
+    db.commit()
+
+    core.get_package_info(db, "transformers#scheduler")
+    scheduler.tick()
+
+    db.refresh(db_pkg)
+    assert db_pkg.n_versions == 3
+    assert scheduler.stats["refreshes"] == 1
+    assert scheduler.queue_depth == 0
+    assert scheduler.last_lag < 0
+
+
+def test_scheduler_ignore_fresh_package(db, scheduler):
+    db_pkg = crud.create_package(db, "transformers#scheduler_fresh")
+    crud.create_releases(db, [("v1.2.10", isoparse("2022-07-09T14:27:16"), False)], db_pkg.id)
+
+    core.get_package_info(db, "transformers#scheduler_fresh")
+    scheduler.tick()
+
+    db.refresh(db_pkg)
+    assert db_pkg.n_versions == 1
+    assert scheduler.stats["refreshes"] == 0
+
+
+def test_scheduler_rate_limit(db, scheduler, monkeypatch):
+    monkeypatch.setattr(oblique.config, "scheduler_interval", 0.001)
+    for i in range(3):
+        db_pkg = crud.create_package(db, f"transformers#scheduler_rate_{i}")
+        db_pkg.last_updated = datetime.utcnow() - core.CACHE_TTL
+        db.commit()
+        core.record_access(f"transformers#scheduler_rate_{i}")
+
+    scheduler.tick()
+
+    assert scheduler.stats["refreshes"] == 1
+    assert scheduler.queue_depth == 2
+
+
+def test_scheduler_rate_paced_on_start(db, scheduler, monkeypatch):
+    monkeypatch.setattr(oblique.config, "scheduler_max_rate", 10.0)
+    sleeps = []
+    monkeypatch.setattr("oblique.scheduler.time.sleep", sleeps.append)
+    monkeypatch.setattr(scheduler, "refresh_next", lambda db: scheduler._queue.pop())
+    now = iter([0.0, 0.04, 1.0, 1.5])
+    monkeypatch.setattr("oblique.scheduler.time.monotonic", lambda: next(now))
+    scheduler._queue = [(datetime.utcnow(), "a"), (datetime.utcnow(), "b")]
+
+    scheduler.tick()
+
+    # The first refresh took 40ms, so only the rest of the interval is waited. The second took longer
+    assert sleeps == [pytest.approx(0.06), 0]
+
+
+def test_scheduler_refresh_failure(db, scheduler):
+    db_pkg = crud.create_package(db, "crashapi#scheduler")
+    db_pkg.last_updated = datetime.utcnow() - core.CACHE_TTL
+    db.commit()
+
+    core.record_access("crashapi#scheduler")
+    scheduler.tick()
+
+    assert scheduler.stats["failures"] == 1
+    assert scheduler.last_lag > 0
+
+
+def test_scheduler_start_stop(scheduler):
+    scheduler.start()
+    scheduler.stop()
+
+    assert scheduler._thread is None
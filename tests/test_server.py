@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+import oblique
+from oblique import server
+from oblique.configuration import SHARED_DB_ENV, shared_db_path
+from oblique.scheduler import scheduler
+
+
+@pytest.fixture
+def uvicorn_calls(monkeypatch):
+    calls = []
+
+    def fake_run(app, **kwargs):
+        calls.append((app, kwargs, dict(os.environ)))
+
+    monkeypatch.setattr(server.uvicorn, "run", fake_run)
+    yield calls
+
+
+def test_run_app_factory(db, uvicorn_calls):
+    server.run()
+
+    app, kwargs, _ = uvicorn_calls[0]
+    assert app == "oblique.server:get_main_app"
+    assert kwargs["factory"]
+    assert kwargs["workers"] == 1
+    assert kwargs["loop"] == oblique.config.loop
+    assert kwargs["timeout_keep_alive"] == oblique.config.keep_alive_timeout
+
+
+def test_run_several_workers(db, uvicorn_calls, monkeypatch, tmp_path):
+    monkeypatch.setattr(oblique.config, "workers", 4)
+    monkeypatch.setattr(oblique.config, "scheduler", True)
+    monkeypatch.setattr(oblique.config, "db", "memory")
+    monkeypatch.setenv(SHARED_DB_ENV, str(tmp_path / "shared.sql"))
+    (tmp_path / "shared.sql").touch()
+
+    server.run()
+
+    _, kwargs, env = uvicorn_calls[0]
+    assert kwargs["workers"] == 4
+    # The scheduler runs in one of the workers, not in the main process
+    assert server.SCHEDULER_LOCK_ENV in env
+    assert scheduler._thread is None
+    # Temporary files are removed on exit
+    assert server.SCHEDULER_LOCK_ENV not in os.environ
+    assert not (tmp_path / "shared.sql").exists()
+
+
+def test_run_async_db_removes_temporary_db(db, uvicorn_calls, monkeypatch, tmp_path):
+    monkeypatch.setattr(oblique.config, "async_db", True)
+    monkeypatch.setattr(oblique.config, "db", "memory")
+    monkeypatch.setenv(SHARED_DB_ENV, str(tmp_path / "shared.sql"))
+    (tmp_path / "shared.sql").touch()
+
+    server.run()
+
+    # With `async_db`, the `memory` profile uses a temporary DB file, removed on exit
+    assert not (tmp_path / "shared.sql").exists()
+
+
+def test_scheduler_in_single_worker(db, monkeypatch, tmp_path):
+    monkeypatch.setattr(oblique.config, "workers", 2)
+    monkeypatch.setattr(oblique.config, "scheduler", True)
+    monkeypatch.setenv(server.SCHEDULER_LOCK_ENV, str(tmp_path / "scheduler.lock"))
+
+    with TestClient(server.get_main_app()):
+        assert scheduler._thread is not None
+
+        # Another worker doesn't take the lock
+        assert not server._take_scheduler_lock()
+
+    assert scheduler._thread is None
+    assert not (tmp_path / "scheduler.lock").exists()
+
+
+def test_shared_db_path(monkeypatch):
+    monkeypatch.delenv(SHARED_DB_ENV, raising=False)
+
+    path = shared_db_path()
+
+    assert path == os.path.join(tempfile.gettempdir(), f"oblique-{os.getpid()}.sql")
+    # Workers get the same path from the environment
+    monkeypatch.setenv(SHARED_DB_ENV, "/data/shared.sql")
+    assert shared_db_path() == "/data/shared.sql"
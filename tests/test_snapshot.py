@@ -0,0 +1,82 @@
+import gzip
+import json
+import pathlib
+import re
+
+import pytest
+from dateutil.parser import isoparse
+
+import oblique
+from oblique import snapshot
+from oblique.database import SCHEMA_REVISION, crud
+
+
+def test_schema_revision_is_alembic_head():
+    revisions, down_revisions = set(), set()
+    for path in (pathlib.Path(__file__).parent.parent / "alembic" / "versions").glob("*.py"):
+        content = path.read_text()
+        revisions.add(re.search(r'^revision: str = "(\w+)"', content, re.M).group(1))
+        down_revisions.add(re.search(r'^down_revision: .* = "?(\w+)"?', content, re.M).group(1))
+
+    assert revisions - down_revisions == {SCHEMA_REVISION}
+
+
+def test_export_import_snapshot(db, tmp_path):
+    db_pkg = crud.create_package(db, "transformers#snapshot", {"etag": '"etag"'})
+    crud.create_releases(db, [("v1.0", isoparse("2022-07-09T14:27:16"), True)], db_pkg.id)
+    path = tmp_path / "cache.snap"
+
+    exported = snapshot.export_snapshot(db, path)
+    assert exported["packages"] >= 1
+    assert exported["releases"] >= 1
+
+    # Change the cache, the snapshot should replace it
+    crud.create_package(db, "transformers#after_snapshot")
+    imported = snapshot.import_snapshot(db, path)
+    db.expire_all()
+
+    assert imported == exported
+    assert crud.get_package_by_name(db, "transformers#after_snapshot") is None
+    db_pkg = crud.get_package_by_name(db, "transformers#snapshot")
+    assert db_pkg.etag == '"etag"'
+    assert db_pkg.n_versions_yanked == 1
+    assert db_pkg.latest_release_date == isoparse("2022-07-09T14:27:16")
+    assert db_pkg.releases[0].version == "v1.0"
+
+
+def test_import_snapshot_wrong_revision(db, tmp_path):
+    path = tmp_path / "cache.snap"
+    with gzip.open(path, "wt") as f:
+        f.write(json.dumps({"format": snapshot.FORMAT_VERSION, "revision": "be85fbbda3b7", "tables": {}}) + "\n")
+
+    with pytest.raises(ValueError):
+        snapshot.import_snapshot(db, path)
+
+
+def test_snapshot_cli(db, tmp_path, monkeypatch):
+    path = tmp_path / "cache.snap"
+    monkeypatch.setattr(oblique.config, "snapshot_file", str(path))
+
+    snapshot.snapshot_cache()
+    snapshot.load_snapshot()
+
+    assert path.exists()
+
+
+def test_snapshot_cli_in_memory(tmp_path, monkeypatch):
+    path = tmp_path / "cache.snap"
+    monkeypatch.setattr(oblique.config, "snapshot_file", str(path))
+    monkeypatch.setattr(oblique.database, "in_memory", True)
+
+    with pytest.raises(SystemExit, match="in-memory"):
+        snapshot.snapshot_cache()
+
+    assert not path.exists()
+
+
+def test_snapshot_cli_no_file():
+    with pytest.raises(SystemExit):
+        snapshot.snapshot_cache()
+
+    # Nothing to load
+    snapshot.load_snapshot()
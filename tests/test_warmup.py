@@ -0,0 +1,71 @@
+import asyncio
+import io
+
+import pytest
+
+import oblique
+from oblique import warmup
+from oblique.database import crud
+
+
+def test_read_package_names():
+    lines = io.StringIO("transformers\n\n# Comment\nnumpy  # Inline comment\n  transformers  \n")
+
+    assert warmup.read_package_names(lines) == ["transformers", "numpy"]
+
+
+def test_warm_packages(db):
+    progress = []
+    names = ["transformers-warm-1", "transformers-warm-2", "unknown-warm", "crashapi-warm"]
+
+    counts = asyncio.run(
+        warmup.warm_packages(db, names, chunk_size=3, progress=lambda c, e: progress.append(c["done"]))
+    )
+
+    assert counts == {"done": 4, "fetched": 4, "unknown": 1, "failed": 1}
+    assert progress == [3, 4]
+    assert crud.get_package_by_name(db, "transformers-warm-1").n_versions == 3
+
+
+def test_warm_packages_bulk_insert(db, monkeypatch):
+    calls = []
+    create_packages = crud.create_packages
+
+    def recording_create_packages(db, packages_data, *args, **kwargs):
+        calls.append((sorted(packages_data), kwargs.get("commit", True)))
+        return create_packages(db, packages_data, *args, **kwargs)
+
+    monkeypatch.setattr(crud, "create_packages", recording_create_packages)
+
+    asyncio.run(warmup.warm_packages(db, ["transformers-warm-7", "transformers-warm-8", "crashapi-warm-7"]))
+
+    # The chunk is inserted at once, and committed along with the other changes
+    assert calls == [(["transformers-warm-7", "transformers-warm-8"], False)]
+    assert crud.get_package_by_name(db, "transformers-warm-8").ttl is not None
+
+
+def test_warm_packages_resume(db):
+    asyncio.run(warmup.warm_packages(db, ["transformers-warm-3"]))
+
+    # Packages already preloaded are skipped
+    counts = asyncio.run(warmup.warm_packages(db, ["transformers-warm-3", "transformers-warm-4"]))
+
+    assert counts["fetched"] == 1
+
+
+def test_warm_cli(db, tmp_path, monkeypatch, capsys):
+    path = tmp_path / "packages.txt"
+    path.write_text("transformers-warm-5\ntransformers-warm-6\n")
+    monkeypatch.setattr(oblique.config, "warm_file", str(path))
+
+    warmup.warm()
+
+    assert crud.get_package_by_name(db, "transformers-warm-6") is not None
+    assert "[2/2]" in capsys.readouterr().err
+
+
+def test_warm_cli_failure(db, monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("crashapi-warm-cli\n"))
+
+    with pytest.raises(SystemExit):
+        warmup.warm()
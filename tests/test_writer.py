@@ -0,0 +1,151 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from dateutil.parser import isoparse
+from fastapi.testclient import TestClient
+
+import oblique
+from oblique import core
+from oblique.database import crud
+from oblique.writer import WriteBehindQueue, writer
+
+
+RELEASES = [("v0.0.1", isoparse("2002-07-25T11:27:16"), False), ("v0.0.2", isoparse("2002-08-25T11:27:16"), True)]
+
+
+@pytest.fixture
+def running_writer(monkeypatch):
+    # Writes are only applied when flushing, so the tests control when the DB is written
+    monkeypatch.setattr(oblique.config, "write_behind_delay", 60.0)
+    writer.start()
+
+    yield writer
+
+    writer.stop()
+
+
+def test_write_behind_stats_from_fetched_data(db, running_writer):
+    assert core.get_package_info(db, "transformers#writer_1") == ("09 Aug 2021", 3, 1)
+    assert crud.get_package_by_name(db, "transformers#writer_1") is None
+    assert running_writer.pending == 1
+
+    running_writer.flush()
+
+    db_pkg = crud.get_package_by_name(db, "transformers#writer_1")
+    assert (db_pkg.n_versions, db_pkg.n_versions_yanked) == (3, 1)
+    assert db_pkg.etag is not None
+    assert db_pkg.ttl is not None
+    assert len(db_pkg.releases) == 3
+
+
+def test_write_behind_update_existing(db, running_writer):
+    db_pkg = crud.create_package(db, "transformers#writer_2")
+    crud.create_releases(db, RELEASES[:1], db_pkg.id)
+
+    assert core.get_package_info(db, "transformers#writer_2", force_refresh=True) == ("09 Aug 2021", 3, 1)
+    running_writer.flush()
+
+    db.refresh(db_pkg)
+    assert db_pkg.n_versions == 3
+
+
+def test_write_behind_not_modified(db, running_writer):
+    db_pkg = crud.create_package(db, "transformers#writer_3", {"etag": '"transformers-etag"'})
+    crud.create_releases(db, RELEASES, db_pkg.id)
+    crud.touch_package(db, db_pkg)
+    db_pkg.last_updated = datetime.utcnow() - timedelta(days=2)
+    db.commit()
+
+    stats = asyncio.run(core.get_package_stats_async(db, "transformers#writer_3"))
+    assert stats[:3] == (isoparse("2002-08-25T11:27:16"), 2, 1)
+    assert stats.expires_at > datetime.utcnow()
+
+    running_writer.flush()
+    db.refresh(db_pkg)
+    assert db_pkg.last_updated > datetime.utcnow() - timedelta(hours=1)
+    assert db_pkg.n_versions == 2
+
+
+def test_write_behind_batch(db, running_writer):
+    results, errors = asyncio.run(core.get_packages_info_async(db, ["transformers#writer_4", "transformers#writer_5"]))
+
+    assert len(results) == 2
+    assert errors == {}
+    assert running_writer.pending == 2
+
+
+def test_coalesce_writes():
+    queue = WriteBehindQueue()
+
+    queue.submit("pkg", RELEASES, {"etag": "a"})
+    queue.submit("pkg", None, {"etag": "b"})
+
+    assert queue.pending == 1
+    assert queue.stats["coalesced"] == 1
+    # The releases already queued are kept, since the package wasn't modified since
+    assert queue._pending["pkg"] == (RELEASES, {"etag": "b"})
+
+    queue.submit("pkg", RELEASES[:1], {"etag": "c"})
+    assert queue._pending["pkg"] == (RELEASES[:1], {"etag": "c"})
+
+
+def test_flush_on_stop(db):
+    queue = WriteBehindQueue()
+    queue.start()
+    queue.submit("writer#6", RELEASES, {"ttl": 3600})
+
+    queue.stop()
+
+    assert not queue.running
+    assert queue.pending == 0
+    assert crud.get_package_by_name(db, "writer#6").n_versions == 2
+
+
+def test_failed_batch(db, monkeypatch):
+    def failing_create_packages(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(crud, "create_packages", failing_create_packages)
+    queue = WriteBehindQueue()
+    queue.submit("writer#7", RELEASES, {})
+
+    queue.flush()
+
+    assert queue.stats["failures"] == 1
+    assert crud.get_package_by_name(db, "writer#7") is None
+
+
+def test_conflicting_package(db, monkeypatch):
+    get_packages_by_names = crud.get_packages_by_names
+    calls = []
+
+    def racing_get_packages_by_names(db, pkg_names):
+        calls.append(pkg_names)
+        if len(calls) == 1:
+            # Another process creates one of the packages meanwhile
+            crud.create_package(db, "writer#8")
+            return []
+        return get_packages_by_names(db, pkg_names)
+
+    monkeypatch.setattr(crud, "get_packages_by_names", racing_get_packages_by_names)
+    queue = WriteBehindQueue()
+    queue.submit("writer#8", RELEASES, {})
+    queue.submit("writer#9", RELEASES, {})
+
+    queue.flush()
+
+    # The batch is written again package by package, so the conflict doesn't fail the other package
+    assert queue.stats["failures"] == 0
+    assert queue.stats["written"] == 2
+    assert crud.get_package_by_name(db, "writer#8").n_versions == 2
+    assert crud.get_package_by_name(db, "writer#9").n_versions == 2
+
+
+def test_writer_started_with_app(db, monkeypatch):
+    monkeypatch.setattr(oblique.config, "write_behind", True)
+
+    with TestClient(oblique.server.get_main_app()):
+        assert writer.running
+
+    assert not writer.running